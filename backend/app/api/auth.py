@@ -7,7 +7,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from backend.app.models.schemas import Token, UserResponse
 from backend.app.models.models import User
 from backend.app.auth.oauth import authenticate_user, create_access_token, get_current_user
-from backend.app.db.database import SessionDep
+from backend.app.db.database import AsyncSessionDep
 from ..loggers.logger import logger
 
 load_dotenv()
@@ -28,7 +28,7 @@ GET - /auth/me              -(return current user)
 @router.post("/token", response_model=Token)
 async def login(
     credentials: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: SessionDep
+    session: AsyncSessionDep
 ):
     try:
         """
@@ -36,7 +36,7 @@ async def login(
         """
         logger.info(f"Login attempt by username: {credentials.username}")
 
-        user = authenticate_user(session, credentials.username, credentials.password)
+        user = await authenticate_user(session, credentials.username, credentials.password)
 
         if not user:
             logger.warning(f"Failed login attempt invalid credentials for user: {credentials.username}")
@@ -4,20 +4,22 @@ API Endpoints for categories
 POST - /categories (create new category)
 GET - /categories  (return all categories)
 GET - /categories/{slug}/ (get category page by slug)
-GET - /categories/{slug}/product (get all product from slug / categories)
+GET - /categories/{slug}/product (get all product from slug / categories, keyset paginated)
 GET - /categories/{slug}/product/total (total count of product from that slug)
 
 GET - /categories/{slug}/product/offers (return all products offers with categories)
 '''
 
 from fastapi import APIRouter, HTTPException, Depends, Query
-from backend.app.db.database import SessionDep
-from backend.app.models.schemas import CategoryCreate, CategoryResponse
+from backend.app.db.database import AsyncSessionDep
+from backend.app.config import settings
+from backend.app.models.schemas import CategoryCreate, CategoryResponse, Page, ProductResponse
 from backend.app.models.models import User, Category
 from backend.app.auth.oauth import role_required
-from backend.app.utilities.crud import get_category_by_name, create_category, get_all_category
+from backend.app.utilities.crud import get_category_by_name, create_category, get_all_category, get_all_products_by_category
+from backend.app.utilities.pagination import InvalidCursorError
 from backend.app.loggers.logger import logger
-from typing import List
+from typing import Annotated, List, Literal, Optional
 
 router = APIRouter(
     prefix="/categories",
@@ -25,10 +27,10 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=CategoryResponse)
-def create_new_category(category_data: CategoryCreate, session: SessionDep, user: User = Depends(role_required(["admin"]))):
+async def create_new_category(category_data: CategoryCreate, session: AsyncSessionDep, user: User = Depends(role_required(["admin"]))):
     """Create a new category for admin only access"""
     try:
-        existing = get_category_by_name(session, category_data.name)
+        existing = await get_category_by_name(session, category_data.name)
         if existing:
             logger.debug(f"name {category_data.name} already exists")
             raise HTTPException(status_code=400, detail="Category already exists")
@@ -39,7 +41,7 @@ def create_new_category(category_data: CategoryCreate, session: SessionDep, user
         )
 
         logger.debug(f"Category instance created {instance}")
-        new_category = create_category(session, instance)
+        new_category = await create_category(session, instance)
 
         logger.debug(f"Category created successfully: {Category.name}")
         return new_category
@@ -53,10 +55,10 @@ def create_new_category(category_data: CategoryCreate, session: SessionDep, user
 
 # Get all category listed on this 
 @router.get("/", response_model=List[CategoryResponse])
-def read_all_category(session: SessionDep):
+async def read_all_category(session: AsyncSessionDep):
     """Get all Category"""
     try: 
-        all_category = get_all_category(session)
+        all_category = await get_all_category(session)
         logger.info("All category fetched successfully.")
         return all_category
     except Exception as e: 
@@ -66,32 +68,38 @@ def read_all_category(session: SessionDep):
 # Get category page by slug (testing phase)
 # Need to add Pagination (page & limit) controls how many products are returned
 @router.get("/{slug}", response_class=List[CategoryResponse])
-def get_category_by_slug(slug: str, session: SessionDep): 
+async def get_category_by_slug(slug: str, session: AsyncSessionDep): 
     pass 
 
 # Slug uses is base_url/categories/{slug} here, slug = skin-care, lip-balm, slug should be meaningful in realworld, and permanent 
 # we will assume slug as categories, so we will try to fetch every product in that slug (category), 
-# Pagination, limitation 
-# @router.get("/{slug}/product")
-# def get_all_product_from_slug(
-#     session: SessionDep,
-#     page: int = 1,
-#     skip: int = 0,
-#     limit: Annotated[int, Query(le=100)] = 100,
-#     ):
-#     """Get all users"""
-#     try:
-#         all_products = get_all_products_by_category(session, page, skip, limit)
-#         logger.info("All users fetched successfully.")
-#         return all_products
-
-#     except Exception as e:
-#         logger.error(f"Error while fetching users: {e}")
-#         raise HTTPException(status_code=500, detail="Internal Server Error")
+# Pagination, limitation: keyset cursors, so page 1000 costs the same as page 1
+@router.get("/{slug}/product", response_model=Page[ProductResponse])
+async def get_all_product_from_slug(
+    slug: str,
+    session: AsyncSessionDep,
+    sort: Literal["id", "name"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.PAGE_MAX_SIZE)] = settings.PAGE_DEFAULT_SIZE,
+    ):
+    """Get a page of the products in a category"""
+    try:
+        all_products, next_cursor = await get_all_products_by_category(session, slug, sort, order == "desc", cursor, limit)
+        logger.info(f"Products of category '{slug}' fetched successfully.")
+        return {"items": all_products, "next_cursor": next_cursor, "limit": limit}
+
+    except InvalidCursorError as e:
+        logger.warning(f"Rejected category products cursor: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        logger.error(f"Error while fetching products of category '{slug}': {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
 # Total count of product listed on that slug / categories 
 # @router.get("/{slug}/product/total")
-# def get_total_product_under_categories(session: SessionDep, page: int = 1, skip: int = 0, limit: Annotated[int, Query(le=100)] = 100):
+# def get_total_product_under_categories(session: AsyncSessionDep, page: int = 1, skip: int = 0, limit: Annotated[int, Query(le=100)] = 100):
 #     try: 
 #         total_product = get_total_count_product(session, skip, limit)
 #         return total_product
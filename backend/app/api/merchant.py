@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from backend.app.db.database import SessionDep
-from backend.app.models.schemas import MerchantCreate, MerchantResponse
+from fastapi import APIRouter, HTTPException, Depends, Query
+from backend.app.db.database import AsyncSessionDep
+from backend.app.config import settings
+from backend.app.models.schemas import MerchantCreate, MerchantResponse, Page
 from backend.app.models.models import User, Merchant
 from backend.app.auth.oauth import role_required
 from backend.app.utilities.crud import get_merchant_by_merchantname, create_merchant, get_all_merchant, get_merchant_by_id, update_merchant, delete_merchant_by_id
 from backend.app.loggers.logger import logger
-from typing import List
+from backend.app.utilities.pagination import InvalidCursorError
+from typing import Annotated, Literal, Optional
 
 router = APIRouter(
     prefix="/merchant",
@@ -16,17 +18,17 @@ router = APIRouter(
 API Endpoints for merchant 
 
 POST - /merchant/                    -(create new merchant)
-GET - /merchant/                     -(return all merchant)
+GET - /merchant/                     -(return merchants a page at a time, ?sort=id|name&cursor=)
 GET - /merchant/{merchant_id}/       -(get merchant by merchant_id)
 PUT - /merchant/{merchant_id}/       -(Update merchant by merchant_id)
 DELETE - /merchant/{merchant_id}     -(return all products offers with categories)
 '''
 
 @router.post("/", response_model=MerchantResponse)
-def create_new_merchant(merchant_data: MerchantCreate, session: SessionDep, user: User = Depends(role_required(["admin"]))):
+async def create_new_merchant(merchant_data: MerchantCreate, session: AsyncSessionDep, user: User = Depends(role_required(["admin"]))):
     """Create a new merchant for admin only access"""
     try:
-        existing = get_merchant_by_merchantname(session, merchant_data.name)
+        existing = await get_merchant_by_merchantname(session, merchant_data.name)
         if existing:
             logger.debug(f"merchant name {merchant_data.name} already exists")
             raise HTTPException(status_code=400, detail="Merchant already exists")
@@ -38,7 +40,7 @@ def create_new_merchant(merchant_data: MerchantCreate, session: SessionDep, user
         )
 
         logger.debug(f"Merchant instance created {instance}")
-        new_merchant = create_merchant(session, instance)
+        new_merchant = await create_merchant(session, instance)
 
         logger.info(f"Merchant created successfully: {Merchant.name}")
         return new_merchant
@@ -51,21 +53,30 @@ def create_new_merchant(merchant_data: MerchantCreate, session: SessionDep, user
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 # GET ALL MERCHANT
-@router.get("/", response_model=List[MerchantResponse])
-def get_merchant(session: SessionDep):
+@router.get("/", response_model=Page[MerchantResponse])
+async def get_merchant(
+    session: AsyncSessionDep,
+    sort: Literal["id", "name"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.PAGE_MAX_SIZE)] = settings.PAGE_DEFAULT_SIZE,
+):
     try:
-        all_merchant = get_all_merchant(session)
+        all_merchant, next_cursor = await get_all_merchant(session, sort, order == "desc", cursor, limit)
         logger.info(f"Successfully fetched all merchant")
-        return all_merchant    
+        return {"items": all_merchant, "next_cursor": next_cursor, "limit": limit}
+    except InvalidCursorError as e:
+        logger.warning(f"Rejected merchant cursor: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Unexpected error while fetching merchant: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 # GET merchant BY merchant Id
 @router.get("/{merchant_id}", response_model=MerchantResponse)
-def get_merchant_by_id_endpoints(session: SessionDep, merchant_id: int):
+async def get_merchant_by_id_endpoints(session: AsyncSessionDep, merchant_id: int):
     try:
-        merchant = get_merchant_by_id(session, merchant_id)
+        merchant = await get_merchant_by_id(session, merchant_id)
         if not merchant:
             logger.warning(f"merchant not found for {merchant_id}")
             raise HTTPException(status_code=404, detail="merchant not found")
@@ -78,14 +89,14 @@ def get_merchant_by_id_endpoints(session: SessionDep, merchant_id: int):
 
 # Update Merchant
 @router.put("/{merchant_id}", response_model=MerchantResponse)
-def update_merchant_endpoints(
+async def update_merchant_endpoints(
     merchant_id: int,
     merchant_data: MerchantCreate,
-    session: SessionDep,
+    session: AsyncSessionDep,
     user: User = Depends(role_required(["admin"]))
 ):
     try:
-        merchant = update_merchant(session, merchant_id, merchant_data)
+        merchant = await update_merchant(session, merchant_id, merchant_data)
         if not merchant:
             logger.warning(f"Merchant not found for {merchant_id}")
             raise HTTPException(status_code=404, detail="merchant not found")
@@ -100,13 +111,13 @@ def update_merchant_endpoints(
 
 # DELETE merchant
 @router.delete("/{merchant_id}")
-def delete_merchant_by_merchant_id_endpoints(
+async def delete_merchant_by_merchant_id_endpoints(
     merchant_id: int,
-    session: SessionDep,
+    session: AsyncSessionDep,
     user: User = Depends(role_required(["admin"]))
 ):
     try:
-        if not delete_merchant_by_id(session, merchant_id):
+        if not await delete_merchant_by_id(session, merchant_id):
             logger.warning(f"Merchant could not found for {merchant_id}")
             raise HTTPException(status_code=404, detail="merchant not found")
         return {"message": "merchant deleted successfully"}
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
-from backend.app.db.database import SessionDep
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException, Depends, Query
+from backend.app.db.database import AsyncSessionDep
 from backend.app.models.models import User, Product, Offer, Referral
-from backend.app.models.schemas import ProductCreate, ProductResponse, OfferCreate, OfferResponse, ReferralResponse, ReferralCreate
+from backend.app.config import settings
+from backend.app.models.schemas import Page, ProductCreate, ProductResponse, OfferCreate, OfferResponse, ReferralResponse, ReferralCreate, OfferBulkUpsert, OfferBulkResult, PriceSeriesResponse
 from backend.app.auth.oauth import role_required
 from backend.app.loggers.logger import logger
-from backend.app.utilities.crud import get_existing_product, create_product, create_offer, get_exisiting_offer, get_existing_referral, create_referral, get_existing_all_product, get_all_offer_on_product
+from backend.app.utilities.crud import get_existing_product, create_product, create_offer, get_exisiting_offer, get_existing_referral, create_referral, get_existing_all_product, get_all_offer_on_product, bulk_upsert_offers
+from backend.app.utilities.pagination import InvalidCursorError
+from backend.app.utilities.price_history import price_series
 from ..loggers.logger import logger
-from typing import List
+from typing import Annotated, List, Literal, Optional
 
 router = APIRouter(
     prefix="/product",
@@ -16,17 +20,19 @@ router = APIRouter(
 '''
 API Endpoint products 
 PRODUCTS
-GET    /products/                  - Get all products
+GET    /products/                  - Get all products (keyset paginated, ?sort=id|name&cursor=)
 POST   /products/                  - Create new product
+POST   /products/offer/bulk        - Insert or update a scraper batch of offers
+GET    /products/offer/{offer_id}/price-history - Price series, raw or daily/weekly rollups
 PUT    /products/{product_id}/     - Update product
 DELETE /products/{product_id}/     - Delete product
 '''
 
 @router.post("/", response_model=ProductResponse)
-def create_new_product(product_data: ProductCreate, session: SessionDep, user: User = Depends(role_required(["admin"]))):
+async def create_new_product(product_data: ProductCreate, session: AsyncSessionDep, user: User = Depends(role_required(["admin"]))):
     """Create a new category for admin only access"""
     try:
-        existing = get_existing_product(session, product_data.name)
+        existing = await get_existing_product(session, product_data.name)
         if existing:
             logger.debug(f"name {product_data.name} already exists")
             raise HTTPException(status_code=400, detail="Product already exists")
@@ -40,7 +46,7 @@ def create_new_product(product_data: ProductCreate, session: SessionDep, user: U
         )
 
         logger.debug(f"Product instance created {instance}")
-        new_product = create_product(session, instance)
+        new_product = await create_product(session, instance)
 
         logger.debug(f"Product created successfully: {Product.name}")
         return new_product
@@ -53,11 +59,20 @@ def create_new_product(product_data: ProductCreate, session: SessionDep, user: U
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 '''This needs to be checked, there is problem with the model'''
-@router.get("/", response_model=List[ProductResponse])
-def get_all_product(session: SessionDep): 
+@router.get("/", response_model=Page[ProductResponse])
+async def get_all_product(
+    session: AsyncSessionDep,
+    sort: Literal["id", "name"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.PAGE_MAX_SIZE)] = settings.PAGE_DEFAULT_SIZE,
+): 
     try: 
-        all_product = get_existing_all_product(session)
-        return all_product
+        all_product, next_cursor = await get_existing_all_product(session, sort, order == "desc", cursor, limit)
+        return {"items": all_product, "next_cursor": next_cursor, "limit": limit}
+    except InvalidCursorError as e: 
+        logger.warning(f"Rejected product cursor: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException: 
         raise
     except Exception as e: 
@@ -65,11 +80,11 @@ def get_all_product(session: SessionDep):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.post("/offer", response_model=OfferResponse)
-def create_offer_with_product(offer_data: OfferCreate, session: SessionDep, user: User = Depends(role_required(["admin"]))):
+async def create_offer_with_product(offer_data: OfferCreate, session: AsyncSessionDep, user: User = Depends(role_required(["admin"]))):
     """Create a new offer with the different merchant"""
 
     try: 
-        existing_offer = get_exisiting_offer(session, offer_data.product_id)
+        existing_offer = await get_exisiting_offer(session, offer_data.product_id)
         if existing_offer: 
             logger.debug(f"offer {offer_data.product_id} already existed")
             raise HTTPException(status_code=400, detail="Offer Already Exists")
@@ -85,7 +100,7 @@ def create_offer_with_product(offer_data: OfferCreate, session: SessionDep, user
         )
 
         logger.debug(f"Offer instance created {instance}")
-        new_offer = create_offer(session, instance)
+        new_offer = await create_offer(session, instance)
 
         logger.debug(f"offer created successfully: {new_offer}")
         return new_offer
@@ -97,23 +112,78 @@ def create_offer_with_product(offer_data: OfferCreate, session: SessionDep, user
         print(f"Error creating offer: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
+@router.post("/offer/bulk", response_model=OfferBulkResult)
+async def bulk_upsert_offer(offer_data: OfferBulkUpsert, session: AsyncSessionDep, user: User = Depends(role_required(["admin"]))):
+    """Insert or update a scraper batch of offers, recording price changes"""
+
+    try:
+        if len(offer_data.offers) > settings.OFFER_UPSERT_MAX_BATCH:
+            raise HTTPException(status_code=413, detail=f"At most {settings.OFFER_UPSERT_MAX_BATCH} offers per request")
+
+        result = await bulk_upsert_offers(session, offer_data.offers)
+        logger.info(
+            f"Bulk offer upsert: {result.inserted} inserted, {result.updated} updated, {result.unchanged} unchanged, "
+            f"{result.price_changes} price changes, {len(result.rejected)} rejected in {result.chunks} chunk(s), "
+            f"{result.failed_chunks} chunk(s) rolled back"
+        )
+        return result
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Error in bulk offer upsert: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
 @router.get("/offer", response_model=List[OfferResponse])
-def get_all_offer(session: SessionDep, product_id: int):
+async def get_all_offer(session: AsyncSessionDep, product_id: int):
     try: 
-        all_product = get_all_offer_on_product(session, product_id)
+        all_product = await get_all_offer_on_product(session, product_id)
         return all_product
     except HTTPException: 
         raise
     except Exception as e: 
         print(f"Error fetching all categories: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/offer/{offer_id}/price-history", response_model=PriceSeriesResponse)
+async def get_offer_price_history(
+    offer_id: int,
+    session: AsyncSessionDep,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Literal["auto", "raw", "day", "week"] = "auto",
+    max_points: Annotated[int, Query(ge=1, le=5000)] = settings.PRICE_SERIES_MAX_POINTS,
+):
+    """Price chart of an offer; `auto` picks raw rows for short ranges and rollups for long ones"""
+    try:
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(days=90)
+        # rows are stored as naive UTC
+        start, end = (t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t for t in (start, end))
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+
+        if await session.get(Offer, offer_id) is None:
+            raise HTTPException(status_code=404, detail="Offer not found")
+
+        resolution, points, truncated = await price_series(session, offer_id, start, end, resolution, max_points)
+        return PriceSeriesResponse(
+            offer_id=offer_id, resolution=resolution, start=start, end=end, truncated=truncated, points=points
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching price history of offer {offer_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
  
 @router.post("/referral", response_model=ReferralResponse)
-def create_referral_with_product(referral_data: ReferralCreate, session: SessionDep, user: User = Depends(role_required(["admin"]))):
+async def create_referral_with_product(referral_data: ReferralCreate, session: AsyncSessionDep, user: User = Depends(role_required(["admin"]))):
     """when a user buys product it will get referral"""
 
     try: 
-        existing_offer = get_existing_referral(session, referral_data.offer_id)
+        existing_offer = await get_existing_referral(session, referral_data.offer_id)
         if existing_offer: 
             logger.debug(f"offer {referral_data.offer_id} already existed")
             raise HTTPException(status_code=400, detail="referral Already Exists")
@@ -126,7 +196,7 @@ def create_referral_with_product(referral_data: ReferralCreate, session: Session
         )
 
         logger.debug(f"Referral instance created {instance}")
-        new_referral = create_referral(session, instance)
+        new_referral = await create_referral(session, instance)
 
         logger.debug(f"referral created successfully: {new_referral}")
         return new_referral
@@ -1,15 +1,24 @@
-import torch
+import asyncio
+from typing import Annotated, Literal
 from ..config import settings
-from elastic_transport import ObjectApiResponse
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse
-from sentence_transformers import SentenceTransformer
-from ..utilities.utils import get_es_client
+from elastic_transport import ConnectionError as ESConnectionError, ConnectionTimeout, ObjectApiResponse
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse
+from ..db.elastic import ESDep
+from ..utilities.bm25 import BM25Index
+from ..utilities.cache import ResultCache, create_cache_backend
+from ..utilities.embedding import EmbeddingBatcher, EmbeddingCache, LazyEmbeddingModel, normalize_query
+from ..utilities.metrics import Histogram, StageTimer
+from ..utilities.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from ..utilities.pagination import InvalidCursorError, cursor_scope, decode_cursor, encode_cursor
+from ..utilities.singleflight import SingleFlight
 from ..loggers.logger import logger 
 
+# handlers return ORJSONResponse directly, which skips jsonable_encoder on large hit lists
 router = APIRouter(
     prefix="/search",
-    tags=["search"]
+    tags=["search"],
+    default_response_class=ORJSONResponse,
 )
 
 '''
@@ -17,10 +26,33 @@ API Endpoints — Search Router
 SEARCH
 
 GET    /search/regular_search/         - Keyword/multi-match search (title, description)
-         ?query, ?skip, ?limit, ?year, ?tokenizer
+         ?query, ?skip, ?limit, ?year, ?tokenizer, ?use_cursor, ?cursor, ?fields
+
+         served by the embedded BM25 index (FALLBACK_CORPUS_PATH) while ES is down
 
 GET    /search/semantic_search/        - KNN/embedding vector search
-         ?query, ?skip, ?limit, ?year
+         ?query, ?skip, ?limit, ?year, ?use_cursor, ?cursor, ?fields
+
+         use_cursor=true opens a point-in-time and returns `next_cursor`; pass it back
+         as ?cursor to fetch the following page (search_after, no deep from/size scans)
+         with the same query, year and fields; a cursor from another endpoint, index
+         or query is rejected with 400
+
+         kNN has no total: `max_pages` is null and `has_more` says whether another
+         page exists (one extra neighbour is requested as a probe)
+
+GET    /search/hybrid/                 - Lexical + KNN run concurrently, fused into one ranking
+         ?query, ?skip, ?limit, ?year, ?tokenizer, ?fusion (rrf | weighted), ?rank_constant,
+         ?lexical_weight, ?semantic_weight, ?fields
+
+         every search response has `hits`, `has_more` and `max_pages` (null for
+         semantic_search and hybrid, whose kNN leg only sees the requested window)
+
+         fields=title,date,url limits each hit's _source to what the client renders;
+         the stored `embedding` vector is never returned
+
+GET    /search/suggest/                - Title typeahead from the in-process trie (ES n-gram fallback)
+         ?prefix, ?limit
 
 POST   /search/                        - Index a new product into all 3 indexes
          body: { title, description, price, ... }
@@ -29,13 +61,78 @@ POST   /search/                        - Index a new product into all 3 indexes
 DELETE /search/{doc_id}/               - Remove product from default index only
 '''
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = SentenceTransformer("all-MiniLM-L6-v2").to(device)
+SEARCH_STAGE_SECONDS = Histogram(
+    "search_stage_seconds",
+    "Search latency per stage: embed, es, es_took (ES reported), post, serialize, fallback, total",
+    ("endpoint", "tokenizer", "stage"),
+)
+
+# loaded by the lifespan warm up (or on first use), never at import time
+model = LazyEmbeddingModel()
+
+embedding_cache = EmbeddingCache(
+    max_size=settings.EMBEDDING_CACHE_SIZE,
+    ttl=settings.EMBEDDING_CACHE_TTL,
+    disk_path=settings.EMBEDDING_CACHE_PATH,
+    namespace=f"{settings.EMBEDDING_MODEL_NAME}/{settings.EMBEDDING_BACKEND}/{settings.EMBEDDING_ONNX_FILE}",
+)
+
+def _encode_batch(texts: list[str]):
+    return model.encode(texts, batch_size=len(texts))
+
+embedder = EmbeddingBatcher(
+    encode_fn=_encode_batch,
+    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    workers=settings.EMBEDDING_WORKERS,
+)
+
+result_cache = ResultCache(
+    max_size=settings.RESULT_CACHE_SIZE,
+    ttl=settings.RESULT_CACHE_TTL,
+    backend=create_cache_backend(settings.RESULT_CACHE_BACKEND),
+    enabled=settings.RESULT_CACHE_ENABLED,
+)
+search_flight = SingleFlight("search")
+
+def cache_key(endpoint: str, index_names: list[str], **params) -> str | None:
+    """Key of a from/size request; cursor requests hold a PIT and are never cached or shared"""
+    if params.get("use_cursor") or params.get("cursor"):
+        return None
+    return result_cache.make_key(endpoint, index_names, **params)
+
+async def run_cached(key: str | None, compute):
+    """Serve `key` from the result cache, otherwise compute it once for all concurrent callers"""
+    if key is None:
+        return await compute()
+
+    cached = await result_cache.aget(key)
+    if cached is not None:
+        return cached
+
+    async def compute_and_store():
+        result = await compute()
+        await result_cache.aset(key, result)
+        return result
+
+    return await search_flight.do(key, compute_and_store)
+
+async def encode_query(search_query: str):
+    embedded_query = await embedding_cache.aget(search_query)
+    if embedded_query is None:
+        embedded_query = await embedder.encode(normalize_query(search_query))
+        await embedding_cache.aset(search_query, embedded_query)
+    return embedded_query
 
 def get_total_hits(response: ObjectApiResponse) -> int:
     logger.info(f"Total hits from response {response['hits']['total']['value']}")
     return response["hits"]["total"]["value"]
 
+def has_more_hits(response: ObjectApiResponse, shown: int) -> bool:
+    """Whether hits exist past the first `shown`; a `gte` total (capped count) is a lower bound"""
+    total = response["hits"]["total"]
+    return shown < total["value"] or total.get("relation") == "gte"
+
 def calculate_max_pages(total_hits: int, limit: int) -> int:
     logger.info(f"Maximum pages can be sent {(total_hits + limit - 1) // limit}")
     return (total_hits + limit - 1) // limit
@@ -47,172 +144,517 @@ def extract_docs_per_year(response: ObjectApiResponse) -> dict:
     logger.info(f"Successfully extracted docs per year")
     return {bucket["key_as_string"]: bucket["doc_count"] for bucket in buckets}
 
+def record_es_took(timer: StageTimer, *responses: ObjectApiResponse) -> None:
+    """ES's own `took` (ms); the gap to the `es` stage is network + client overhead"""
+    took = max((response.get("took") or 0) for response in responses)
+    timer.record("es_took", took / 1000)
+
+def timed_response(content: dict, timer: StageTimer, endpoint: str, tokenizer: str) -> ORJSONResponse:
+    """Serialize `content`, attach the Server-Timing header and feed the stage histograms"""
+    with timer.stage("serialize"):
+        response = ORJSONResponse(content)
+    timer.finish()
+    timer.observe(SEARCH_STAGE_SECONDS, endpoint=endpoint, tokenizer=tokenizer)
+    response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
+def get_fallback_index(request: Request) -> BM25Index | None:
+    """The embedded BM25 index, but only while the health probe reports ES as down"""
+    if request.app.state.es_healthy:
+        return None
+    return request.app.state.fallback_index
+
+async def fallback_search(
+    fallback: BM25Index,
+    search_query: str,
+    skip: int,
+    limit: int,
+    year: str | None,
+    fields: list[str] | None,
+    timer: StageTimer,
+) -> dict:
+    with timer.stage("fallback"):
+        total_hits, hits = await asyncio.to_thread(fallback.search, search_query, skip, limit, year)
+    if fields:
+        hits = [
+            {**hit, "_source": {field: hit["_source"][field] for field in fields if field in hit["_source"]}}
+            for hit in hits
+        ]
+    return {
+        "hits": hits,
+        "max_pages": calculate_max_pages(total_hits, limit),
+        "has_more": skip + len(hits) < total_hits,
+        "next_cursor": None,
+    }
+
+def semantic_search_unavailable() -> HTMLResponse | None:
+    if not settings.SEMANTIC_SEARCH_ENABLED:
+        return HTMLResponse(content="Semantic search is disabled on this server", status_code=503)
+    if model.status == "failed":
+        return HTMLResponse(content="Embedding model failed to load", status_code=503)
+    return None
+
+def handle_cursor_error(e: InvalidCursorError) -> HTMLResponse:
+    logger.warning(f"Rejected search cursor: {e}")
+    return HTMLResponse(content=str(e), status_code=400)
+
 def handle_error(e: Exception) -> HTMLResponse:
     error_message = f"An error occurred: {str(e)}"
     logger.error("Error occured and HTMLResponse is going to handle it {e}")
     return HTMLResponse(content=error_message, status_code=500)
 
-@router.get("/regular_search/")
-async def regular_search(
-    search_query: str,
-    skip: int = 0,
-    limit: int = 10,
-    year: str | None = None,
-    tokenizer: str = "Standard",
-) :
-    try:
-        es = get_es_client(max_retries=1, sleep_time=0)
-        query = {
-            "bool": {
-                "must": [
-                    {
-                        "multi_match": {
-                            "query": search_query,
-                            "fields": ["title", "explanation"],
-                        }
-                    }
-                ]
+def get_index_name(tokenizer: str) -> str:
+    return settings.INDEX_NAME_DEFAULT if tokenizer == "Standard" else settings.INDEX_NAME_N_GRAM
+
+# a four digit year, checked before either engine sees it: ES and the BM25 fallback
+# then agree (422) instead of failing differently on `?year=abc`
+YearFilter = Annotated[str | None, Query(pattern=r"^\d{4}$", description="e.g. 2015")]
+
+# never ship the stored 384 float vectors back to clients
+SOURCE_EXCLUDES = ["embedding"]
+
+def parse_fields(fields: str | None) -> list[str] | None:
+    """`title,date , url` -> ["title", "date", "url"]"""
+    if not fields:
+        return None
+    parsed = [field.strip() for field in fields.split(",") if field.strip()]
+    return [field for field in parsed if field not in SOURCE_EXCLUDES] or None
+
+def build_source_filter(fields: list[str] | None = None) -> dict:
+    source = {"excludes": SOURCE_EXCLUDES}
+    if fields:
+        source["includes"] = fields
+    return source
+
+def build_year_filter(year: str | None) -> list:
+    if not year:
+        return []
+    return [
+        {
+            "range": {
+                "date": {
+                    "gte": f"{year}-01-01",
+                    "lte": f"{year}-12-31",
+                    "format": "yyyy-MM-dd",
+                }
             }
         }
+    ]
+
+def build_lexical_query(search_query: str, year: str | None = None) -> dict:
+    query = {
+        "bool": {
+            "must": [
+                {
+                    "multi_match": {
+                        "query": search_query,
+                        "fields": ["title", "explanation"],
+                    }
+                }
+            ]
+        }
+    }
 
-        if year:
-            query["bool"]["filter"] = [
+    if year:
+        query["bool"]["filter"] = build_year_filter(year)
+    return query
+
+KNN_MAX_CANDIDATES = 10000
+
+def knn_window(k: int) -> tuple[int, int]:
+    """k and num_candidates for a result window of k hits (ES caps both at 10000)"""
+    k = max(1, min(k, KNN_MAX_CANDIDATES))
+    num_candidates = min(max(k * settings.KNN_CANDIDATE_FACTOR, settings.KNN_MIN_CANDIDATES), KNN_MAX_CANDIDATES)
+    return k, num_candidates
+
+def build_semantic_query(embedded_query, year: str | None = None, k: int = 10) -> dict:
+    k, num_candidates = knn_window(k)
+    query = {
+        "bool": {
+            "must": [
                 {
-                    "range": {
-                        "date": {
-                            "gte": f"{year}-01-01",
-                            "lte": f"{year}-12-31",
-                            "format": "yyyy-MM-dd",
-                        }
+                    "knn": {
+                        "field": "embedding",
+                        "query_vector": embedded_query,
+                        "k": k,
+                        "num_candidates": num_candidates,
                     }
                 }
             ]
+        }
+    }
 
-        index_name = (
-            settings.INDEX_NAME_DEFAULT if tokenizer == "Standard" else settings.INDEX_NAME_N_GRAM
+    if year:
+        query["bool"]["filter"] = build_year_filter(year)
+    return query
+
+SEARCH_FILTER_PATH = [
+    "took",
+    "hits.hits._source",
+    "hits.hits._score",
+    "hits.total",
+]
+
+# _shard_doc is the cheapest tiebreaker available inside a point-in-time
+PIT_SORT = [{"_score": "desc"}, {"_shard_doc": "asc"}]
+SEARCH_CURSOR_KEYS = ("pit_id", "search_after", "offset")
+
+# first-page parameters a search cursor is bound to; limit may change between pages
+def search_cursor_scope(endpoint: str, index: str, search_query: str, year: str | None, fields: list[str] | None) -> str:
+    return cursor_scope(endpoint=endpoint, index=index, query=search_query, year=year, fields=fields)
+
+async def paginated_search(
+    es: ESDep,
+    index: str,
+    body: dict,
+    skip: int,
+    limit: int,
+    cursor_state: dict | None = None,
+    use_cursor: bool = False,
+    scope: str | None = None,
+) -> tuple[ObjectApiResponse, list, str | None, bool]:
+    """
+    Run `body` as a from/size search, or, with a cursor, as a point-in-time search
+    continued with search_after. Returns the response, its hits, the next cursor
+    (bound to `scope`) and whether more hits follow this page.
+    """
+    if cursor_state is None and not use_cursor:
+        response = await es.search(
+            index=index,
+            body={**body, "from": skip, "size": limit},
+            filter_path=SEARCH_FILTER_PATH,
         )
-        response = es.search(
-            index=index_name,
-            body={
-                "query": query,
-                "from": skip,
-                "size": limit,
-            },
-            filter_path=[
-                "hits.hits._source",
-                "hits.hits._score",
-                "hits.total",
-            ],
+        hits = response["hits"].get("hits", [])
+        return response, hits, None, has_more_hits(response, skip + len(hits))
+
+    if cursor_state is None:
+        pit = await es.open_point_in_time(index=index, keep_alive=settings.SEARCH_PIT_KEEP_ALIVE)
+        cursor_state = {"pit_id": pit["id"], "search_after": None, "offset": skip}
+
+    body = {
+        **body,
+        "size": limit,
+        "pit": {"id": cursor_state["pit_id"], "keep_alive": settings.SEARCH_PIT_KEEP_ALIVE},
+        "sort": PIT_SORT,
+    }
+    if cursor_state["search_after"]:
+        body["search_after"] = cursor_state["search_after"]
+    else:
+        body["from"] = cursor_state["offset"]
+
+    response = await es.search(body=body, filter_path=SEARCH_FILTER_PATH + ["hits.hits.sort", "pit_id"])
+    hits = response["hits"].get("hits", [])
+    pit_id = response.get("pit_id", cursor_state["pit_id"])
+    search_after = hits[-1]["sort"] if hits else None
+    for hit in hits:
+        hit.pop("sort", None)
+
+    has_more = len(hits) == limit and has_more_hits(response, cursor_state["offset"] + len(hits))
+    if not has_more:
+        await es.close_point_in_time(id=pit_id)
+        return response, hits, None, False
+
+    next_cursor = encode_cursor({
+        "pit_id": pit_id,
+        "search_after": search_after,
+        "offset": cursor_state["offset"] + len(hits),
+        "scope": scope,
+    })
+    return response, hits, next_cursor, True
+
+@router.get("/regular_search/")
+async def regular_search(
+    request: Request,
+    es: ESDep,
+    search_query: str,
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: int = 10,
+    year: YearFilter = None,
+    tokenizer: str = "Standard",
+    use_cursor: bool = False,
+    cursor: str | None = None,
+    fields: str | None = None,
+) :
+    timer = StageTimer()
+    try:
+        field_list = parse_fields(fields)
+        fallback = get_fallback_index(request)
+        if fallback is not None:
+            content = await fallback_search(fallback, search_query, skip, limit, year, field_list, timer)
+            return timed_response(content, timer, "regular_search", "fallback")
+
+        index_name = get_index_name(tokenizer)
+        query = " ".join(search_query.split())
+        key = cache_key(
+            "regular_search", [index_name],
+            search_query=query, skip=skip, limit=limit, year=year,
+            use_cursor=use_cursor, cursor=cursor, fields=field_list,
         )
+        scope = search_cursor_scope("regular_search", index_name, query, year, field_list)
+        cursor_state = decode_cursor(cursor, required=SEARCH_CURSOR_KEYS, scope=scope) if cursor else None
 
-        total_hits = get_total_hits(response)
-        max_pages = calculate_max_pages(total_hits, limit)
+        async def compute():
+            with timer.stage("es"):
+                response, hits, next_cursor, has_more = await paginated_search(
+                    es,
+                    index=index_name,
+                    body={
+                        "query": build_lexical_query(search_query, year),
+                        "_source": build_source_filter(field_list),
+                    },
+                    skip=skip,
+                    limit=limit,
+                    cursor_state=cursor_state,
+                    use_cursor=use_cursor,
+                    scope=scope,
+                )
+            record_es_took(timer, response)
 
-        return {
-            "hits": response["hits"].get("hits", []),
-            "max_pages": max_pages,
-        }
+            with timer.stage("post"):
+                total_hits = get_total_hits(response)
+                max_pages = calculate_max_pages(total_hits, limit)
+
+            return {
+                "hits": hits,
+                "max_pages": max_pages,
+                "has_more": has_more,
+                "next_cursor": next_cursor,
+            }
+
+        return timed_response(await run_cached(key, compute), timer, "regular_search", tokenizer)
+    except InvalidCursorError as e:
+        return handle_cursor_error(e)
+    except (ESConnectionError, ConnectionTimeout) as e:
+        # ES went away between two health probes
+        if request.app.state.fallback_index is None:
+            return handle_error(e)
+        logger.warning(f"Elasticsearch unreachable, serving regular_search from the fallback index: {e}")
+        content = await fallback_search(
+            request.app.state.fallback_index, search_query, skip, limit, year, field_list, timer
+        )
+        return timed_response(content, timer, "regular_search", "fallback")
     except Exception as e:
         return handle_error(e)
 
 @router.get("/semantic_search/")
 async def semantic_search(
-    search_query: str, skip: int = 0, limit: int = 10, year: str | None = None
+    es: ESDep,
+    search_query: str,
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: int = 10,
+    year: YearFilter = None,
+    use_cursor: bool = False,
+    cursor: str | None = None,
+    fields: str | None = None,
 ) :
+    timer = StageTimer()
     try:
-        es = get_es_client(max_retries=1, sleep_time=0)
-        embedded_query = model.encode(search_query)
-
-        query = {
-            "bool": {
-                "must": [
-                    {
-                        "knn": {
-                            "field": "embedding",
-                            "query_vector": embedded_query,
-                            # Because we have 3333 documents, we can return them all.
-                            "k": 1e4,
-                        }
-                    }
-                ]
+        if (unavailable := semantic_search_unavailable()) is not None:
+            return unavailable
+
+        field_list = parse_fields(fields)
+        query = normalize_query(search_query)
+        key = cache_key(
+            "semantic_search", [settings.INDEX_NAME_EMBEDDING],
+            search_query=query, skip=skip, limit=limit, year=year,
+            use_cursor=use_cursor, cursor=cursor, fields=field_list,
+        )
+        scope = search_cursor_scope("semantic_search", settings.INDEX_NAME_EMBEDDING, query, year, field_list)
+        cursor_state = decode_cursor(cursor, required=SEARCH_CURSOR_KEYS, scope=scope) if cursor else None
+        offset = cursor_state["offset"] if cursor_state else skip
+
+        async def compute():
+            with timer.stage("embed"):
+                embedded_query = await encode_query(search_query)
+
+            # only score as many neighbours as the requested window needs, plus one:
+            # kNN totals never exceed k, so the extra neighbour is what tells has_more
+            with timer.stage("es"):
+                response, hits, next_cursor, has_more = await paginated_search(
+                    es,
+                    index=settings.INDEX_NAME_EMBEDDING,
+                    body={
+                        "query": build_semantic_query(embedded_query, year, k=offset + limit + 1),
+                        "_source": build_source_filter(field_list),
+                    },
+                    skip=skip,
+                    limit=limit,
+                    cursor_state=cursor_state,
+                    use_cursor=use_cursor,
+                    scope=scope,
+                )
+            record_es_took(timer, response)
+
+            return {
+                "hits": hits,
+                "max_pages": None,
+                "has_more": has_more,
+                "next_cursor": next_cursor,
             }
-        }
 
-        if year:
-            query["bool"]["filter"] = [
-                {
-                    "range": {
-                        "date": {
-                            "gte": f"{year}-01-01",
-                            "lte": f"{year}-12-31",
-                            "format": "yyyy-MM-dd",
-                        }
-                    }
-                }
-            ]
+        return timed_response(await run_cached(key, compute), timer, "semantic_search", "embedding")
+    except InvalidCursorError as e:
+        return handle_cursor_error(e)
+    except Exception as e:
+        return handle_error(e)
 
-        response = es.search(
-            index=settings.INDEX_NAME_EMBEDDING,
-            body={
-                "query": query,
-                "from": skip,
-                "size": limit,
-            },
-            filter_path=[
-                "hits.hits._source",
-                "hits.hits._score",
-                "hits.total",
-            ],
-        )
+@router.get("/hybrid/")
+async def hybrid_search(
+    es: ESDep,
+    search_query: str,
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: int = 10,
+    year: YearFilter = None,
+    tokenizer: str = "Standard",
+    fusion: Literal["rrf", "weighted"] = "rrf",
+    rank_constant: Annotated[int, Query(ge=1)] = 60,
+    lexical_weight: float = 1.0,
+    semantic_weight: float = 1.0,
+    fields: str | None = None,
+) :
+    timer = StageTimer()
+    try:
+        if (unavailable := semantic_search_unavailable()) is not None:
+            return unavailable
 
-        total_hits = get_total_hits(response)
-        max_pages = calculate_max_pages(total_hits, limit)
+        # each leg has to return the whole window so the fused page is exact, plus one
+        # hit as a probe for has_more
+        window = skip + limit + 1
+        field_list = parse_fields(fields)
+        if field_list:
+            # fusion matches documents across indices on (date, title)
+            field_list = list(dict.fromkeys(field_list + ["date", "title"]))
+        source = build_source_filter(field_list)
 
-        return {
-            "hits": response["hits"].get("hits", []),
-            "max_pages": max_pages,
+        async def semantic_leg():
+            with timer.stage("embed"):
+                embedded_query = await encode_query(search_query)
+            return await es.search(
+                index=settings.INDEX_NAME_EMBEDDING,
+                body={
+                    "query": build_semantic_query(embedded_query, year, k=window),
+                    "_source": source,
+                    "size": window,
+                },
+                filter_path=SEARCH_FILTER_PATH,
+            )
+
+        # wall time of both legs together, the embed stage overlaps the lexical leg
+        with timer.stage("es"):
+            lexical_response, semantic_response = await asyncio.gather(
+                es.search(
+                    index=get_index_name(tokenizer),
+                    body={
+                        "query": build_lexical_query(search_query, year),
+                        "_source": source,
+                        "size": window,
+                    },
+                    filter_path=SEARCH_FILTER_PATH,
+                ),
+                semantic_leg(),
+            )
+        record_es_took(timer, lexical_response, semantic_response)
+
+        with timer.stage("post"):
+            result_lists = [
+                lexical_response["hits"].get("hits", []),
+                semantic_response["hits"].get("hits", []),
+            ]
+            weights = [lexical_weight, semantic_weight]
+            if fusion == "weighted":
+                fused = weighted_score_fusion(result_lists, weights)
+            else:
+                fused = reciprocal_rank_fusion(result_lists, weights, rank_constant=rank_constant)
+
+            has_more = len(fused) > skip + limit or has_more_hits(lexical_response, skip + limit)
+
+        content = {
+            "hits": fused[skip:skip + limit],
+            "max_pages": None,
+            "has_more": has_more,
         }
+        return timed_response(content, timer, "hybrid", tokenizer)
+    except Exception as e:
+        return handle_error(e)
+
+@router.get("/suggest/")
+async def suggest(
+    request: Request,
+    es: ESDep,
+    prefix: str,
+    limit: int = Query(default=10, ge=1, le=settings.SUGGEST_MAX_RESULTS),
+) :
+    timer = StageTimer()
+    try:
+        with timer.stage("trie"):
+            suggestions = request.app.state.title_trie.suggest(prefix, limit)
+        if len(suggestions) >= limit:
+            return timed_response({"suggestions": suggestions}, timer, "suggest", "trie")
+
+        # not enough hot titles for this prefix, ask the edge n-gram index within the budget;
+        # one attempt only: the client's retries would multiply the timeout past it
+        try:
+            with timer.stage("es"):
+                response = await es.options(
+                    request_timeout=settings.SUGGEST_ES_TIMEOUT, max_retries=0, retry_on_timeout=False
+                ).search(
+                    index=settings.INDEX_NAME_N_GRAM,
+                    query={"match": {"title": prefix}},
+                    size=limit,
+                    source=["title"],
+                    filter_path=["took", "hits.hits._source.title"],
+                )
+        except Exception as e:
+            logger.info(f"Suggest fallback for '{prefix}' skipped: {e}")
+            return timed_response({"suggestions": suggestions}, timer, "suggest", "trie")
+        record_es_took(timer, response)
+
+        for hit in response.body.get("hits", {}).get("hits", []):
+            title = hit["_source"]["title"]
+            if title not in suggestions:
+                suggestions.append(title)
+        return timed_response({"suggestions": suggestions[:limit]}, timer, "suggest", "n_gram")
     except Exception as e:
         return handle_error(e)
 
 @router.get("/get_docs_per_year_count/")
 async def get_docs_per_year_count(
-    search_query: str, tokenizer: str = "Standard"
+    request: Request, es: ESDep, search_query: str, tokenizer: str = "Standard"
 ) :
+    timer = StageTimer()
     try:
-        es = get_es_client(max_retries=1, sleep_time=0)
-        query = {
-            "bool": {
-                "must": [
-                    {
-                        "multi_match": {
-                            "query": search_query,
-                            "fields": ["title", "explanation"],
-                        }
-                    }
-                ]
-            }
-        }
+        fallback = get_fallback_index(request)
+        if fallback is not None:
+            with timer.stage("fallback"):
+                docs_per_year = await asyncio.to_thread(fallback.docs_per_year, search_query)
+            return timed_response({"docs_per_year": docs_per_year}, timer, "get_docs_per_year_count", "fallback")
 
-        index_name = (
-            settings.INDEX_NAME_DEFAULT if tokenizer == "Standard" else settings.INDEX_NAME_N_GRAM
-        )
-        response = es.search(
-            index=index_name,
-            body={
-                "query": query,
-                "aggs": {
-                    "docs_per_year": {
-                        "date_histogram": {
-                            "field": "date",
-                            "calendar_interval": "year",  # Group by year
-                            "format": "yyyy",  # Format the year in the response
-                        }
-                    }
-                },
-            },
-            filter_path=["aggregations.docs_per_year"],
-        )
-        return {"docs_per_year": extract_docs_per_year(response)}
+        index_name = get_index_name(tokenizer)
+        key = cache_key("get_docs_per_year_count", [index_name], search_query=" ".join(search_query.split()))
+
+        async def compute():
+            with timer.stage("es"):
+                response = await es.search(
+                    index=index_name,
+                    body={
+                        "query": build_lexical_query(search_query),
+                        "aggs": {
+                            "docs_per_year": {
+                                "date_histogram": {
+                                    "field": "date",
+                                    "calendar_interval": "year",  # Group by year
+                                    "format": "yyyy",  # Format the year in the response
+                                }
+                            }
+                        },
+                    },
+                    filter_path=["took", "aggregations.docs_per_year"],
+                )
+            record_es_took(timer, response)
+
+            with timer.stage("post"):
+                return {"docs_per_year": extract_docs_per_year(response)}
+
+        return timed_response(await run_cached(key, compute), timer, "get_docs_per_year_count", tokenizer)
     except Exception as e:
         return handle_error(e)
@@ -1,10 +1,13 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import List, Annotated, Optional
 from backend.app.models.models import User
-from backend.app.db.database import SessionDep
-from backend.app.models.schemas import UserCreate, UserResponse
+from backend.app.db.database import AsyncSessionDep
+from backend.app.config import settings
+from backend.app.models.schemas import Page, UserCreate, UserResponse
 from backend.app.utilities.crud import ( get_user_by_username, create_user, get_all_users, delete_user_by_id, )
 from backend.app.auth.oauth import get_current_user, authenticate_user
+from backend.app.utilities.pagination import InvalidCursorError
 from pwdlib import PasswordHash 
 from ..loggers.logger import logger
 
@@ -17,7 +20,7 @@ hasher = PasswordHash.recommended()
 
 '''
 USERS 
-GET    /users/                  - Get all username
+GET    /users/                  - Get all username (keyset paginated, ?cursor=)
 GET    /users/{username}        - Get userdetails by username 
 POST   /users/                  - Create new users
 PUT    /users/                  - Update referral
@@ -26,11 +29,11 @@ DELETE /users/{username}        - Delete referral
 
 # Create User
 @router.post("/", response_model=UserResponse)
-def create_new_user(user_data: UserCreate, session: SessionDep):
+async def create_new_user(user_data: UserCreate, session: AsyncSessionDep):
     """Create a new user"""
     try:
 
-        existing = get_user_by_username(session, user_data.username)
+        existing = await get_user_by_username(session, user_data.username)
         if existing:
             logger.warning(f"Username {user_data.username} already exists")
             raise HTTPException(status_code=400, detail="Username already exists")
@@ -39,10 +42,10 @@ def create_new_user(user_data: UserCreate, session: SessionDep):
             username=user_data.username,
             full_name=user_data.full_name,
             email=user_data.email,
-            password=hasher.hash(user_data.password)
+            password=await asyncio.to_thread(hasher.hash, user_data.password)
         )
 
-        new_user = create_user(session, user)
+        new_user = await create_user(session, user)
 
         logger.info(f"User created successfully: {user_data.username}")
         return new_user
@@ -55,23 +58,23 @@ def create_new_user(user_data: UserCreate, session: SessionDep):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.put("/", response_model=UserResponse)
-def update_password(
+async def update_password(
     old_password: str,
     new_password: str, 
     current_user: Annotated[User, Depends(get_current_user)],
-    session: SessionDep
+    session: AsyncSessionDep
 ):
     """Update a password"""
     try:
-        auth_user = authenticate_user(session, current_user.username, old_password)
+        auth_user = await authenticate_user(session, current_user.username, old_password)
         if not auth_user:
             logger.info(f"User {current_user.id} not found for update or password doesn't match")
             raise HTTPException(status_code=404, detail="password does not match")
         
-        current_user.password = hasher.hash(new_password)
+        current_user.password = await asyncio.to_thread(hasher.hash, new_password)
         session.add(current_user)
-        session.commit()
-        session.refresh(current_user)
+        await session.commit()
+        await session.refresh(current_user)
 
         logger.info(f"password of {current_user.id} updated successfully by user {current_user.id}")
         return current_user
@@ -82,18 +85,22 @@ def update_password(
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 # Get all users
-@router.get("/", response_model=List[UserResponse])
-def read_all_users(
-    session: SessionDep,
+@router.get("/", response_model=Page[UserResponse])
+async def read_all_users(
+    session: AsyncSessionDep,
     role: Optional[str] = None,
-    skip: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.PAGE_MAX_SIZE)] = settings.PAGE_DEFAULT_SIZE,
 ):
-    """Get all users"""
+    """Get a page of users"""
     try:
-        all_users = get_all_users(session, role, skip, limit)
+        all_users, next_cursor = await get_all_users(session, role, cursor, limit)
         logger.info("All users fetched successfully.")
-        return all_users
+        return {"items": all_users, "next_cursor": next_cursor, "limit": limit}
+
+    except InvalidCursorError as e:
+        logger.warning(f"Rejected users cursor: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
 
     except Exception as e:
         logger.error(f"Error while fetching users: {e}")
@@ -101,10 +108,10 @@ def read_all_users(
 
 # Get a user by username
 @router.get("/{username}", response_model=UserResponse)
-def read_user(username: str, session: SessionDep):
+async def read_user(username: str, session: AsyncSessionDep):
     """Get a specific user by username"""
     try:
-        user = get_user_by_username(session, username)
+        user = await get_user_by_username(session, username)
 
         if not user:
             logger.warning(f"User '{username}' not found")
@@ -122,16 +129,16 @@ def read_user(username: str, session: SessionDep):
 
 # Delete a user by username
 @router.delete("/{username}")
-def delete_user_by_username(username: str, session: SessionDep):
+async def delete_user_by_username(username: str, session: AsyncSessionDep):
     """Delete a user"""
     try:
-        user = get_user_by_username(session, username)
+        user = await get_user_by_username(session, username)
 
         if not user:
             logger.warning(f"User '{username}' not found")
             raise HTTPException(status_code=404, detail=f"User '{username}' not found")
 
-        delete_user_by_id(session, user.id)
+        await delete_user_by_id(session, user.id)
 
         logger.info(f"User '{username}' deleted successfully")
         return {"ok": True}
@@ -1,3 +1,4 @@
+import asyncio
 import jwt
 import os
 from sqlalchemy import select
@@ -8,7 +9,7 @@ from typing import Union
 
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, status, HTTPException
-from backend.app.db.database import SessionDep
+from backend.app.db.database import AsyncSessionDep
 from backend.app.models.models import User
 from backend.app.models.schemas import TokenData
 from typing import Annotated
@@ -20,9 +21,9 @@ ALGO = os.getenv("ALGO")
 
 oauth_scheme2 = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def get_user(username: str, session: SessionDep) -> User:
+async def get_user(username: str, session: AsyncSessionDep) -> User:
     statement = select(User).where(User.username == username)
-    results = session.scalars(statement)
+    results = await session.scalars(statement)
     account = results.first()
 
     if not account:
@@ -30,8 +31,8 @@ def get_user(username: str, session: SessionDep) -> User:
 
     return account
 
-def authenticate_user(session: SessionDep, username: str, password: str) :
-    user = get_user(username, session)
+async def authenticate_user(session: AsyncSessionDep, username: str, password: str) :
+    user = await get_user(username, session)
 
     from pwdlib import PasswordHash
     hasher = PasswordHash.recommended()
@@ -42,7 +43,8 @@ def authenticate_user(session: SessionDep, username: str, password: str) :
     if not isinstance(password, str):
         print(f"Password is not a string for username {username} ")
         return none
-    if not hasher.verify(password, user.password):
+    # argon2 is deliberately slow (~50 ms of CPU): keep it off the event loop
+    if not await asyncio.to_thread(hasher.verify, password, user.password):
         print(f"Password not matched of username {username}")
         return None 
     return user
@@ -74,7 +76,7 @@ def create_access_token(data: dict, expire_time: Union[timedelta, None] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth_scheme2)], session: SessionDep):
+async def get_current_user(token: Annotated[str, Depends(oauth_scheme2)], session: AsyncSessionDep):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -89,7 +91,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth_scheme2)], sessio
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
-    user = get_user(username=token_data.username, session=session)
+    user = await get_user(username=token_data.username, session=session)
     if user is None:
         raise credentials_exception
     return user
@@ -6,6 +6,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: str | None = None  # default: DATABASE_URL with its async driver (asyncpg / aiosqlite)
+    DB_POOL_SIZE: int = 10                 # connections kept open per worker
+    DB_MAX_OVERFLOW: int = 20              # extra connections opened under load, closed when returned
+    DB_POOL_TIMEOUT: float = 10.0          # seconds a request waits for a connection before a 503
+    DB_POOL_RECYCLE: int = 1800            # seconds, reconnect before the server or a proxy drops idle connections
+    DB_POOL_PRE_PING: bool = True          # test connections on checkout, survives database restarts
     SECRET_KEY: str
     ALGO: str = "HS256"
     ACCESS_TOKEN_EXPIRE: int = 30
@@ -18,6 +24,108 @@ class Settings(BaseSettings):
     INDEX_NAME_RAW : str 
     INDEX_NAME_N_GRAM : str 
 
+    # Keyset pagination of the SQL listings (users, products, merchants)
+    PAGE_DEFAULT_SIZE: int = 20
+    PAGE_MAX_SIZE: int = 100
+
+    # Bulk offer upsert (POST /product/offer/bulk)
+    OFFER_UPSERT_CHUNK_SIZE: int = 500        # offers per statement and per transaction
+    OFFER_UPSERT_MAX_BATCH: int = 10000       # offers accepted per request
+
+    # PriceHistory rollups (utilities/price_history.py)
+    PRICE_ROLLUP_ENABLED: bool = True
+    PRICE_ROLLUP_INTERVAL: float = 300        # seconds between rollup + compaction runs
+    PRICE_ROLLUP_BATCH_SIZE: int = 10000      # raw rows folded into the rollups per transaction
+    PRICE_ROLLUP_SETTLE: float = 60           # seconds; younger raw rows wait, their transaction may still be open
+    PRICE_RAW_RETENTION_DAYS: int = 90        # raw rows older than this are deleted once rolled up
+    PRICE_DAILY_RETENTION_DAYS: int = 730     # daily buckets older than this are deleted, weekly ones are kept
+    PRICE_COMPACT_BATCH_SIZE: int = 10000     # rows per delete statement
+    PRICE_SERIES_MAX_POINTS: int = 500        # default point budget of GET /product/offer/{id}/price-history
+    PRICE_SERIES_RAW_MAX_DAYS: int = 14       # auto resolution serves raw rows for ranges up to this long
+
+    # Elasticsearch client (shared AsyncElasticsearch created in the lifespan)
+    ES_URL: str = "https://localhost:9200"
+    ES_USERNAME: str = "elastic"
+    ES_PASSWORD: str = ""
+    ES_VERIFY_CERTS: bool = False
+    ES_MAX_CONNECTIONS: int = 10        # pooled connections per node
+    ES_REQUEST_TIMEOUT: float = 5.0     # seconds, per request
+    ES_MAX_RETRIES: int = 2
+    ES_HEALTH_INTERVAL: float = 10.0    # seconds between health probes
+
+    # Embedding model
+    SEMANTIC_SEARCH_ENABLED: bool = True  # False: never load the model, semantic/hybrid answer 503
+    EMBEDDING_WARMUP: bool = True          # load the model in the lifespan instead of on first request
+    EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"           # torch | onnx | onnx-int8 (needs sentence-transformers[onnx]) | hashing (benchmarks)
+    EMBEDDING_ONNX_FILE: str | None = None     # ONNX file inside the model repo, e.g. onnx/model_quint8_avx2.onnx
+
+    # Query embedding cache (semantic search)
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL: float = 86400  # seconds
+    EMBEDDING_CACHE_PATH: str | None = None  # sqlite file shared by all workers, e.g. data/embedding_cache.db
+
+    # Micro-batching of concurrent query encodes
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_WINDOW_MS: float = 5.0
+    EMBEDDING_WORKERS: int = 1  # encode threads, torch already parallelises inside a batch
+
+    # Search pagination
+    SEARCH_PIT_KEEP_ALIVE: str = "1m"  # how long a cursor stays valid between pages
+    KNN_CANDIDATE_FACTOR: int = 4      # num_candidates = k * factor
+    KNN_MIN_CANDIDATES: int = 100
+
+    # Search response cache, keyed on index generations
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_SIZE: int = 2048
+    RESULT_CACHE_TTL: float = 600      # seconds, upper bound only; generations do the invalidation
+    RESULT_CACHE_BACKEND: str = "memory"  # memory | sqlite (shared by the workers of one host)
+    RESULT_CACHE_PATH: str = str(BASE_DIR / "data" / "result_cache.db")
+    INDEX_GENERATIONS_PATH: str = str(BASE_DIR / "data" / "index_generations.json")
+
+    # Typeahead (/search/suggest/)
+    SUGGEST_TRIE_SIZE: int = 5000          # hot titles kept in the in-process trie
+    SUGGEST_REFRESH_INTERVAL: float = 300  # seconds
+    SUGGEST_MAX_RESULTS: int = 10
+    SUGGEST_ES_TIMEOUT: float = 0.015      # seconds, ES fallback when the trie has too few matches
+
+    # Bulk indexing (index_data*.py / index_name_raw.py)
+    BULK_CHUNK_SIZE: int = 500                  # documents per _bulk request
+    BULK_MAX_CHUNK_BYTES: int = 10 * 1024 * 1024  # and at most this many bytes of NDJSON
+    BULK_THREADS: int = 4                       # _bulk requests in flight
+    BULK_MAX_RETRIES: int = 5                   # for documents rejected with 429
+    BULK_INITIAL_BACKOFF: float = 1.0           # seconds, doubled per retry
+    BULK_MAX_BACKOFF: float = 60.0
+    BULK_MAX_FAILED: int = 0                    # rejected documents a rebuild may have and still be published
+
+    # Versioned rebuilds: INDEX_NAME_* are aliases over <alias>-v<timestamp> indices
+    REINDEX_KEEP_GENERATIONS: int = 2         # physical indices kept per alias, for rollback
+    REINDEX_REPLICAS: int = 1                 # restored after the load (0 while loading)
+    REINDEX_REFRESH_INTERVAL: str = "1s"      # restored after the load (-1 while loading)
+    REINDEX_FORCE_MERGE_SEGMENTS: int = 1
+    REINDEX_FORCE_MERGE_TIMEOUT: float = 3600  # seconds
+
+    # Single-pass ingest (search/ingest.py)
+    INGEST_QUEUE_SIZE: int = 1000             # documents buffered per index writer
+
+    # Document encoding for the embedding index (index_data_embedding.py)
+    EMBEDDING_INDEX_BATCH_SIZE: int = 64
+    EMBEDDING_INDEX_PROCESSES: int = 1        # encode processes, 0 = one per CPU core
+    EMBEDDING_INDEX_SORT_WINDOW: int = 4096   # documents sorted by length together to cut padding
+    EMBEDDING_STORE_PATH: str | None = None   # content-hash store of document vectors, e.g. data/embedding_store
+    EMBEDDING_STORE_DTYPE: str = "float32"    # float32 | float16 (half the disk, ~1e-3 error)
+
+    # Product index kept in sync with SQL through the search_outbox table
+    INDEX_NAME_PRODUCT: str = "products"
+    OUTBOX_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 500              # outbox rows per drain
+    OUTBOX_POLL_INTERVAL: float = 1.0         # seconds between drains once the outbox is empty
+    OUTBOX_MAX_ATTEMPTS: int = 10             # rows failing this often are left for inspection
+    OUTBOX_RETENTION: float = 86400           # seconds processed rows are kept
+
+    # Embedded BM25 engine serving regular_search while ES is down
+    FALLBACK_CORPUS_PATH: str | None = None  # same JSON the indexing scripts load, e.g. data1/apod.json
+
     model_config = {
         "extra": "allow",
         "env_file": str(BASE_DIR / ".env")
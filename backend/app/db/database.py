@@ -1,25 +1,97 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 from backend.app.config import settings
-from typing import Annotated
-from fastapi import Depends
+from backend.app.loggers.logger import logger
+from backend.app.utilities.metrics import Counter, Gauge, Histogram
+from typing import Annotated, AsyncIterator
+from fastapi import Depends, HTTPException
+
+# async drivers of the sync URLs found in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
 
 URL_DATABASE = settings.DATABASE_URL
-engine = create_engine(URL_DATABASE)
+
+# sync engine: create_table(), indexing scripts and the outbox worker's thread
+engine = create_engine(URL_DATABASE, pool_pre_ping=settings.DB_POOL_PRE_PING, pool_recycle=settings.DB_POOL_RECYCLE)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async engine: every API request
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or async_database_url(URL_DATABASE),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+# objects stay readable after commit: the response is serialized once the session is gone
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 Base = declarative_base()
 
+# ========== pool metrics ==========
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time a request waited for a pooled database connection"
+)
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections handed out by the pool")
+DB_POOL_CONNECTS = Counter("db_pool_connects_total", "New database connections opened by the pool")
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Requests rejected after waiting DB_POOL_TIMEOUT for a connection")
+
+_pool = async_engine.sync_engine.pool
+for name, documentation, read in (
+    ("db_pool_size", "Configured connections kept open", lambda: _pool.size()),
+    ("db_pool_checked_out", "Connections currently in use", lambda: _pool.checkedout()),
+    ("db_pool_overflow", "Connections open beyond db_pool_size", lambda: max(_pool.overflow(), 0)),
+):
+    if hasattr(_pool, "checkedout"):
+        Gauge(name, documentation).set_function(read)
+
+event.listen(async_engine.sync_engine, "checkout", lambda *args: DB_POOL_CHECKOUTS.inc())
+event.listen(async_engine.sync_engine, "connect", lambda *args: DB_POOL_CONNECTS.inc())
+
 def get_db():
     db = SessionLocal()
     try:
-        yield db 
-    finally: 
-        db.close() 
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as session:
+        # check the connection out up front so the wait for the pool is measured on its own
+        started = time.perf_counter()
+        try:
+            await session.connection()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            logger.warning(f"No database connection free after {settings.DB_POOL_TIMEOUT}s")
+            raise HTTPException(status_code=503, detail="Database busy, try again")
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+        yield session
 
-def create_table(): 
+def create_table():
     Base.metadata.create_all(bind=engine)
+    # create_all() skips tables that already exist: add indexes declared on them since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
-SessionDep = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
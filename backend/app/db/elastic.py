@@ -0,0 +1,54 @@
+import asyncio
+from typing import Annotated
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+from fastapi import Depends, FastAPI, Request
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+
+def es_connection_options() -> dict:
+    """Cluster address and credentials shared by the API client and the indexing scripts"""
+    return {
+        "hosts": settings.ES_URL,
+        "basic_auth": (settings.ES_USERNAME, settings.ES_PASSWORD),
+        "verify_certs": settings.ES_VERIFY_CERTS,
+        "ssl_show_warn": False,
+    }
+
+def create_es_client() -> AsyncElasticsearch:
+    """Build the application wide AsyncElasticsearch client (one pool per worker)"""
+    return AsyncElasticsearch(
+        **es_connection_options(),
+        connections_per_node=settings.ES_MAX_CONNECTIONS,
+        request_timeout=settings.ES_REQUEST_TIMEOUT,
+        max_retries=settings.ES_MAX_RETRIES,
+        retry_on_timeout=True,
+        http_compress=True,
+    )
+
+def create_sync_es_client() -> Elasticsearch:
+    """Sync client of the same cluster for indexing scripts and CLIs (their own timeouts)"""
+    return Elasticsearch(**es_connection_options())
+
+async def es_health_probe(app: FastAPI) -> None:
+    """Ping Elasticsearch in the background and keep app.state.es_healthy up to date"""
+    while True:
+        try:
+            healthy = await app.state.es.options(request_timeout=2).ping()
+        except Exception:
+            healthy = False
+
+        if healthy != app.state.es_healthy:
+            if healthy:
+                logger.info("Elasticsearch health probe: cluster reachable")
+            else:
+                logger.warning("Elasticsearch health probe: cluster unreachable")
+        app.state.es_healthy = healthy
+
+        await asyncio.sleep(settings.ES_HEALTH_INTERVAL)
+
+def get_es(request: Request) -> AsyncElasticsearch:
+    return request.app.state.es
+
+ESDep = Annotated[AsyncElasticsearch, Depends(get_es)]
@@ -1,8 +1,17 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI 
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from backend.app.db.database import create_table
+from backend.app.config import settings
+from backend.app.db.database import async_engine, create_table
+from backend.app.db.elastic import create_es_client, es_health_probe
+from backend.app.utilities.bm25 import load_fallback_index
+from backend.app.utilities.metrics import render_metrics
+from backend.app.utilities.outbox import outbox_worker
+from backend.app.utilities.price_history import price_rollup_worker
+from backend.app.utilities.suggest import TitleTrie, title_trie_refresher
 from backend.app.api import (
     category, users, auth, product, merchant, search
 )
@@ -10,8 +19,36 @@ from backend.app.api import (
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_table()
+
+    app.state.es = create_es_client()
+    app.state.es_healthy = False
+    health_probe = asyncio.create_task(es_health_probe(app))
+
+    app.state.title_trie = TitleTrie([])
+    trie_refresher = asyncio.create_task(title_trie_refresher(app))
+
+    app.state.fallback_index = None
+    fallback_loader = asyncio.create_task(load_fallback_index(app))
+
+    # the model loads in the background; /health reports when it is ready
+    background = [health_probe, trie_refresher, fallback_loader]
+    if settings.OUTBOX_ENABLED:
+        background.append(asyncio.create_task(outbox_worker(app)))
+    if settings.PRICE_ROLLUP_ENABLED:
+        background.append(asyncio.create_task(price_rollup_worker()))
+    if settings.SEMANTIC_SEARCH_ENABLED and settings.EMBEDDING_WARMUP:
+        background.append(asyncio.create_task(search.model.warm()))
+
     yield
 
+    for task in background:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await app.state.es.close()
+    await async_engine.dispose()
+    search.embedder.close()
+
 app = FastAPI(
     title="Sasto Kinmel",
     description="sasto kinmel",
@@ -39,11 +76,18 @@ def root():
     return {"message": "Sasto Kinmel", "status": "running"}
 
 @app.get("/health")
-def health_check(): 
+def health_check(request: Request): 
     return {
         "status": "healthy", 
+        "elasticsearch": "up" if request.app.state.es_healthy else "down",
+        "fallback_search": request.app.state.fallback_index is not None,
+        "embedding_model": search.model.status if settings.SEMANTIC_SEARCH_ENABLED else "disabled",
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return render_metrics()
+
 app.include_router(users.router)
 app.include_router(auth.router)
 app.include_router(category.router)
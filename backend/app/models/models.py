@@ -3,7 +3,7 @@ import enum
 from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import ( String, Integer, ForeignKey, DateTime, Boolean, Numeric, Enum as SAEnum, Text )
+from sqlalchemy import ( String, Integer, ForeignKey, DateTime, Boolean, Numeric, Enum as SAEnum, Text, Index )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from ..db.database import Base 
 
@@ -11,8 +11,12 @@ class RoleEnum(str, enum.Enum):
     user = "user"
     admin = "admin"
 
+# indexes ending in id back the keyset pagination orders (see utilities/pagination.py)
 class User(Base): 
     __tablename__ = "user"
+    __table_args__ = (
+        Index("ix_user_role_id", "role", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(String(100), unique=True, index=True)
@@ -35,6 +39,9 @@ class Category(Base):
 
 class Merchant(Base): 
     __tablename__ = "merchant"
+    __table_args__ = (
+        Index("ix_merchant_name_id", "name", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[int] = mapped_column(String(150))
@@ -45,6 +52,11 @@ class Merchant(Base):
 
 class Product(Base): 
     __tablename__ = "product"
+    __table_args__ = (
+        Index("ix_product_name_id", "name", "id"),
+        Index("ix_product_category_id_id", "category_id", "id"),
+        Index("ix_product_category_id_name_id", "category_id", "name", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(150), index=True)
@@ -59,6 +71,10 @@ class Product(Base):
 
 class Offer(Base):
     __tablename__ = "offer"
+    __table_args__ = (
+        # one offer per merchant and product: the conflict target of the bulk upsert
+        Index("uq_offer_product_merchant", "product_id", "merchant_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -82,6 +98,10 @@ class Offer(Base):
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
+    __table_args__ = (
+        Index("ix_price_history_offer_id_recorded_at", "offer_id", "recorded_at"),  # series of one offer
+        Index("ix_price_history_recorded_at", "recorded_at"),                        # retention deletes
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     offer_id: Mapped[int] = mapped_column(ForeignKey("offer.id"))
@@ -91,6 +111,29 @@ class PriceHistory(Base):
 
     offer: Mapped["Offer"] = relationship(back_populates="price_history")
 
+class PriceRollup(Base):
+    """Daily / weekly aggregates of PriceHistory, maintained by utilities/price_history.py"""
+    __tablename__ = "price_rollup"
+
+    offer_id: Mapped[int] = mapped_column(ForeignKey("offer.id"), primary_key=True)
+    resolution: Mapped[str] = mapped_column(String(10), primary_key=True)  # day | week
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+    min_price: Mapped[Decimal] = mapped_column(Numeric(10, 2))
+    max_price: Mapped[Decimal] = mapped_column(Numeric(10, 2))
+    price_sum: Mapped[Decimal] = mapped_column(Numeric(14, 2))  # avg = price_sum / samples, mergeable
+    samples: Mapped[int] = mapped_column(Integer)
+    last_price: Mapped[Decimal] = mapped_column(Numeric(10, 2))
+    last_recorded_at: Mapped[datetime] = mapped_column(DateTime)
+
+class RollupState(Base):
+    """Watermark of an incremental job: the last source row id it has consumed"""
+    __tablename__ = "rollup_state"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    last_id: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 class Referral(Base):
     __tablename__ = "referral"
 
@@ -106,6 +149,22 @@ class Referral(Base):
     user: Mapped[Optional["User"]] = relationship(back_populates="referrals")
     offer: Mapped["Offer"] = relationship(back_populates="referrals")
 
+class SearchOutbox(Base):
+    """Product changes waiting to be applied to the search index, written in the same transaction"""
+    __tablename__ = "search_outbox"
+    # the id is the external version of the search document: SQLite must never reuse one
+    # after the retention purge empties the table (see utilities/outbox.py)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, index=True)
+    op: Mapped[str] = mapped_column(String(10), default="upsert")  # upsert | delete
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+
 class RedirectResponse(Base):
     __tablename__ = "redirect_response"
 
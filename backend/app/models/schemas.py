@@ -1,9 +1,17 @@
-from pydantic import BaseModel, field_validator, EmailStr
+from pydantic import BaseModel, Field, field_validator, EmailStr
 from datetime import datetime
-from typing import Optional, List
+from typing import Generic, Optional, List, TypeVar
 from enum import Enum 
 from decimal import Decimal
 
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    """One page of a listing; pass next_cursor back as `cursor` for the following one"""
+    items: List[T]
+    next_cursor: Optional[str] = None
+    limit: int
+
 class Role(str, Enum): 
     user = "user"
     admin = "admin"
@@ -68,10 +76,12 @@ class OfferResponse(BaseModel):
     is_in_stock: bool
     last_scraped_at: datetime
 
-    Merchant: Optional[MerchantResponse] = None 
+    # read from Offer.merchant, still serialized under its original key
+    Merchant: Optional[MerchantResponse] = Field(default=None, validation_alias="merchant")
 
     model_config = {
-        "from_attributes": True
+        "from_attributes": True,
+        "populate_by_name": True,
     }
 
 
@@ -89,7 +99,11 @@ class ProductResponse(BaseModel):
     description: Optional[str]
     image_url: str 
     category: Optional[CategoryResponse]
-    offer: Optional[OfferResponse] = None 
+    offer: Optional[OfferResponse] = None  # best in-stock offer
+
+    model_config = {
+        "from_attributes": True
+    }
 
 class OfferCreate(BaseModel): 
     product_id: int 
@@ -100,6 +114,33 @@ class OfferCreate(BaseModel):
     discount_percent: float
     is_in_stock: bool = True
 
+class OfferUpsert(BaseModel):
+    product_id: int
+    merchant_id: int
+    affiliate_url: str
+    original_price: Decimal
+    current_price: Decimal
+    discount_percent: Optional[float] = None  # computed from the prices when missing
+    is_in_stock: bool = True
+
+class OfferBulkUpsert(BaseModel):
+    offers: List[OfferUpsert]
+
+class OfferRejected(BaseModel):
+    product_id: int
+    merchant_id: int
+    reason: str
+
+class OfferBulkResult(BaseModel):
+    received: int
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    price_changes: int = 0  # PriceHistory rows appended
+    chunks: int = 0  # committed
+    failed_chunks: int = 0  # rolled back, their rows are in `rejected`
+    rejected: List[OfferRejected] = []
+
 class PriceHistoryResponse(BaseModel): 
     price: Decimal 
     recorded_at: datetime
@@ -108,6 +149,22 @@ class PriceHistoryResponse(BaseModel):
         "from_attributes": True 
     }
 
+class PricePoint(BaseModel):
+    t: datetime  # bucket start, or the recording time of a raw row
+    min: Decimal
+    max: Decimal
+    avg: Decimal
+    last: Decimal
+    samples: int
+
+class PriceSeriesResponse(BaseModel):
+    offer_id: int
+    resolution: str  # raw | day | week
+    start: datetime
+    end: datetime
+    truncated: bool = False  # more points than max_points: only the newest were kept
+    points: List[PricePoint]
+
 class ReferralCreate(BaseModel): 
     user_id: int 
     offer_id: int
@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import psutil
+from fastapi import FastAPI
+
+from backend.app.api import search
+from backend.app.config import settings
+from backend.app.search import index_data, index_data_embedding, index_name_raw
+from backend.app.search.local_es import LocalElasticsearch
+from backend.app.utilities.cache import index_generations
+from backend.app.utilities.embedding import HashingEmbeddingBackend, LazyEmbeddingModel
+from backend.app.utilities.suggest import TitleTrie
+
+'''
+Offline search benchmark.
+
+Generates a synthetic APOD shaped corpus, builds all four indices with the real
+indexing scripts against an in-process Elasticsearch stand-in (local_es), then drives
+the search router in-process with a configurable concurrency and query mix. Results
+(p50 / p95 / p99 latency, QPS, CPU, RSS) are written as JSON so runs of two commits
+can be diffed:
+
+    python -m backend.app.search.benchmark --docs 10000 --concurrency 16 --requests 2000 \\
+        --mix regular=6,semantic=3,docs_per_year=1 --output bench.json --baseline old.json
+
+Queries go through the ASGI app (routing, validation, caching, serialization) but not
+through a socket. Embeddings come from the model free `hashing` backend unless
+--embedding-backend names a real one, and the stand-in runs in the same process, so
+CPU and RSS include the "cluster". Compare runs on the same box only.
+'''
+
+VOCABULARY = (
+    "galaxy nebula star cluster comet moon mars jupiter saturn venus mercury neptune "
+    "uranus pluto sun solar eclipse aurora milky way andromeda spiral elliptical dwarf "
+    "supernova remnant pulsar black hole quasar telescope hubble webb chandra spitzer "
+    "cassini juno voyager rover crater ridge dune ice rings orbit planet exoplanet "
+    "asteroid meteor shower fireball horizon sunset sunrise twilight zodiacal light "
+    "dust gas hydrogen emission reflection dark globular open infrared ultraviolet "
+    "x-ray radio wavelength image mosaic panorama composite exposure sky night "
+    "observatory mountain lake desert clouds lightning volcano northern southern "
+    "cross pleiades orion taurus cygnus sagittarius scorpius lyra perseus cassiopeia "
+    "bright faint distant nearby young old massive tiny glowing colorful blue red "
+    "green yellow core arm halo jet tail shock wave bubble filament pillar disk"
+).split()
+
+MEDIA_TYPES = ("image", "image", "image", "video")
+ENDPOINTS = ("regular", "semantic", "docs_per_year", "hybrid")
+
+# ========== synthetic corpus ==========
+def _zipf_weights(size: int) -> List[float]:
+    return [1 / rank for rank in range(1, size + 1)]
+
+def synthetic_documents(count: int, seed: int = 0, raw: bool = False) -> List[dict]:
+    """
+    APOD shaped documents (date, title, explanation, url, media_type, ...) with words
+    drawn from a Zipf distribution. `raw` wraps some words in HTML, like apod_raw.json.
+    """
+    rng = random.Random(seed)
+    weights = _zipf_weights(len(VOCABULARY))
+    start = date(1995, 6, 16)
+    documents = []
+    for i in range(count):
+        title_words = rng.choices(VOCABULARY, weights, k=rng.randint(2, 6))
+        words = rng.choices(VOCABULARY, weights, k=rng.randint(60, 180))
+        if raw:
+            words = [f"<a href=\"ap{i}.html\">{word}</a>" if rng.random() < 0.03 else word for word in words]
+            title_words[0] = f"<b>{title_words[0]}</b>"
+        day = start + timedelta(days=i % 11000)
+        documents.append({
+            "date": day.isoformat(),
+            "title": " ".join(title_words).title(),
+            "explanation": " ".join(words).capitalize() + ".",
+            "url": f"https://apod.nasa.gov/apod/image/{day:%y%m}/synthetic_{i}.jpg",
+            "media_type": MEDIA_TYPES[i % len(MEDIA_TYPES)],
+            "service_version": "v1",
+        })
+    return documents
+
+def synthetic_queries(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    weights = _zipf_weights(len(VOCABULARY))
+    return [" ".join(rng.choices(VOCABULARY, weights, k=rng.randint(1, 3))) for _ in range(count)]
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """`regular=6,semantic=3,docs_per_year=1` -> normalized weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' in --mix, expected one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("--mix weights must add up to more than 0")
+    return {name: weight / total for name, weight in weights.items() if weight > 0}
+
+# ========== measurement ==========
+def latency_summary(samples: List[float], wall_seconds: float) -> dict:
+    if not samples:
+        return {"requests": 0}
+    latencies = np.asarray(samples) * 1000
+    return {
+        "requests": len(samples),
+        "qps": len(samples) / wall_seconds if wall_seconds else 0.0,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+    }
+
+class ResourceSampler:
+    """CPU seconds and RSS (sampled in a thread) of this process between start() and stop()"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rss: List[int] = []
+
+    def start(self) -> "ResourceSampler":
+        self._cpu = self.process.cpu_times()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self._rss.append(self.process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        wall = time.perf_counter() - self._started
+        cpu = self.process.cpu_times()
+        cpu_seconds = (cpu.user - self._cpu.user) + (cpu.system - self._cpu.system)
+        rss = self._rss or [self.process.memory_info().rss]
+        return {
+            "wall_seconds": wall,
+            "cpu_seconds": cpu_seconds,
+            "cpu_percent": 100 * cpu_seconds / wall if wall else 0.0,
+            "rss_mb": rss[-1] / 2**20,
+            "peak_rss_mb": max(rss) / 2**20,
+        }
+
+# ========== indexing ==========
+def build_indices(es: LocalElasticsearch, documents: List[dict], raw_documents: List[dict], model) -> dict:
+    """Run the three indexing scripts (index_data twice, one per tokenizer) against `es`"""
+    steps = [
+        (settings.INDEX_NAME_DEFAULT, lambda: index_data.index_data(documents, use_n_gram_tokenizer=False, es=es)),
+        (settings.INDEX_NAME_N_GRAM, lambda: index_data.index_data(documents, use_n_gram_tokenizer=True, es=es)),
+        (settings.INDEX_NAME_RAW, lambda: index_name_raw.index_data(raw_documents, es=es)),
+        (settings.INDEX_NAME_EMBEDDING, lambda: index_data_embedding.index_data(documents, model=model, es=es)),
+    ]
+    results = {}
+    for index_name, step in steps:
+        sampler = ResourceSampler().start()
+        step()
+        usage = sampler.stop()
+        results[index_name] = {**usage, "docs_per_second": len(documents) / usage["wall_seconds"]}
+    return results
+
+# ========== query load ==========
+def build_app(es: LocalElasticsearch) -> FastAPI:
+    """The search router alone, wired to the stand-in the way the lifespan wires ES"""
+    app = FastAPI()
+    app.include_router(search.router)
+    app.state.es = es.as_async()
+    app.state.es_healthy = True
+    app.state.fallback_index = None
+    app.state.title_trie = TitleTrie([])
+    return app
+
+def request_for(endpoint: str, query: str, rng: random.Random) -> tuple[str, dict]:
+    tokenizer = rng.choice(("Standard", "n_gram"))
+    if endpoint == "regular":
+        return "/search/regular_search/", {"search_query": query, "tokenizer": tokenizer, "limit": 10}
+    if endpoint == "semantic":
+        return "/search/semantic_search/", {"search_query": query, "limit": 10}
+    if endpoint == "hybrid":
+        return "/search/hybrid/", {"search_query": query, "tokenizer": tokenizer, "limit": 10}
+    return "/search/get_docs_per_year_count/", {"search_query": query, "tokenizer": tokenizer}
+
+async def drive(
+    app: FastAPI,
+    mix: Dict[str, float],
+    queries: List[str],
+    concurrency: int,
+    requests: int,
+    warmup: int = 50,
+    seed: int = 2,
+) -> dict:
+    rng = random.Random(seed)
+    endpoints, weights = zip(*mix.items())
+    plan = [
+        (endpoint, *request_for(endpoint, rng.choice(queries), rng))
+        for endpoint in rng.choices(endpoints, weights, k=warmup + requests)
+    ]
+    latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in endpoints}
+    errors: Dict[str, int] = {endpoint: 0 for endpoint in endpoints}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for endpoint, path, params in plan[:warmup]:
+            await client.get(path, params=params)
+
+        pending = iter(plan[warmup:])
+
+        async def worker():
+            for endpoint, path, params in pending:
+                started = time.perf_counter()
+                response = await client.get(path, params=params)
+                elapsed = time.perf_counter() - started
+                if response.status_code == 200:
+                    latencies[endpoint].append(elapsed)
+                else:
+                    errors[endpoint] += 1
+
+        sampler = ResourceSampler().start()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        usage = sampler.stop()
+
+    wall = usage["wall_seconds"]
+    per_endpoint = {
+        endpoint: {**latency_summary(latencies[endpoint], wall), "errors": errors[endpoint]}
+        for endpoint in endpoints
+    }
+    everything = [latency for samples in latencies.values() for latency in samples]
+    return {
+        "overall": {**latency_summary(everything, wall), "errors": sum(errors.values()), **usage},
+        "endpoints": per_endpoint,
+    }
+
+# ========== reporting ==========
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: dict, baseline: dict) -> List[str]:
+    """One line per endpoint with the p50 / p95 / p99 / QPS change against `baseline`"""
+    lines = []
+    for endpoint, stats in {"overall": current["search"]["overall"], **current["search"]["endpoints"]}.items():
+        before = baseline["search"]["overall"] if endpoint == "overall" else baseline["search"]["endpoints"].get(endpoint)
+        if not before or not before.get("requests") or not stats.get("requests"):
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "qps"):
+            delta = 100 * (stats[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            changes.append(f"{metric} {before[metric]:.2f} -> {stats[metric]:.2f} ({delta:+.1f}%)")
+        lines.append(f"{endpoint}: " + ", ".join(changes))
+    return lines
+
+def run(args: argparse.Namespace) -> dict:
+    mix = parse_mix(args.mix)
+
+    started = time.perf_counter()
+    documents = synthetic_documents(args.docs, seed=args.seed)
+    raw_documents = synthetic_documents(args.docs, seed=args.seed, raw=True)
+    queries = synthetic_queries(args.queries, seed=args.seed + 1)
+    corpus_seconds = time.perf_counter() - started
+
+    if args.embedding_backend == "hashing":
+        embedding_model = HashingEmbeddingBackend()
+        search.model = LazyEmbeddingModel("hashing")
+    else:
+        embedding_model = search.model = LazyEmbeddingModel(args.embedding_backend)
+
+    # measure the search path itself, not the caches in front of it
+    if not args.cache:
+        search.result_cache.enabled = False
+        search.embedding_cache.max_size = 0
+
+    # the indexing scripts bump generations; keep them away from the real deployment's file
+    index_generations.path = os.path.join(tempfile.mkdtemp(prefix="benchmark-"), "index_generations.json")
+
+    es = LocalElasticsearch()
+    indexing = build_indices(es, documents, raw_documents, embedding_model)
+    search_results = asyncio.run(
+        drive(build_app(es), mix, queries, args.concurrency, args.requests, args.warmup, args.seed + 2)
+    )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_backend": args.embedding_backend,
+        },
+        "config": {
+            "docs": args.docs,
+            "queries": args.queries,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "mix": mix,
+            "cache": args.cache,
+            "seed": args.seed,
+        },
+        "corpus_seconds": corpus_seconds,
+        "indexing": indexing,
+        "search": search_results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline indexing and search benchmark on a synthetic corpus")
+    parser.add_argument("--docs", type=int, default=10000, help="synthetic documents, e.g. 10000 to 1000000")
+    parser.add_argument("--queries", type=int, default=1000, help="distinct synthetic queries")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests, after the warm up")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="regular=6,semantic=3,docs_per_year=1",
+                        help="endpoint weights: regular, semantic, docs_per_year, hybrid")
+    parser.add_argument("--embedding-backend", default="hashing", help="hashing | torch | onnx | onnx-int8")
+    parser.add_argument("--cache", action="store_true", help="keep the result and query embedding caches on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = run(args)
+    report = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+    overall = results["search"]["overall"]
+    print(
+        f"{overall['requests']} requests, {overall['errors']} errors, {overall['qps']:.1f} QPS, "
+        f"p50 {overall['p50_ms']:.1f} ms, p95 {overall['p95_ms']:.1f} ms, p99 {overall['p99_ms']:.1f} ms, "
+        f"cpu {overall['cpu_percent']:.0f}%, peak rss {overall['peak_rss_mb']:.0f} MB"
+    )
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("\n".join(compare(results, baseline)))
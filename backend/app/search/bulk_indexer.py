@@ -0,0 +1,250 @@
+import hashlib
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import orjson
+from elastic_transport import ConnectionError as ESConnectionError, ConnectionTimeout
+from elasticsearch import ApiError, Elasticsearch
+from tqdm import tqdm
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+
+'''
+Streaming, chunked, parallel _bulk indexing shared by the index builders.
+
+Documents are pulled from a generator, serialized once to NDJSON and cut into chunks
+bounded by BULK_CHUNK_SIZE documents and BULK_MAX_CHUNK_BYTES bytes. BULK_THREADS
+chunks are in flight at a time and the generator is only advanced when one returns,
+so memory stays flat no matter how large the corpus is.
+
+Items rejected with 429 (write queue full) are resent with exponential backoff, any
+other per-item error is recorded in BulkStats.failures instead of being ignored.
+A request that fails in transport (connection error, timeout) may still have been
+applied, so the chunk is resent only when every action in it has an `_id` (a resend
+overwrites instead of duplicating); otherwise its documents are counted as failed.
+The APOD builders pass id_fn=apod_document_id for exactly that reason.
+
+    stats = bulk_index(es, settings.INDEX_NAME_DEFAULT, documents)
+
+A document may carry `_id` (explicit document id), `_op_type` (index | create |
+delete) and `_version` (external version, older writes are rejected with 409) keys,
+which are moved to the action line.
+'''
+
+RETRY_STATUS = 429
+MAX_REPORTED_FAILURES = 100
+IdFn = Callable[[dict], str]
+
+class BulkIndexError(RuntimeError):
+    pass
+
+class BulkStats:
+    def __init__(self):
+        self.indexed = 0
+        self.failed = 0
+        self.retried = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.failures: List[dict] = []
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.indexed / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 2**20 / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "indexed": self.indexed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "docs_per_second": self.docs_per_second,
+            "mb_per_second": self.mb_per_second,
+            "failures": self.failures,
+        }
+
+def apod_document_id(document: dict) -> str:
+    """Stable id of an APOD entry: one picture per date, the title tells rare same-day entries apart"""
+    key = f"{document.get('date')}|{document.get('title')}"
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+def _has_id(entry: bytes) -> bool:
+    action = orjson.loads(entry.split(b"\n", 1)[0])
+    return "_id" in next(iter(action.values()))
+
+def serialize_action(index_name: str, document: dict) -> bytes:
+    """One NDJSON action (+ source) entry; numpy vectors are serialized natively"""
+    document = dict(document)
+    op_type = document.pop("_op_type", "index")
+    action = {"_index": index_name}
+    if "_id" in document:
+        action["_id"] = str(document.pop("_id"))
+    if "_version" in document:
+        action["version"] = int(document.pop("_version"))
+        action["version_type"] = "external"
+
+    lines = orjson.dumps({op_type: action}) + b"\n"
+    if op_type != "delete":
+        lines += orjson.dumps(document, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+    return lines
+
+def chunk_actions(
+    index_name: str,
+    documents: Iterable[dict],
+    chunk_size: int,
+    max_chunk_bytes: int,
+    id_fn: Optional[IdFn] = None,
+) -> Iterator[List[bytes]]:
+    chunk: List[bytes] = []
+    chunk_bytes = 0
+    for document in documents:
+        if id_fn is not None and "_id" not in document:
+            document = {**document, "_id": id_fn(document)}
+        entry = serialize_action(index_name, document)
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + len(entry) > max_chunk_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(entry)
+        chunk_bytes += len(entry)
+    if chunk:
+        yield chunk
+
+class BulkIndexer:
+    def __init__(
+        self,
+        es: Elasticsearch,
+        index_name: str,
+        pipeline: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        max_chunk_bytes: Optional[int] = None,
+        threads: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        initial_backoff: Optional[float] = None,
+        max_backoff: Optional[float] = None,
+        id_fn: Optional[IdFn] = None,
+    ):
+        self.es = es
+        self.id_fn = id_fn
+        self.index_name = index_name
+        self.pipeline = pipeline
+        self.chunk_size = chunk_size or settings.BULK_CHUNK_SIZE
+        self.max_chunk_bytes = max_chunk_bytes or settings.BULK_MAX_CHUNK_BYTES
+        self.threads = threads or settings.BULK_THREADS
+        self.max_retries = settings.BULK_MAX_RETRIES if max_retries is None else max_retries
+        self.initial_backoff = settings.BULK_INITIAL_BACKOFF if initial_backoff is None else initial_backoff
+        self.max_backoff = max_backoff or settings.BULK_MAX_BACKOFF
+
+    def _backoff(self, attempt: int) -> None:
+        time.sleep(min(self.initial_backoff * 2 ** attempt, self.max_backoff))
+
+    def _send(self, chunk: List[bytes]) -> dict:
+        """Send one chunk; returns its counts and failures after retrying 429s"""
+        result = {"indexed": 0, "failed": 0, "retried": 0, "bytes": sum(map(len, chunk)), "failures": []}
+        pending = chunk
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.es.bulk(operations=b"".join(pending), pipeline=self.pipeline)
+            except (ApiError, ESConnectionError, ConnectionTimeout) as e:
+                status = getattr(e, "status_code", None) if isinstance(e, ApiError) else None
+                if isinstance(e, ApiError) and status != RETRY_STATUS:
+                    raise
+                if not isinstance(e, ApiError) and not all(map(_has_id, pending)):
+                    # ES may have applied it: resending documents without _id would index them twice
+                    logger.error(
+                        f"_bulk request to '{self.index_name}' failed in transport ({e}), "
+                        f"not resending {len(pending)} documents without _id"
+                    )
+                    result["failed"] += len(pending)
+                    result["failures"].append({"_id": None, "status": None, "error": f"transport: {e}", "documents": len(pending)})
+                    return result
+                if attempt == self.max_retries:
+                    raise BulkIndexError(f"_bulk request failed after {attempt + 1} attempts: {e}") from e
+                logger.warning(f"_bulk request to '{self.index_name}' failed ({e}), retrying")
+                result["retried"] += len(pending)
+                self._backoff(attempt)
+                continue
+
+            if not response.get("errors"):
+                result["indexed"] += len(pending)
+                return result
+
+            retry = []
+            for entry, item in zip(pending, response["items"]):
+                op_type, outcome = next(iter(item.items()))
+                status = outcome.get("status", 500)
+                # deleting a document that is already gone is not a failure
+                if status < 300 or (op_type == "delete" and status == 404):
+                    result["indexed"] += 1
+                elif status == RETRY_STATUS and attempt < self.max_retries:
+                    retry.append(entry)
+                else:
+                    result["failed"] += 1
+                    result["failures"].append({
+                        "_id": outcome.get("_id"),
+                        "status": status,
+                        "error": outcome.get("error"),
+                    })
+            if not retry:
+                return result
+            result["retried"] += len(retry)
+            pending = retry
+            self._backoff(attempt)
+        return result
+
+    def run(self, documents: Iterable[dict], total: Optional[int] = None) -> BulkStats:
+        stats = BulkStats()
+        started = time.perf_counter()
+        progress = tqdm(total=total, desc=f"Indexing {self.index_name}", unit="docs")
+        in_flight: set[Future] = set()
+
+        def collect(done: Iterable[Future]) -> None:
+            for future in done:
+                result = future.result()
+                stats.chunks += 1
+                stats.indexed += result["indexed"]
+                stats.failed += result["failed"]
+                stats.retried += result["retried"]
+                stats.bytes += result["bytes"]
+                room = MAX_REPORTED_FAILURES - len(stats.failures)
+                stats.failures.extend(result["failures"][:max(room, 0)])
+                progress.update(result["indexed"] + result["failed"])
+                progress.set_postfix(failed=stats.failed, retried=stats.retried)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="bulk") as pool:
+                for chunk in chunk_actions(self.index_name, documents, self.chunk_size, self.max_chunk_bytes, self.id_fn):
+                    # backpressure: never read further ahead than the chunks in flight
+                    if len(in_flight) >= self.threads:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(pool.submit(self._send, chunk))
+                collect(wait(in_flight).done)
+        finally:
+            progress.close()
+
+        stats.seconds = time.perf_counter() - started
+        logger.info(
+            f"Bulk indexed {stats.indexed} documents into '{self.index_name}' in {stats.seconds:.1f}s "
+            f"({stats.docs_per_second:.0f} docs/s, {stats.mb_per_second:.1f} MB/s, "
+            f"{stats.failed} failed, {stats.retried} retried)"
+        )
+        for failure in stats.failures[:10]:
+            logger.error(f"Bulk item failed in '{self.index_name}': {failure}")
+        return stats
+
+def bulk_index(
+    es: Elasticsearch,
+    index_name: str,
+    documents: Iterable[dict],
+    total: Optional[int] = None,
+    **kwargs,
+) -> BulkStats:
+    return BulkIndexer(es, index_name, **kwargs).run(documents, total=total)
@@ -0,0 +1,39 @@
+import argparse
+import json
+from pprint import pprint
+
+from backend.app.utilities.embedding import load_embedding_backend, embedding_parity
+
+'''
+Compare an embedding backend against the PyTorch reference before switching EMBEDDING_BACKEND.
+
+    python -m backend.app.search.embedding_parity --backend onnx-int8 --corpus ./data1/apod.json
+'''
+
+SAMPLE_TEXTS = [
+    "galaxy",
+    "spiral galaxy with a bright core",
+    "total solar eclipse over the mountains",
+    "the rings of saturn seen by cassini",
+    "northern lights above a frozen lake",
+    "comet tail in the evening sky",
+    "mars rover panorama of the crater rim",
+    "star forming region in the eagle nebula",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report cosine drift of an embedding backend against torch")
+    parser.add_argument("--backend", default="onnx-int8", help="torch | onnx | onnx-int8")
+    parser.add_argument("--corpus", help="JSON list of documents; their explanations are used as texts")
+    parser.add_argument("--limit", type=int, default=500, help="max texts taken from the corpus")
+    args = parser.parse_args()
+
+    texts = list(SAMPLE_TEXTS)
+    if args.corpus:
+        with open(args.corpus) as f:
+            documents = json.load(f)
+        texts += [document["explanation"] for document in documents[: args.limit]]
+
+    reference = load_embedding_backend("torch")
+    candidate = load_embedding_backend(args.backend)
+    pprint(embedding_parity(reference, candidate, texts))
@@ -0,0 +1,146 @@
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Deque, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+from backend.app.search.embedding_store import EmbeddingStore
+from backend.app.utilities.embedding import EmbeddingBackend, load_embedding_backend
+
+'''
+Batch encoding of documents for the embedding index.
+
+Documents are read in windows of EMBEDDING_INDEX_SORT_WINDOW, sorted by text length
+inside the window (batches of similar lengths waste little padding) and encoded
+EMBEDDING_INDEX_BATCH_SIZE at a time. With EMBEDDING_INDEX_PROCESSES > 1 the batches
+are spread over a process pool, each worker loading its own copy of the model with
+torch limited to its share of the cores. Texts already in the EmbeddingStore (same
+model, same text) skip encoding entirely.
+
+encode_documents() is a generator: the bulk indexer pulls embedded documents from it
+and uploads them on its own threads while the next batches are encoded, so the CPU
+and the network overlap.
+'''
+
+_worker_model: Optional[EmbeddingBackend] = None
+
+def _init_worker(backend_name: str, threads: int) -> None:
+    global _worker_model
+    _worker_model = load_embedding_backend(backend_name)
+    # one process per core group, not every process fighting for every core
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+def _encode_in_worker(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=batch_size)
+
+def resolve_processes(processes: Optional[int]) -> int:
+    """0 means one process per CPU core"""
+    processes = settings.EMBEDDING_INDEX_PROCESSES if processes is None else processes
+    return processes if processes > 0 else (os.cpu_count() or 1)
+
+def _windows(documents: Iterable[dict], window: int) -> Iterator[List[dict]]:
+    iterator = iter(documents)
+    while chunk := list(islice(iterator, window)):
+        yield chunk
+
+def _length_sorted_batches(documents: List[dict], field: str, batch_size: int) -> Iterator[List[dict]]:
+    documents = sorted(documents, key=lambda document: len(document.get(field) or ""))
+    for start in range(0, len(documents), batch_size):
+        yield documents[start:start + batch_size]
+
+def encode_documents(
+    documents: Iterable[dict],
+    model: Optional[EmbeddingBackend] = None,
+    field: str = "explanation",
+    batch_size: Optional[int] = None,
+    processes: Optional[int] = None,
+    window: Optional[int] = None,
+    backend_name: Optional[str] = None,
+    store: Optional[EmbeddingStore] = None,
+) -> Iterator[dict]:
+    """
+    Yield every document with an `embedding` of its `field`. Documents come out grouped
+    by text length rather than in input order, which the index does not care about.
+
+    With one process `model` encodes in this process; with more, every worker loads
+    `backend_name` (EMBEDDING_BACKEND by default) itself. Texts found in `store` are
+    not encoded again, new vectors are added to it.
+    """
+    batch_size = batch_size or settings.EMBEDDING_INDEX_BATCH_SIZE
+    window = max(window or settings.EMBEDDING_INDEX_SORT_WINDOW, batch_size)
+    processes = resolve_processes(processes)
+
+    started = time.perf_counter()
+    encoded = 0
+    reused = 0
+
+    def texts_of(batch: List[dict]) -> List[str]:
+        return [document.get(field) or "" for document in batch]
+
+    def finish(batch: List[dict], texts: List[str], vectors: np.ndarray) -> Iterator[dict]:
+        nonlocal encoded
+        encoded += len(batch)
+        if store is not None:
+            store.add(texts, vectors)
+        for document, vector in zip(batch, vectors):
+            yield {**document, "embedding": vector}
+
+    pool = None
+    if processes > 1:
+        threads = max(1, (os.cpu_count() or 1) // processes)
+        logger.info(f"Encoding with {processes} processes x {threads} threads, batches of {batch_size}")
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend_name or settings.EMBEDDING_BACKEND, threads),
+        )
+    else:
+        model = model or load_embedding_backend(backend_name)
+
+    # keep every worker busy plus one batch queued each, never the whole corpus
+    in_flight: Deque[tuple[List[dict], List[str], Future]] = deque()
+    try:
+        for chunk in _windows(documents, window):
+            if store is not None:
+                misses = []
+                for document, vector in zip(chunk, store.lookup(texts_of(chunk))):
+                    if vector is None:
+                        misses.append(document)
+                    else:
+                        reused += 1
+                        yield {**document, "embedding": vector}
+                chunk = misses
+
+            for batch in _length_sorted_batches(chunk, field, batch_size):
+                texts = texts_of(batch)
+                if pool is None:
+                    yield from finish(batch, texts, model.encode(texts, batch_size=batch_size))
+                    continue
+                in_flight.append((batch, texts, pool.submit(_encode_in_worker, texts, batch_size)))
+                if len(in_flight) >= 2 * processes:
+                    done_batch, done_texts, future = in_flight.popleft()
+                    yield from finish(done_batch, done_texts, future.result())
+
+        while in_flight:
+            done_batch, done_texts, future = in_flight.popleft()
+            yield from finish(done_batch, done_texts, future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if store is not None:
+            store.flush()
+
+    seconds = time.perf_counter() - started
+    logger.info(
+        f"Encoded {encoded} texts and reused {reused} stored vectors in {seconds:.1f}s "
+        f"({encoded / seconds if seconds else 0:.0f} texts/s, {processes} process(es), batch size {batch_size})"
+    )
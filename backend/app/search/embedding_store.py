@@ -0,0 +1,298 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from pprint import pprint
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+
+'''
+Persistent, content addressed store of document embeddings, so a reindex only encodes
+new or changed texts.
+
+A store is a directory of flat files:
+
+    meta.json     dims, dtype, row count, run counter, last run hit / miss counts
+    keys.u64      one 64 bit blake2b hash of (model, text) per row
+    vectors.f32   row-major (rows, dims) matrix, float32 or float16 (vectors.f16)
+    touched.u32   run number that last used each row, drives compaction
+
+Vectors and touched are memory-mapped: a hit is a view into the page cache, not a
+copy. Keys are loaded as one sorted uint64 array and looked up with searchsorted,
+~8 bytes per document instead of a dict entry. New vectors are buffered and appended
+on flush(); meta.json is written last, so rows past its count (an interrupted run)
+are ignored and overwritten.
+
+    python -m backend.app.search.embedding_store stats
+    python -m backend.app.search.embedding_store compact --keep-runs 2
+'''
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+FLUSH_EVERY = 50000  # buffered rows
+
+def _vectors_file(dtype: str) -> str:
+    return "vectors.f16" if dtype == "float16" else "vectors.f32"
+
+class EmbeddingStore:
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "",
+        dims: Optional[int] = None,
+        dtype: Optional[str] = None,
+        writable: bool = True,
+        new_run: bool = True,
+    ):
+        self.path = path
+        # keeps vectors of different models / backends apart
+        self.namespace = namespace
+        self.writable = writable
+        self.meta = self._read_meta()
+
+        if self.meta is None:
+            if not writable:
+                raise FileNotFoundError(f"No embedding store at {path}")
+            self.meta = {
+                "version": 1,
+                "dims": dims,
+                "dtype": dtype or settings.EMBEDDING_STORE_DTYPE,
+                "rows": 0,
+                "run": 0,
+                "last_run": {"hits": 0, "misses": 0},
+            }
+        if self.meta["dtype"] not in DTYPES:
+            raise ValueError(f"Unsupported embedding store dtype '{self.meta['dtype']}'")
+        if dtype and dtype != self.meta["dtype"]:
+            logger.warning(f"Embedding store {path} holds {self.meta['dtype']}, ignoring requested {dtype}")
+        if dims and self.meta["dims"] and dims != self.meta["dims"]:
+            raise ValueError(f"Embedding store {path} holds {self.meta['dims']} dims vectors, model gives {dims}")
+
+        if writable:
+            os.makedirs(path, exist_ok=True)
+        if writable and new_run:
+            self.meta["run"] += 1
+            self.meta["last_run"] = {"hits": 0, "misses": 0}
+
+        self._pending_keys: List[int] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_rows: dict[int, int] = {}
+        self._open()
+
+    # ========== files ==========
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._file("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self) -> None:
+        tmp_path = self._file("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._file("meta.json"))
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def dims(self) -> Optional[int]:
+        return self.meta["dims"]
+
+    @property
+    def dtype(self) -> str:
+        return self.meta["dtype"]
+
+    def _open(self) -> None:
+        rows, dims = self.rows, self.dims
+        if rows == 0:
+            self._keys = np.zeros(0, dtype=np.uint64)
+            self._order = np.zeros(0, dtype=np.int64)
+            self._sorted_keys = self._keys
+            self._vectors = None
+            self._touched = None
+            return
+
+        self._keys = np.fromfile(self._file("keys.u64"), dtype=np.uint64, count=rows)
+        self._order = np.argsort(self._keys, kind="stable")
+        self._sorted_keys = self._keys[self._order]
+        self._vectors = np.memmap(
+            self._file(_vectors_file(self.dtype)), dtype=DTYPES[self.dtype], mode="r", shape=(rows, dims)
+        )
+        self._touched = np.memmap(
+            self._file("touched.u32"), dtype=np.uint32, mode="r+" if self.writable else "r", shape=(rows,)
+        )
+
+    def _truncate(self, name: str, size: int) -> None:
+        """Drop what an interrupted run appended past the committed row count"""
+        path = self._file(name)
+        if os.path.exists(path) and os.path.getsize(path) != size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    # ========== lookups ==========
+    def key(self, text: str) -> int:
+        digest = hashlib.blake2b(f"{self.namespace}\0{text}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def lookup(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Stored vector (float32) of every text, None where it has to be encoded"""
+        keys = np.asarray([self.key(text) for text in texts], dtype=np.uint64)
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        if len(self._sorted_keys):
+            positions = np.searchsorted(self._sorted_keys, keys)
+            positions[positions >= len(self._sorted_keys)] = 0
+            matched = self._sorted_keys[positions] == keys
+            rows = self._order[positions[matched]]
+            if self._touched is not None and self.writable and len(rows):
+                self._touched[rows] = self.meta["run"]
+            vectors = self._vectors.view(np.ndarray)
+            for i, row in zip(np.flatnonzero(matched), rows):
+                vector = vectors[row]
+                found[i] = vector if vector.dtype == np.float32 else vector.astype(np.float32)
+
+        for i, key in enumerate(keys.tolist()):
+            if found[i] is None and key in self._pending_rows:
+                found[i] = self._pending_vectors[self._pending_rows[key]]
+
+        hits = sum(vector is not None for vector in found)
+        self.meta["last_run"]["hits"] += hits
+        self.meta["last_run"]["misses"] += len(texts) - hits
+        return found
+
+    def add(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        if not self.writable:
+            raise PermissionError("Embedding store opened read-only")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.meta["dims"] is None:
+            self.meta["dims"] = int(vectors.shape[1])
+        for text, vector in zip(texts, vectors):
+            key = self.key(text)
+            if key in self._pending_rows:
+                continue
+            self._pending_rows[key] = len(self._pending_vectors)
+            self._pending_keys.append(key)
+            self._pending_vectors.append(vector)
+        if len(self._pending_keys) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append buffered vectors and commit the new row count"""
+        if not self.writable:
+            return
+        if self._pending_keys:
+            rows, dims = self.rows, self.dims
+            item_size = np.dtype(DTYPES[self.dtype]).itemsize
+            vectors_name = _vectors_file(self.dtype)
+            self._truncate("keys.u64", rows * 8)
+            self._truncate(vectors_name, rows * dims * item_size)
+            self._truncate("touched.u32", rows * 4)
+
+            with open(self._file("keys.u64"), "ab") as f:
+                f.write(np.asarray(self._pending_keys, dtype=np.uint64).tobytes())
+            with open(self._file(vectors_name), "ab") as f:
+                f.write(np.stack(self._pending_vectors).astype(DTYPES[self.dtype]).tobytes())
+            with open(self._file("touched.u32"), "ab") as f:
+                f.write(np.full(len(self._pending_keys), self.meta["run"], dtype=np.uint32).tobytes())
+
+            self.meta["rows"] = rows + len(self._pending_keys)
+            self._pending_keys, self._pending_vectors, self._pending_rows = [], [], {}
+
+        if self._touched is not None:
+            self._touched.flush()
+        self._write_meta()
+        self._open()
+
+    def close(self) -> None:
+        self.flush()
+        self._vectors = self._touched = None
+
+    # ========== maintenance ==========
+    def stats(self) -> dict:
+        run = self.meta["run"]
+        touched = np.asarray(self._touched) if self._touched is not None else np.zeros(0, dtype=np.uint32)
+        sizes = {
+            name: os.path.getsize(self._file(name))
+            for name in ("keys.u64", _vectors_file(self.dtype), "touched.u32")
+            if os.path.exists(self._file(name))
+        }
+        last_run = self.meta["last_run"]
+        looked_up = last_run["hits"] + last_run["misses"]
+        return {
+            "path": self.path,
+            "rows": self.rows,
+            "dims": self.dims,
+            "dtype": self.dtype,
+            "runs": run,
+            "rows_used_by_last_run": int((touched == run).sum()),
+            "stale_rows": int((touched < run).sum()),
+            "last_run_hits": last_run["hits"],
+            "last_run_misses": last_run["misses"],
+            "last_run_hit_rate": last_run["hits"] / looked_up if looked_up else None,
+            "bytes": sizes,
+        }
+
+    def compact(self, keep_runs: int = 1) -> dict:
+        """Rewrite the store keeping only rows used by the last `keep_runs` runs"""
+        self.flush()
+        before = self.rows
+        if not before:
+            return {"rows_before": 0, "rows_after": 0}
+
+        oldest = self.meta["run"] - keep_runs + 1
+        keep = np.flatnonzero(np.asarray(self._touched) >= oldest)
+
+        tmp_path = f"{self.path}.compact"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        self._keys[keep].tofile(os.path.join(tmp_path, "keys.u64"))
+        np.asarray(self._vectors[keep]).tofile(os.path.join(tmp_path, _vectors_file(self.dtype)))
+        np.asarray(self._touched[keep]).tofile(os.path.join(tmp_path, "touched.u32"))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({**self.meta, "rows": int(len(keep))}, f)
+
+        self._vectors = self._touched = None
+        old_path = f"{self.path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(self.path, old_path)
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(old_path)
+
+        self.meta = self._read_meta()
+        self._open()
+        logger.info(f"Compacted embedding store {self.path}: {before} -> {self.rows} rows")
+        return {"rows_before": before, "rows_after": self.rows}
+
+def open_embedding_store(path: Optional[str] = None, dtype: Optional[str] = None) -> Optional[EmbeddingStore]:
+    """The store at EMBEDDING_STORE_PATH for the configured model, None when disabled"""
+    path = path or settings.EMBEDDING_STORE_PATH
+    if not path:
+        return None
+    namespace = f"{settings.EMBEDDING_MODEL_NAME}/{settings.EMBEDDING_BACKEND}/{settings.EMBEDDING_ONNX_FILE}"
+    return EmbeddingStore(path, namespace=namespace, dtype=dtype)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or compact the document embedding store")
+    parser.add_argument("command", choices=("stats", "compact"))
+    parser.add_argument("--path", default=settings.EMBEDDING_STORE_PATH)
+    parser.add_argument("--keep-runs", type=int, default=1, help="compact: keep rows used by the last N runs")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("--path is required when EMBEDDING_STORE_PATH is not set")
+
+    if args.command == "stats":
+        pprint(EmbeddingStore(args.path, writable=False).stats())
+    else:
+        # maintenance is not a run: do not bump the run counter
+        store = EmbeddingStore(args.path, new_run=False)
+        pprint(store.compact(keep_runs=args.keep_runs))
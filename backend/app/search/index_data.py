@@ -1,32 +1,32 @@
 import json 
 from pprint import pprint
-from typing import List
+from typing import Iterable, List
 
-from config import INDEX_NAME_DEFAULT, INDEX_NAME_N_GRAM 
+from backend.app.config import settings
 from elastic_transport import ObjectApiResponse
 from elasticsearch import Elasticsearch
-from tqdm import tqdm 
-from backend.search.utils import get_es_client
+from backend.app.search.bulk_indexer import BulkStats, apod_document_id, bulk_index
+from backend.app.search.index_versions import VersionedIndex
+from backend.app.utilities.utils import get_es_client
 
-def index_data(documents: List[dict], use_n_gram_tokenizer: bool) -> None: 
-    es = get_es_client(max_retries=5, sleep_time=5)
-    _ = _create_index(es=es, use_n_gram_tokenizer=use_n_gram_tokenizer)
-    _ = _insert_documents(
-        es=es, documents=documents, use_n_gram_tokenizer=use_n_gram_tokenizer
-    )
+def index_data(documents: List[dict], use_n_gram_tokenizer: bool, es: Elasticsearch | None = None) -> None: 
+    es = es or get_es_client(max_retries=5, sleep_time=5)
+    index_name = settings.INDEX_NAME_N_GRAM if use_n_gram_tokenizer else settings.INDEX_NAME_DEFAULT
+
+    # searches keep hitting the current version through the alias while this one loads
+    index = VersionedIndex(es, index_name)
+    _ = _create_index(index=index, use_n_gram_tokenizer=use_n_gram_tokenizer)
+    stats = index.load(lambda: _insert_documents(es=es, documents=documents, index_name=index.name))
 
-    index_name = INDEX_NAME_N_GRAM if use_n_gram_tokenizer else INDEX_NAME_DEFAULT
     pprint(
-        f"Indexed {len(documents)} documents into Elasticsearch index '{index_name}'"
+        f"Indexed {stats.indexed} documents into Elasticsearch index '{index.name}' (alias '{index_name}') "
+        f"({stats.docs_per_second:.0f} docs/s, {stats.failed} failed)"
     )
 
-def _create_index(es: Elasticsearch, use_n_gram_tokenizer: bool) -> ObjectApiResponse: 
+def _create_index(index: VersionedIndex, use_n_gram_tokenizer: bool) -> ObjectApiResponse: 
     tokenizer = "n_gram_tokenizer" if use_n_gram_tokenizer else "standard"
-    index_name = INDEX_NAME_N_GRAM if use_n_gram_tokenizer else INDEX_NAME_DEFAULT
 
-    _ = es.indices.delete(index=index_name, ignore_unavailable=True)
-    return es.indices.create(
-        index=index_name, 
+    return index.create(
          body={
             "settings": {
                 "analysis": {
@@ -50,14 +50,10 @@ def _create_index(es: Elasticsearch, use_n_gram_tokenizer: bool) -> ObjectApiRes
     )
 
 def _insert_documents(
-    es: Elasticsearch, documents: List[dict], use_n_gram_tokenizer: bool
-) -> ObjectApiResponse: 
-    operations = []
-    index_name = INDEX_NAME_N_GRAM if use_n_gram_tokenizer else INDEX_NAME_DEFAULT
-    for document in tqdm(documents, total=len(documents), desc="Indexing documents"): 
-        operations.append({"index": {"_index": index_name}})
-        operations.append(document)
-    return es.bulk(operations=operations)
+    es: Elasticsearch, documents: Iterable[dict], index_name: str
+) -> BulkStats: 
+    total = len(documents) if isinstance(documents, list) else None
+    return bulk_index(es, index_name, documents, total=total, id_fn=apod_document_id)
 
 if __name__ == "__main__": 
     with open("./data1/apod.json") as f: 
@@ -1,26 +1,41 @@
+import argparse
 import json 
 from pprint import pprint
-from typing import List
+from typing import Iterable, List
 
-import torch
-from config import INDEX_NAME_EMBEDDING
+from backend.app.config import settings
 from elastic_transport import ObjectApiResponse
 from elasticsearch import Elasticsearch
-from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
-from backend.search.utils import get_es_client
+from backend.app.search.bulk_indexer import BulkStats, apod_document_id, bulk_index
+from backend.app.search.embedding_pipeline import encode_documents
+from backend.app.search.embedding_store import EmbeddingStore, open_embedding_store
+from backend.app.search.index_versions import VersionedIndex
+from backend.app.utilities.embedding import EmbeddingBackend
+from backend.app.utilities.utils import get_es_client
 
-def index_data(documents: List[dict], model: SentenceTransformer) -> None: 
-    es = get_es_client(max_retries=1, sleep_time=0)
-    _ = _create_index(es=es)
-    _ = _insert_documents(es=es, documents=documents, model=model)
+def index_data(
+    documents: List[dict],
+    model: EmbeddingBackend | None = None,
+    es: Elasticsearch | None = None,
+    batch_size: int | None = None,
+    processes: int | None = None,
+    store: EmbeddingStore | None = None,
+) -> None: 
+    es = es or get_es_client(max_retries=1, sleep_time=0)
+    index = VersionedIndex(es, settings.INDEX_NAME_EMBEDDING)
+    _ = _create_index(index=index)
+    stats = index.load(lambda: _insert_documents(
+        es=es, documents=documents, index_name=index.name, model=model,
+        batch_size=batch_size, processes=processes, store=store,
+    ))
 
-    pprint(f"indexed {len(documents)} documents into Elasticsearch index '{INDEX_NAME_EMBEDDING}'")
+    pprint(
+        f"indexed {stats.indexed} documents into Elasticsearch index '{index.name}' (alias '{settings.INDEX_NAME_EMBEDDING}') "
+        f"({stats.docs_per_second:.0f} docs/s, {stats.failed} failed)"
+    )
 
-def _create_index(es: Elasticsearch) -> ObjectApiResponse: 
-    _ = es.indices.delete(index=INDEX_NAME_EMBEDDING, ignore_unavailable=True)
-    return es.indices.create(
-        index=INDEX_NAME_EMBEDDING, 
+def _create_index(index: VersionedIndex) -> ObjectApiResponse: 
+    return index.create(
         mappings={
             "properties": {
                 "embedding": {
@@ -31,20 +46,34 @@ def _create_index(es: Elasticsearch) -> ObjectApiResponse:
     )
 
 def _insert_documents(
-        es: Elasticsearch, documents: List[dict], model: SentenceTransformer
-) -> ObjectApiResponse: 
-    operations = []
-    for document in tqdm(documents, total=len(documents), desc="Indexing documents"): 
-        operations.append({"index": {"_index": INDEX_NAME_EMBEDDING}})
-        operations.append(
-            {**document, "embedding": model.encode(document["explanation"])}
-        )
-    return es.bulk(operations=operations)
+        es: Elasticsearch,
+        documents: Iterable[dict],
+        index_name: str,
+        model: EmbeddingBackend | None,
+        batch_size: int | None = None,
+        processes: int | None = None,
+        store: EmbeddingStore | None = None,
+) -> BulkStats: 
+    total = len(documents) if isinstance(documents, list) else None
+    # encoding runs in this generator while the bulk threads upload the previous chunks
+    embedded = encode_documents(
+        documents, model=model, batch_size=batch_size, processes=processes, store=store
+    )
+    return bulk_index(es, index_name, embedded, total=total, id_fn=apod_document_id)
 
 if __name__ == "__main__": 
-    with open("./data1/apod.json") as f: 
+    parser = argparse.ArgumentParser(description="Build the embedding index")
+    parser.add_argument("--path", default="./data1/apod.json")
+    parser.add_argument("--batch-size", type=int, default=None, help="texts per encode call (EMBEDDING_INDEX_BATCH_SIZE)")
+    parser.add_argument("--processes", type=int, default=None, help="encode processes, 0 = all cores (EMBEDDING_INDEX_PROCESSES)")
+    parser.add_argument("--store", default=settings.EMBEDDING_STORE_PATH, help="embedding store directory (EMBEDDING_STORE_PATH)")
+    parser.add_argument("--no-store", action="store_true", help="encode every document, ignore the store")
+    args = parser.parse_args()
+
+    with open(args.path) as f: 
         documents = json.load(f)
 
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = SentenceTransformer("all-MiniLM-L6-v2").to(device)
-    index_data(documents=documents, model=model)
\ No newline at end of file
+    store = None if args.no_store else open_embedding_store(args.store)
+    index_data(documents=documents, batch_size=args.batch_size, processes=args.processes, store=store)
+    if store is not None:
+        pprint(store.stats())
\ No newline at end of file
@@ -1,23 +1,28 @@
 import json
 from pprint import pprint
-from typing import List
+from typing import Iterable, List
 
-from config import INDEX_NAME_RAW
+from backend.app.config import settings
 from elastic_transport import ObjectApiResponse
 from elasticsearch import Elasticsearch
-from tqdm import tqdm
-from backend.search.utils import get_es_client
+from backend.app.search.bulk_indexer import BulkStats, apod_document_id, bulk_index
+from backend.app.search.index_versions import VersionedIndex
+from backend.app.utilities.utils import get_es_client
 
-def index_data(documents: List[dict]) -> None:
+def index_data(documents: List[dict], es: Elasticsearch | None = None) -> None:
     pipeline_id = "apod_pipeline"
-    es = get_es_client(max_retries=1, sleep_time=0)
+    es = es or get_es_client(max_retries=1, sleep_time=0)
 
     _ = _create_pipeline(es=es, pipeline_id=pipeline_id)
-    _ = _create_index(es=es)
-    _ = _insert_documents(es=es, documents=documents, pipeline_id=pipeline_id)
+    index = VersionedIndex(es, settings.INDEX_NAME_RAW)
+    _ = _create_index(index=index)
+    stats = index.load(
+        lambda: _insert_documents(es=es, documents=documents, index_name=index.name, pipeline_id=pipeline_id)
+    )
 
     pprint(
-        f'Indexed {len(documents)} documents into Elasticsearch index "{INDEX_NAME_RAW}"'
+        f'Indexed {stats.indexed} documents into Elasticsearch index "{index.name}" (alias "{settings.INDEX_NAME_RAW}") '
+        f'({stats.docs_per_second:.0f} docs/s, {stats.failed} failed)'
     )
 
 
@@ -32,19 +37,15 @@ def _create_pipeline(es: Elasticsearch, pipeline_id: str) -> ObjectApiResponse:
     return es.ingest.put_pipeline(id=pipeline_id, body=pipeline_body)
 
 
-def _create_index(es: Elasticsearch) -> ObjectApiResponse:
-    _ = es.indices.delete(index=INDEX_NAME_RAW, ignore_unavailable=True)
-    return es.indices.create(index=INDEX_NAME_RAW)
+def _create_index(index: VersionedIndex) -> ObjectApiResponse:
+    return index.create()
 
 
 def _insert_documents(
-    es: Elasticsearch, documents: List[dict], pipeline_id: str
-) -> ObjectApiResponse:
-    operations = []
-    for document in tqdm(documents, total=len(documents), desc="Indexing documents"):
-        operations.append({"index": {"_index": INDEX_NAME_RAW}})
-        operations.append(document)
-    return es.bulk(operations=operations, pipeline=pipeline_id)
+    es: Elasticsearch, documents: Iterable[dict], index_name: str, pipeline_id: str
+) -> BulkStats:
+    total = len(documents) if isinstance(documents, list) else None
+    return bulk_index(es, index_name, documents, total=total, pipeline=pipeline_id, id_fn=apod_document_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+import argparse
+import re
+from datetime import datetime, timezone
+from pprint import pprint
+from typing import Callable, List, Optional
+
+from elasticsearch import Elasticsearch
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+from backend.app.search.bulk_indexer import BulkStats
+from backend.app.utilities.cache import bump_index_generation
+
+'''
+Zero-downtime rebuilds. INDEX_NAME_* are aliases; every build writes a new physical
+index `<alias>-v<timestamp>` and the alias is moved to it in one atomic
+update_aliases call once it is loaded, so searches never see a missing or half
+filled index.
+
+    index = VersionedIndex(es, settings.INDEX_NAME_DEFAULT)
+    index.create(body={...})            # refresh off, no replicas while loading
+    index.load(lambda: bulk_index(es, index.name, documents))
+                                        # publish: restore settings, force-merge, swap, prune
+
+load() publishes only a complete build: more than BULK_MAX_FAILED rejected documents,
+or any error while loading or publishing, deletes the new index and leaves the alias
+on the previous version.
+
+The last REINDEX_KEEP_GENERATIONS physical indices are kept for rollback:
+
+    python -m backend.app.search.index_versions list --alias apod
+    python -m backend.app.search.index_versions rollback --alias apod
+'''
+
+BULK_LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+def _merge_settings(body: Optional[dict], index_settings: dict) -> dict:
+    body = dict(body or {})
+    merged = dict(body.get("settings") or {})
+    merged["index"] = {**merged.get("index", {}), **index_settings}
+    body["settings"] = merged
+    return body
+
+def versions(es: Elasticsearch, alias: str) -> List[str]:
+    """Physical indices built for `alias`, oldest first (the timestamps sort lexically)"""
+    pattern = re.compile(rf"^{re.escape(alias)}-v\d{{17}}$")
+    found = es.indices.get(index=f"{alias}-v*", allow_no_indices=True, ignore_unavailable=True)
+    return sorted(name for name in found if pattern.match(name))
+
+def current_version(es: Elasticsearch, alias: str) -> Optional[str]:
+    if not es.indices.exists_alias(name=alias):
+        return None
+    return next(iter(es.indices.get_alias(name=alias)), None)
+
+def point_alias(es: Elasticsearch, alias: str, index_name: str) -> None:
+    """Atomically move `alias` to `index_name`, replacing a legacy concrete index of that name"""
+    actions = []
+    if es.indices.exists_alias(name=alias):
+        actions.append({"remove": {"index": "*", "alias": alias}})
+    elif es.indices.exists(index=alias):
+        # built before versioning: drop the concrete index in the same atomic call
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index_name, "alias": alias}})
+    es.indices.update_aliases(actions=actions)
+    bump_index_generation(alias)
+    logger.info(f"Alias '{alias}' now points to '{index_name}'")
+
+class VersionedIndex:
+    def __init__(self, es: Elasticsearch, alias: str, keep: Optional[int] = None):
+        self.es = es
+        self.alias = alias
+        self.keep = max(1, keep or settings.REINDEX_KEEP_GENERATIONS)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S%f")[:17]
+        self.name = f"{alias}-v{timestamp}"
+
+    def create(self, body: Optional[dict] = None, mappings: Optional[dict] = None):
+        """Create the physical index with bulk-load settings (no refresh, no replicas)"""
+        body = _merge_settings(body, BULK_LOAD_SETTINGS)
+        if mappings is not None:
+            body["mappings"] = mappings
+        logger.info(f"Building '{self.alias}' into new index '{self.name}'")
+        return self.es.indices.create(index=self.name, body=body)
+
+    def publish(self) -> None:
+        """Restore serving settings, force-merge, move the alias and prune old versions"""
+        self.es.indices.put_settings(
+            index=self.name,
+            settings={"index": {
+                "refresh_interval": settings.REINDEX_REFRESH_INTERVAL,
+                "number_of_replicas": settings.REINDEX_REPLICAS,
+            }},
+        )
+        self.es.indices.refresh(index=self.name)
+        # read-only from here on: merging into few segments makes every search cheaper
+        self.es.options(request_timeout=settings.REINDEX_FORCE_MERGE_TIMEOUT).indices.forcemerge(
+            index=self.name, max_num_segments=settings.REINDEX_FORCE_MERGE_SEGMENTS
+        )
+        self.es.cluster.health(index=self.name, wait_for_status="yellow", timeout="60s")
+
+        point_alias(self.es, self.alias, self.name)
+        self.prune()
+
+    def load(self, insert: Callable[[], BulkStats]) -> BulkStats:
+        """Run `insert` into this index and publish it, or discard it if anything failed"""
+        try:
+            stats = insert()
+            if stats.failed > settings.BULK_MAX_FAILED:
+                raise RuntimeError(
+                    f"{stats.failed} documents failed to index into '{self.name}' "
+                    f"(BULK_MAX_FAILED={settings.BULK_MAX_FAILED}), first: {stats.failures[:3]}"
+                )
+            self.publish()
+        except BaseException:
+            try:
+                self.discard()
+            except Exception as e:
+                logger.error(f"Could not delete unfinished index '{self.name}': {e}")
+            raise
+        return stats
+
+    def discard(self) -> None:
+        """Drop a build that failed; the alias still points to the previous version"""
+        if current_version(self.es, self.alias) == self.name:
+            # failed after the swap (e.g. while pruning): this build is live, keep it
+            logger.warning(f"'{self.name}' is already behind '{self.alias}', not discarding it")
+            return
+        logger.warning(f"Discarding unfinished index '{self.name}', '{self.alias}' is unchanged")
+        self.es.indices.delete(index=self.name, ignore_unavailable=True)
+
+    def prune(self) -> List[str]:
+        stale = versions(self.es, self.alias)[:-self.keep]
+        current = current_version(self.es, self.alias)
+        stale = [name for name in stale if name != current]
+        for name in stale:
+            self.es.indices.delete(index=name, ignore_unavailable=True)
+        if stale:
+            logger.info(f"Deleted old versions of '{self.alias}': {', '.join(stale)}")
+        return stale
+
+def rollback(es: Elasticsearch, alias: str) -> str:
+    """Point `alias` back to the version built before the current one"""
+    built = versions(es, alias)
+    current = current_version(es, alias)
+    older = [name for name in built if current is None or name < current]
+    if not older:
+        raise RuntimeError(f"No older version of '{alias}' to roll back to (have: {built})")
+    point_alias(es, alias, older[-1])
+    return older[-1]
+
+if __name__ == "__main__":
+    from backend.app.utilities.utils import get_es_client
+
+    parser = argparse.ArgumentParser(description="List or roll back the versions behind a search alias")
+    parser.add_argument("command", choices=("list", "rollback"))
+    parser.add_argument("--alias", required=True, help="e.g. the value of INDEX_NAME_DEFAULT")
+    args = parser.parse_args()
+
+    es = get_es_client(max_retries=1, sleep_time=0)
+    if args.command == "list":
+        pprint({"alias": args.alias, "current": current_version(es, args.alias), "versions": versions(es, args.alias)})
+    else:
+        pprint(f"'{args.alias}' rolled back to '{rollback(es, args.alias)}'")
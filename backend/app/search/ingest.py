@@ -0,0 +1,219 @@
+import argparse
+import html
+import queue
+import re
+import threading
+import time
+from pprint import pprint
+from typing import Callable, Dict, Iterator, List, Optional
+
+import ijson
+from elasticsearch import Elasticsearch
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+from backend.app.search import index_data, index_data_embedding, index_name_raw
+from backend.app.search.embedding_store import open_embedding_store
+from backend.app.utilities.utils import get_es_client
+
+'''
+Single-pass ingest into every search index.
+
+The source JSON array is streamed once with ijson (never fully in memory) and every
+document is fanned out to one writer thread per index through a bounded queue. Each
+writer runs the regular index builder (versioned index, bulk indexer, alias swap) on
+its queue, so the indices load concurrently and a full queue blocks the reader: total
+time approaches the slowest index (usually embedding) instead of the sum of all four.
+
+    python -m backend.app.search.ingest --source ./data1/apod_raw.json
+
+The raw index gets documents as they are (its ingest pipeline strips HTML); the other
+indices get the same html_strip done here, so apod_raw.json can feed all of them.
+
+If reading the source fails partway (e.g. malformed JSON), every writer is sent an
+abort instead of the end of its stream: its builder fails, the half-built versioned
+index is discarded and the aliases stay on the previous versions.
+'''
+
+WRITERS = ("default", "n_gram", "raw", "embedding")
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+_DONE = object()
+_ABORT = object()
+
+class IngestAborted(Exception):
+    """Raised into a writer's builder when the reader failed: its index must not be published"""
+
+def strip_html(document: dict) -> dict:
+    """What the raw index's html_strip processors do to title and explanation"""
+    cleaned = dict(document)
+    for field in ("title", "explanation"):
+        if isinstance(cleaned.get(field), str):
+            cleaned[field] = html.unescape(HTML_TAG_RE.sub("", cleaned[field]))
+    return cleaned
+
+def stream_documents(path: str) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "item", use_float=True)
+
+class IndexWriter:
+    """One index builder fed from a bounded queue on its own thread"""
+
+    def __init__(self, name: str, build: Callable[[Iterator[dict]], None], queue_size: int):
+        self.name = name
+        self.build = build
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.consumed = 0
+        self.seconds = 0.0
+        self.error: Optional[BaseException] = None
+        self.aborted = False
+        self.thread = threading.Thread(target=self._run, name=f"ingest-{name}", daemon=True)
+
+    def _documents(self) -> Iterator[dict]:
+        while True:
+            document = self.queue.get()
+            if document is _DONE:
+                return
+            if document is _ABORT:
+                self.aborted = True
+                raise IngestAborted(f"source read failed, '{self.name}' build abandoned")
+            self.consumed += 1
+            yield document
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        try:
+            self.build(self._documents())
+        except BaseException as e:
+            self.error = e
+            if self.aborted:
+                return
+            logger.error(f"Ingest into '{self.name}' failed: {e}")
+            # keep draining so the reader is never blocked by a dead writer
+            try:
+                for _ in self._documents():
+                    pass
+            except IngestAborted:
+                pass
+        finally:
+            self.seconds = time.perf_counter() - started
+
+    def put(self, document) -> None:
+        if self.error is None or document is _DONE or document is _ABORT:
+            self.queue.put(document)
+
+    def report(self) -> dict:
+        return {
+            "documents": self.consumed,
+            "seconds": self.seconds,
+            "docs_per_second": self.consumed / self.seconds if self.seconds else 0.0,
+            "error": repr(self.error) if self.error else None,
+        }
+
+def build_writers(
+    es: Elasticsearch,
+    names: List[str],
+    queue_size: int,
+    batch_size: Optional[int] = None,
+    processes: Optional[int] = None,
+    store_path: Optional[str] = None,
+) -> Dict[str, IndexWriter]:
+    store = open_embedding_store(store_path) if "embedding" in names else None
+    builders = {
+        "default": lambda documents: index_data.index_data(documents, use_n_gram_tokenizer=False, es=es),
+        "n_gram": lambda documents: index_data.index_data(documents, use_n_gram_tokenizer=True, es=es),
+        "raw": lambda documents: index_name_raw.index_data(documents, es=es),
+        "embedding": lambda documents: index_data_embedding.index_data(
+            documents, es=es, batch_size=batch_size, processes=processes, store=store
+        ),
+    }
+    return {name: IndexWriter(name, builders[name], queue_size) for name in names}
+
+def ingest(
+    source: str,
+    es: Optional[Elasticsearch] = None,
+    names: Optional[List[str]] = None,
+    queue_size: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    processes: Optional[int] = None,
+    store_path: Optional[str] = None,
+    report_every: float = 10.0,
+) -> dict:
+    es = es or get_es_client(max_retries=5, sleep_time=5)
+    names = names or list(WRITERS)
+    writers = build_writers(
+        es, names, queue_size or settings.INGEST_QUEUE_SIZE, batch_size, processes, store_path
+    )
+    for writer in writers.values():
+        writer.thread.start()
+
+    started = time.perf_counter()
+    last_report = started
+    read = 0
+    # every writer gets _DONE (publish) or _ABORT (discard), and is joined either way
+    end_of_stream = _ABORT
+    try:
+        for document in stream_documents(source):
+            read += 1
+            cleaned = strip_html(document)
+            for name, writer in writers.items():
+                # blocks while that writer's queue is full: backpressure to the reader
+                writer.put(document if name == "raw" else cleaned)
+
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                last_report = now
+                logger.info(
+                    f"Ingest: read {read} documents ({read / (now - started):.0f}/s); "
+                    + ", ".join(
+                        f"{name} {writer.consumed} (queue {writer.queue.qsize()})" for name, writer in writers.items()
+                    )
+                )
+        end_of_stream = _DONE
+    finally:
+        if end_of_stream is _ABORT:
+            logger.error(f"Reading '{source}' failed after {read} documents, abandoning every build")
+        for writer in writers.values():
+            writer.put(end_of_stream)
+        for writer in writers.values():
+            writer.thread.join()
+
+    seconds = time.perf_counter() - started
+    report = {
+        "source": source,
+        "documents": read,
+        "seconds": seconds,
+        "indices": {name: writer.report() for name, writer in writers.items()},
+    }
+    slowest = max((writer.seconds for writer in writers.values()), default=0.0)
+    logger.info(
+        f"Ingested {read} documents into {', '.join(names)} in {seconds:.1f}s "
+        f"(slowest index {slowest:.1f}s, sum {sum(w.seconds for w in writers.values()):.1f}s)"
+    )
+    failed = [name for name, writer in writers.items() if writer.error is not None]
+    if failed:
+        raise RuntimeError(f"Ingest failed for {', '.join(failed)}: {report['indices']}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the APOD JSON once into every search index")
+    parser.add_argument("--source", default="./data1/apod_raw.json")
+    parser.add_argument("--indices", default=",".join(WRITERS), help="subset of default,n_gram,raw,embedding")
+    parser.add_argument("--queue-size", type=int, default=None, help="documents buffered per index (INGEST_QUEUE_SIZE)")
+    parser.add_argument("--batch-size", type=int, default=None, help="embedding encode batch size")
+    parser.add_argument("--processes", type=int, default=None, help="embedding encode processes, 0 = all cores")
+    parser.add_argument("--store", default=settings.EMBEDDING_STORE_PATH, help="embedding store directory")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.indices.split(",") if name.strip()]
+    unknown = set(names) - set(WRITERS)
+    if unknown:
+        parser.error(f"unknown indices: {', '.join(sorted(unknown))}")
+
+    pprint(ingest(
+        args.source,
+        names=names,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        processes=args.processes,
+        store_path=args.store,
+    ))
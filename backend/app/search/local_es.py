@@ -0,0 +1,434 @@
+import asyncio
+import fnmatch
+import itertools
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import orjson
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig, ObjectApiResponse
+
+from backend.app.utilities.bm25 import BM25Index
+
+'''
+In-process stand-in for the parts of the Elasticsearch API used by the indexing
+scripts and the search router, so benchmarks run on a laptop or CI box without a
+cluster or network.
+
+    es = LocalElasticsearch()             # sync client for the index_data() scripts
+    app.state.es = es.as_async()          # async view over the same indices for the API
+
+Lexical queries are answered by the embedded BM25 engine, `knn` by brute force cosine
+over the stored vectors. Analyzers (standard / edge n-gram) are not emulated, every
+text index is tokenized the same way, and filter_path is ignored.
+'''
+
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+def _response(body: dict) -> ObjectApiResponse:
+    meta = ApiResponseMeta(
+        status=200,
+        http_version="1.1",
+        headers=HttpHeaders({"x-elastic-product": "Elasticsearch"}),
+        duration=0.0,
+        node=NodeConfig("http", "localhost", 9200),
+    )
+    return ObjectApiResponse(body=body, meta=meta)
+
+def _filter_source(source: dict, source_filter) -> dict:
+    if source_filter is None or source_filter is True:
+        return source
+    if source_filter is False:
+        return {}
+    if isinstance(source_filter, (list, str)):
+        source_filter = {"includes": source_filter}
+    includes = source_filter.get("includes")
+    excludes = set(source_filter.get("excludes") or ())
+    if isinstance(includes, str):
+        includes = [includes]
+    return {
+        key: value for key, value in source.items()
+        if key not in excludes and (not includes or key in includes)
+    }
+
+def _year_of_filter(query: dict) -> Optional[str]:
+    """The year of the `range` on `date` built by search.build_year_filter"""
+    for clause in query.get("bool", {}).get("filter", []):
+        gte = clause.get("range", {}).get("date", {}).get("gte")
+        if gte:
+            return str(gte)[:4]
+    return None
+
+class LocalIndex:
+    def __init__(self, name: str, mappings: Optional[dict] = None):
+        self.name = name
+        self.mappings = mappings or {}
+        self.documents: List[dict] = []
+        self._sources: Dict[str, dict] = {}
+        # external versions, kept for deleted documents too (ES tombstones)
+        self._versions: Dict[str, int] = {}
+        self.settings: dict = {}
+        self._bm25: Optional[BM25Index] = None
+        self._vectors: Dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._dirty = True
+
+    def index(self, doc_id: str, document: dict) -> int:
+        status = 200 if doc_id in self._sources else 201
+        self._sources[doc_id] = document
+        self._dirty = True
+        return status
+
+    def delete(self, doc_id: str) -> int:
+        if self._sources.pop(doc_id, None) is None:
+            return 404
+        self._dirty = True
+        return 200
+
+    def refresh(self) -> None:
+        """Make writes searchable, like an ES refresh"""
+        if not self._dirty:
+            return
+        self.documents = list(self._sources.values())
+        self._bm25 = BM25Index(self.documents)
+        self._vectors = {}
+        self._dirty = False
+
+    @property
+    def bm25(self) -> BM25Index:
+        if self._bm25 is None:
+            self.refresh()
+        return self._bm25
+
+    def vectors(self, field: str) -> tuple[np.ndarray, np.ndarray]:
+        """(doc ids, L2 normalized matrix) of the documents that have `field`"""
+        if field not in self._vectors:
+            doc_ids = [i for i, doc in enumerate(self.documents) if doc.get(field) is not None]
+            matrix = np.asarray([self.documents[i][field] for i in doc_ids], dtype=np.float32)
+            if matrix.size:
+                matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            self._vectors[field] = (np.asarray(doc_ids, dtype=np.int64), matrix)
+        return self._vectors[field]
+
+    def ranked(self, query: dict, window: int) -> tuple[int, List[tuple[int, float]]]:
+        """(total, [(doc id, score)]) of the best `window` matches of a router query"""
+        year = _year_of_filter(query)
+        must = query.get("bool", {}).get("must", [query])
+        clause = must[0] if must else {"match_all": {}}
+
+        if "knn" in clause:
+            return self._knn(clause["knn"], year, window)
+
+        if "multi_match" in clause or "match" in clause:
+            if "multi_match" in clause:
+                text = clause["multi_match"]["query"]
+            else:
+                text = next(iter(clause["match"].values()))
+                text = text["query"] if isinstance(text, dict) else text
+            return self.bm25.ranked(text, 0, window, year)
+
+        doc_ids = [
+            i for i in range(len(self.documents))
+            if year is None or self.bm25.years[i] == int(year)
+        ]
+        return len(doc_ids), [(i, 1.0) for i in doc_ids[:window]]
+
+    def _knn(self, knn: dict, year: Optional[str], window: int) -> tuple[int, List[tuple[int, float]]]:
+        doc_ids, matrix = self.vectors(knn["field"])
+        if not len(doc_ids):
+            return 0, []
+        query_vector = np.array(knn["query_vector"], dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) + 1e-12
+        scores = matrix @ query_vector
+        if year is not None:
+            keep = np.asarray([self.bm25.years[i] == int(year) for i in doc_ids])
+            doc_ids, scores = doc_ids[keep], scores[keep]
+
+        k = min(int(knn.get("k", 10)), len(doc_ids))
+        if not k:
+            return 0, []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])][:window]
+        # ES cosine similarity score
+        return k, [(int(doc_ids[i]), float((1 + scores[i]) / 2)) for i in top]
+
+class _Namespace:
+    def __init__(self, client: "LocalElasticsearch"):
+        self._client = client
+
+class _Indices(_Namespace):
+    def create(
+        self,
+        index: str,
+        body: Optional[dict] = None,
+        mappings: Optional[dict] = None,
+        settings: Optional[dict] = None,
+        **kwargs,
+    ):
+        with self._client._lock:
+            if index in self._client._indices or index in self._client._aliases:
+                raise ValueError(f"resource_already_exists_exception: index [{index}] already exists")
+            mappings = mappings or (body or {}).get("mappings")
+            self._client._indices[index] = LocalIndex(index, mappings)
+            self._client._indices[index].settings = settings or (body or {}).get("settings", {})
+        return _response({"acknowledged": True, "index": index})
+
+    def delete(self, index: str, ignore_unavailable: bool = False, **kwargs):
+        with self._client._lock:
+            if index not in self._client._indices and not ignore_unavailable:
+                raise KeyError(f"index_not_found_exception: no such index [{index}]")
+            self._client._indices.pop(index, None)
+            self._client._aliases = {
+                alias: target for alias, target in self._client._aliases.items() if target != index
+            }
+        return _response({"acknowledged": True})
+
+    def exists(self, index: str, **kwargs) -> bool:
+        return index in self._client._indices or index in self._client._aliases
+
+    def get(self, index: str, **kwargs):
+        names = fnmatch.filter(self._client._indices, index)
+        if not names and "*" not in index and not kwargs.get("ignore_unavailable"):
+            raise KeyError(f"index_not_found_exception: no such index [{index}]")
+        return _response({name: {"settings": self._client._indices[name].settings} for name in sorted(names)})
+
+    def refresh(self, index: Optional[str] = None, **kwargs):
+        for name in [index] if index else list(self._client._indices):
+            self._client._index(name).refresh()
+        return _response({"_shards": {"failed": 0}})
+
+    def put_settings(self, index: str, settings: dict, **kwargs):
+        target = self._client._index(index)
+        target.settings = {**target.settings, "index": {**target.settings.get("index", {}), **settings.get("index", settings)}}
+        return _response({"acknowledged": True})
+
+    def forcemerge(self, index: str, **kwargs):
+        self._client._index(index).refresh()
+        return _response({"_shards": {"failed": 0}})
+
+    def exists_alias(self, name: str, **kwargs) -> bool:
+        return name in self._client._aliases
+
+    def get_alias(self, name: str, **kwargs):
+        if name not in self._client._aliases:
+            raise KeyError(f"alias [{name}] missing")
+        return _response({self._client._aliases[name]: {"aliases": {name: {}}}})
+
+    def update_aliases(self, actions: list, **kwargs):
+        """All actions are applied under one lock, i.e. atomically for searches"""
+        with self._client._lock:
+            aliases = dict(self._client._aliases)
+            indices = dict(self._client._indices)
+            for action in actions:
+                kind, spec = next(iter(action.items()))
+                if kind == "add":
+                    if spec["index"] not in indices:
+                        raise KeyError(f"index_not_found_exception: no such index [{spec['index']}]")
+                    aliases[spec["alias"]] = spec["index"]
+                elif kind == "remove":
+                    if fnmatch.fnmatch(aliases.get(spec["alias"], ""), spec["index"]):
+                        aliases.pop(spec["alias"], None)
+                elif kind == "remove_index":
+                    indices.pop(spec["index"], None)
+            self._client._aliases, self._client._indices = aliases, indices
+        return _response({"acknowledged": True})
+
+class _Cluster(_Namespace):
+    def health(self, **kwargs):
+        return _response({"status": "green", "timed_out": False})
+
+class _Ingest(_Namespace):
+    def put_pipeline(self, id: str, body: Optional[dict] = None, processors: Optional[list] = None, **kwargs):
+        self._client._pipelines[id] = processors or (body or {}).get("processors", [])
+        return _response({"acknowledged": True})
+
+class LocalElasticsearch:
+    """Synchronous client surface: what index_data*.py and index_name_raw.py call"""
+
+    def __init__(self):
+        self._indices: Dict[str, LocalIndex] = {}
+        self._pipelines: Dict[str, list] = {}
+        self._pits: Dict[str, str] = {}
+        self._aliases: Dict[str, str] = {}
+        self._ids = itertools.count()
+        self._lock = threading.RLock()
+        self.indices = _Indices(self)
+        self.ingest = _Ingest(self)
+        self.cluster = _Cluster(self)
+
+    def _index(self, name: str) -> LocalIndex:
+        try:
+            return self._indices[self._aliases.get(name, name)]
+        except KeyError:
+            raise KeyError(f"index_not_found_exception: no such index [{name}]") from None
+
+    def as_async(self) -> "AsyncLocalElasticsearch":
+        return AsyncLocalElasticsearch(self)
+
+    def info(self, **kwargs):
+        return _response({"name": "local", "version": {"number": "8.x-local"}})
+
+    def ping(self, **kwargs) -> bool:
+        return True
+
+    def options(self, **kwargs) -> "LocalElasticsearch":
+        return self
+
+    def close(self) -> None:
+        pass
+
+    def _apply_pipeline(self, pipeline: Optional[str], document: dict) -> dict:
+        for processor in self._pipelines.get(pipeline, []) if pipeline else []:
+            field = processor.get("html_strip", {}).get("field")
+            if field and isinstance(document.get(field), str):
+                document[field] = HTML_TAG_RE.sub("", document[field])
+        return document
+
+    def bulk(self, operations: list | bytes | str, index: Optional[str] = None, pipeline: Optional[str] = None, **kwargs):
+        """Accepts a list of action / source dicts or an NDJSON body"""
+        started = time.perf_counter()
+        if isinstance(operations, (bytes, str)):
+            operations = [orjson.loads(line) for line in operations.splitlines() if line.strip()]
+
+        items = []
+        errors = False
+        entries = iter(operations)
+        with self._lock:
+            for action in entries:
+                op_type, meta = next(iter(action.items()))
+                target_name = meta.get("_index", index)
+                target = self._indices.get(self._aliases.get(target_name, target_name))
+                doc_id = str(meta.get("_id") or next(self._ids))
+                document = next(entries) if op_type != "delete" else None
+                version = meta.get("version") if meta.get("version_type") == "external" else None
+                if target is None:
+                    status = 404
+                elif version is not None and version <= target._versions.get(doc_id, -1):
+                    status = 409
+                elif op_type == "delete":
+                    status = target.delete(doc_id)
+                elif op_type == "create" and doc_id in target._sources:
+                    status = 409
+                else:
+                    status = target.index(doc_id, self._apply_pipeline(pipeline, {**document}))
+                if version is not None and status != 409 and target is not None:
+                    target._versions[doc_id] = version
+
+                item = {"_index": meta.get("_index", index), "_id": doc_id, "status": status}
+                if status >= 300 and not (op_type == "delete" and status == 404):
+                    errors = True
+                    item["error"] = {"type": "local_error", "reason": f"{op_type} failed with {status}"}
+                items.append({op_type: item})
+        return _response({
+            "took": int(1000 * (time.perf_counter() - started)),
+            "errors": errors,
+            "items": items,
+        })
+
+    def open_point_in_time(self, index: str, keep_alive: str, **kwargs):
+        self._index(index)
+        pit_id = f"pit-{next(self._ids)}"
+        self._pits[pit_id] = self._aliases.get(index, index)
+        return _response({"id": pit_id})
+
+    def close_point_in_time(self, id: str, **kwargs):
+        self._pits.pop(id, None)
+        return _response({"succeeded": True, "num_freed": 1})
+
+    def search(self, index: Optional[str] = None, body: Optional[dict] = None, **kwargs):
+        started = time.perf_counter()
+        body = {**(body or {}), **{k: v for k, v in kwargs.items() if k not in ("filter_path", "request_timeout")}}
+        pit = body.get("pit")
+        if pit:
+            index = self._pits[pit["id"]]
+        target = self._index(index)
+        query = body.get("query", {"match_all": {}})
+
+        size = int(body.get("size", 10))
+        search_after = body.get("search_after")
+        start = int(search_after[-1]) + 1 if search_after else int(body.get("from", 0))
+        total, ranked = target.ranked(query, start + size)
+
+        source_filter = body.get("_source", body.get("source"))
+        hits = []
+        for position, (doc_id, score) in enumerate(ranked[start:start + size], start):
+            hit = {
+                "_index": target.name,
+                "_score": score,
+                "_source": _filter_source(target.documents[doc_id], source_filter),
+            }
+            if pit:
+                hit["sort"] = [score, position]
+            hits.append(hit)
+
+        result = {
+            "took": int(1000 * (time.perf_counter() - started)),
+            "hits": {"total": {"value": total, "relation": "eq"}, "hits": hits},
+        }
+        if pit:
+            result["pit_id"] = pit["id"]
+        if "aggs" in body or "aggregations" in body:
+            result["aggregations"] = self._aggregations(target, query, body.get("aggs") or body["aggregations"])
+        return _response(result)
+
+    def _aggregations(self, target: LocalIndex, query: dict, aggs: dict) -> dict:
+        """Only the yearly date_histogram of get_docs_per_year_count"""
+        results = {}
+        for name, agg in aggs.items():
+            if "date_histogram" not in agg:
+                raise NotImplementedError(f"LocalElasticsearch does not support aggregation {agg}")
+            total, ranked = target.ranked(query, len(target.documents))
+            counts: Dict[int, int] = {}
+            for doc_id, _ in ranked:
+                year = target.bm25.years[doc_id]
+                if year:
+                    counts[year] = counts.get(year, 0) + 1
+            results[name] = {
+                "buckets": [
+                    {"key_as_string": str(year), "doc_count": counts[year]} for year in sorted(counts)
+                ]
+            }
+        return results
+
+class _AsyncIndices:
+    def __init__(self, indices: _Indices):
+        self._indices = indices
+
+    async def exists(self, **kwargs) -> bool:
+        return self._indices.exists(**kwargs)
+
+    async def create(self, **kwargs):
+        return self._indices.create(**kwargs)
+
+    async def refresh(self, **kwargs):
+        return self._indices.refresh(**kwargs)
+
+class AsyncLocalElasticsearch:
+    """AsyncElasticsearch surface used by the API, sharing the indices of a LocalElasticsearch"""
+
+    def __init__(self, sync: LocalElasticsearch):
+        self.sync = sync
+        self.indices = _AsyncIndices(sync.indices)
+
+    def options(self, **kwargs) -> "AsyncLocalElasticsearch":
+        return self
+
+    async def ping(self, **kwargs) -> bool:
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def search(self, **kwargs):
+        # scoring is CPU work like on a real node; keep it off the event loop
+        return await asyncio.to_thread(lambda: self.sync.search(**kwargs))
+
+    async def bulk(self, **kwargs):
+        return self.sync.bulk(**kwargs)
+
+    async def open_point_in_time(self, **kwargs):
+        return self.sync.open_point_in_time(**kwargs)
+
+    async def close_point_in_time(self, **kwargs):
+        return self.sync.close_point_in_time(**kwargs)
@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+
+'''
+Embedded BM25 engine used when Elasticsearch is unreachable (and by the offline
+benchmarks). It indexes the same title / explanation documents the indexing scripts
+load and answers the multi_match query of regular_search with ES shaped hits.
+
+Postings are stored as two parallel array('I') per term (doc ids and term
+frequencies) instead of Python lists, which keeps a 1M document corpus in a few
+hundred MB.
+'''
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+class FieldIndex:
+    """Inverted index of a single text field"""
+
+    def __init__(self, texts: Sequence[str]):
+        doc_ids: Dict[str, List[int]] = {}
+        freqs: Dict[str, List[int]] = {}
+        self.doc_lengths = array("I")
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text or "")
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                doc_ids.setdefault(term, []).append(doc_id)
+                freqs.setdefault(term, []).append(tf)
+
+        self.postings: Dict[str, Tuple[array, array]] = {
+            term: (array("I", doc_ids[term]), array("I", freqs[term])) for term in doc_ids
+        }
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def score(self, terms: Sequence[str], k1: float, b: float) -> Dict[int, float]:
+        n_docs = len(self.doc_lengths)
+        scores: Dict[int, float] = {}
+        if not n_docs or not self.avg_length:
+            return scores
+
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, freqs = posting
+            df = len(doc_ids)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in zip(doc_ids, freqs):
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+class BM25Index:
+    """
+    BM25 over several fields combined like a `best_fields` multi_match: a document
+    scores the maximum of its per-field scores.
+    """
+
+    def __init__(
+        self,
+        documents: List[dict],
+        fields: Sequence[str] = ("title", "explanation"),
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.fields = {field: FieldIndex([doc.get(field, "") for doc in documents]) for field in fields}
+        self.years = array("H", (self._year_of(doc) for doc in documents))
+
+    @staticmethod
+    def _year_of(document: dict) -> int:
+        date = str(document.get("date") or "")
+        return int(date[:4]) if date[:4].isdigit() else 0
+
+    @classmethod
+    def from_json_file(cls, path: str, **kwargs) -> "BM25Index":
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    def ranked(
+        self,
+        search_query: str,
+        skip: int = 0,
+        limit: int = 10,
+        year: Optional[str] = None,
+    ) -> Tuple[int, List[Tuple[int, float]]]:
+        """Returns (total matching docs, [(doc id, score)]) best first"""
+        terms = tokenize(search_query)
+        scores: Dict[int, float] = {}
+        for field_index in self.fields.values():
+            for doc_id, score in field_index.score(terms, self.k1, self.b).items():
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+
+        if year:
+            wanted = int(year)
+            scores = {doc_id: score for doc_id, score in scores.items() if self.years[doc_id] == wanted}
+
+        return len(scores), heapq.nlargest(skip + limit, scores.items(), key=lambda item: item[1])[skip:]
+
+    def search(
+        self,
+        search_query: str,
+        skip: int = 0,
+        limit: int = 10,
+        year: Optional[str] = None,
+    ) -> Tuple[int, List[dict]]:
+        """Returns (total matching docs, hits) with hits shaped like ES `hits.hits`"""
+        total, top = self.ranked(search_query, skip, limit, year)
+        hits = [{"_source": self.documents[doc_id], "_score": score} for doc_id, score in top]
+        return total, hits
+
+    def docs_per_year(self, search_query: str) -> Dict[str, int]:
+        terms = tokenize(search_query)
+        matched = set()
+        for field_index in self.fields.values():
+            matched.update(field_index.score(terms, self.k1, self.b))
+        counts = Counter(self.years[doc_id] for doc_id in matched)
+        return {str(year): counts[year] for year in sorted(counts) if year}
+
+async def load_fallback_index(app: FastAPI) -> None:
+    """Build app.state.fallback_index from FALLBACK_CORPUS_PATH in a worker thread"""
+    path = settings.FALLBACK_CORPUS_PATH
+    if not path:
+        return
+    if not os.path.exists(path):
+        logger.warning(f"Fallback search corpus {path} not found, search has no ES fallback")
+        return
+    try:
+        app.state.fallback_index = await asyncio.to_thread(BM25Index.from_json_file, path)
+        logger.info(f"Fallback BM25 index built from {path} ({len(app.state.fallback_index.documents)} documents)")
+    except Exception as e:
+        logger.error(f"Could not build the fallback BM25 index from {path}: {e}")
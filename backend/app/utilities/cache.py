@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import orjson
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+from backend.app.utilities.metrics import Counter
+
+'''
+Search response cache.
+
+Entries are keyed on the request parameters plus the *generation* of every index the
+response was read from. Indexing scripts and write paths call bump_index_generation()
+after modifying an index, which moves every reader to new keys: stale entries are never
+served again and simply age out of the LRU / TTL.
+
+Async handlers use ResultCache.aget() / aset(): the in-process tier runs on the event
+loop, the shared tier (sqlite) on a dedicated thread, so a busy wait on the shared file
+never stalls other requests.
+'''
+
+RESULT_CACHE_HITS = Counter("search_result_cache_hits_total", "Search responses served from cache", ("tier",))
+RESULT_CACHE_MISSES = Counter("search_result_cache_misses_total", "Search responses not found in cache")
+
+# ========== index generations ==========
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on `path` across processes, held for the block"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class IndexGenerations:
+    """
+    Generation numbers per index name, stored in a small JSON file shared by the API
+    workers and the indexing scripts. Readers only re-read the file when its mtime changes.
+    Bumps hold a lock file for their read-modify-write, so two processes bumping at the
+    same time cannot overwrite each other's generation.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._generations: dict = {}
+        self._lock = threading.Lock()
+
+    def _reload(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            self._mtime, self._generations = None, {}
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                self._generations = json.load(f)
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read index generations from {self.path}: {e}")
+
+    def get(self, index_name: str) -> int:
+        with self._lock:
+            self._reload()
+            return self._generations.get(index_name, 0)
+
+    def bump(self, index_name: str) -> int:
+        """Give `index_name` a new generation; a nanosecond timestamp so concurrent writers never collide"""
+        with self._lock, _file_lock(f"{self.path}.lock"):
+            # always re-read under the lock: another process may have written within the mtime resolution
+            self._mtime = None
+            self._reload()
+            generations = dict(self._generations)
+            generation = max(time.time_ns(), generations.get(index_name, 0) + 1)
+            generations[index_name] = generation
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(generations, f)
+            os.replace(tmp_path, self.path)
+
+            self._generations, self._mtime = generations, None
+            logger.info(f"Index generation of '{index_name}' bumped to {generation}")
+            return generation
+
+index_generations = IndexGenerations(settings.INDEX_GENERATIONS_PATH)
+
+def get_index_generation(index_name: str) -> int:
+    return index_generations.get(index_name)
+
+def bump_index_generation(index_name: str) -> int:
+    return index_generations.bump(index_name)
+
+# ========== shared backends ==========
+class CacheBackend:
+    """Interface of the shared (cross worker) tier. Values are opaque bytes."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Shared tier for every worker on one host, backed by a sqlite file in WAL mode.
+    Expired rows are deleted by the first write after every `purge_interval` seconds.
+    """
+
+    def __init__(self, path: str, purge_interval: float = 60):
+        self._lock = threading.Lock()
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=1)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_result_cache_expires_at ON result_cache (expires_at)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl),
+            )
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                self._conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (now,))
+
+def create_cache_backend(name: str) -> Optional[CacheBackend]:
+    if name == "memory":
+        return None
+    if name == "sqlite":
+        return SQLiteCacheBackend(settings.RESULT_CACHE_PATH)
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND '{name}'")
+
+# ========== result cache ==========
+class ResultCache:
+    """In-process LRU tier in front of an optional shared CacheBackend"""
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        ttl: float = 600,
+        backend: Optional[CacheBackend] = None,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._backend_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-cache") if backend is not None else None
+        )
+
+    @staticmethod
+    def make_key(endpoint: str, index_names: list[str], **params) -> str:
+        generations = [f"{name}@{get_index_generation(name)}" for name in index_names]
+        raw = orjson.dumps({"generations": generations, "params": params}, option=orjson.OPT_SORT_KEYS)
+        return f"{endpoint}:{hashlib.blake2b(raw, digest_size=16).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None:
+            return value
+        return self._shared_hit(key, self._backend_get(key) if self.backend is not None else None, now)
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._put(key, value, time.time())
+        if self.backend is not None:
+            self._backend_set(key, orjson.dumps(value))
+
+    async def aget(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None or self.backend is None:
+            return value if value is not None else self._shared_hit(key, None, now)
+        raw = await asyncio.get_running_loop().run_in_executor(self._backend_executor, self._backend_get, key)
+        return self._shared_hit(key, raw, now)
+
+    async def aset(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._put(key, value, time.time())
+        if self.backend is not None:
+            # write-through in the background: the response is already computed
+            self._backend_executor.submit(self._backend_set, key, orjson.dumps(value))
+
+    def _memory_get(self, key: str, now: float) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    RESULT_CACHE_HITS.inc(tier="memory")
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    def _shared_hit(self, key: str, raw: Optional[bytes], now: float) -> Optional[Any]:
+        """Count a lookup that missed memory and promote a shared tier hit into it"""
+        if raw is None:
+            RESULT_CACHE_MISSES.inc()
+            return None
+        value = orjson.loads(raw)
+        self._put(key, value, now)
+        RESULT_CACHE_HITS.inc(tier="shared")
+        return value
+
+    def _backend_get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Result cache backend read failed: {e}")
+            return None
+
+    def _backend_set(self, key: str, raw: bytes) -> None:
+        try:
+            self.backend.set(key, raw, self.ttl)
+        except Exception as e:
+            logger.warning(f"Result cache backend write failed: {e}")
+
+    def _put(self, key: str, value: Any, now: float) -> None:
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
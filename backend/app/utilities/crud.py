@@ -1,142 +1,311 @@
 # ===== Import necessary libraries =====
-from sqlalchemy.orm import Session
-from sqlalchemy import select, desc
-from typing import Optional, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlalchemy import select, desc, insert as sql_insert, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, Optional, List, Tuple
 from fastapi import HTTPException 
 
-from backend.app.models.schemas import UserResponse, MerchantCreate, MerchantResponse
-from backend.app.models.models import User, Referral, Category, Product, Merchant, Offer
+from backend.app.config import settings
+from backend.app.models.schemas import UserResponse, MerchantCreate, MerchantResponse, OfferResponse, ProductResponse, OfferUpsert, OfferBulkResult, OfferRejected
+from backend.app.models.models import User, Referral, Category, Product, Merchant, Offer, PriceHistory, SearchOutbox
+from backend.app.utilities.pagination import paginate_keyset
+from backend.app.loggers.logger import logger
+
+# sort orders of the paginated listings; each ends with the id as tie breaker and has a matching index
+PRODUCT_SORT_KEYS = {"id": (Product.id,), "name": (Product.name, Product.id)}
+MERCHANT_SORT_KEYS = {"id": (Merchant.id,), "name": (Merchant.name, Merchant.id)}
+
+# loader profiles: everything a response model reads is loaded with the page, in a fixed
+# number of queries whatever the page size; any other relationship raises instead of
+# quietly issuing one query per row
+PRODUCT_RESPONSE_PROFILE = (
+    joinedload(Product.category),                                # many-to-one: same query
+    selectinload(Product.offers).joinedload(Offer.merchant),     # one IN (...) query per page
+    raiseload("*"),
+)
+OFFER_RESPONSE_PROFILE = (joinedload(Offer.merchant), raiseload("*"))
+
+def best_offer(offers: Iterable[Offer]) -> Optional[Offer]:
+    """Cheapest offer in stock, None when nothing is in stock"""
+    return min((offer for offer in offers if offer.is_in_stock), key=lambda offer: offer.current_price, default=None)
+
+def product_dto(product: Product) -> ProductResponse:
+    """Detach a loaded product into its response model, nothing is read lazily afterwards"""
+    dto = ProductResponse.model_validate(product)
+    offer = best_offer(product.offers)
+    dto.offer = OfferResponse.model_validate(offer) if offer is not None else None
+    return dto
 
 # ====== User Operations =======
-def get_user_by_username(session: Session, username: str) -> Optional[User]:
+async def get_user_by_username(session: AsyncSession, username: str) -> Optional[User]:
     statement = select(User).where(User.username == username)
-    return session.scalars(statement).first()
+    return (await session.scalars(statement)).first()
 
-def get_user_by_user_id(session: Session, id: str) -> Optional[UserResponse]: 
-    statement = session.get(User, id)
+async def get_user_by_user_id(session: AsyncSession, id: str) -> Optional[UserResponse]: 
+    statement = await session.get(User, id)
     return statement
 
-def create_user(session: Session, user: User) -> User:
+async def create_user(session: AsyncSession, user: User) -> User:
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
     return user
 
-def get_all_users(session: Session, role: str, skip: int = 0, limit: int = 100) -> List[User]:
-    """Fetch all users"""
+async def get_all_users(
+    session: AsyncSession, role: str, cursor: Optional[str] = None, limit: int = 100
+) -> Tuple[List[User], Optional[str]]:
+    """Fetch one page of users, and the cursor of the next"""
         
-    statement = select(User).offset(skip).limit(limit)
+    statement = select(User)
     if role:
         statement = statement.where(User.role == role)
-    users = session.scalars(statement).all()
-    return users
+    return await paginate_keyset(session, statement, (User.id,), cursor, limit)
 
-def delete_user_by_id(session: Session, user_id: int):
+async def delete_user_by_id(session: AsyncSession, user_id: int):
 
-    links = session.scalars(
+    links = (await session.scalars(
         select(Referral).where(Referral.user_id == user_id)
-    ).all()
+    )).all()
 
     for link in links:
-        session.delete(link)
+        await session.delete(link)
 
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         return False
 
-    session.delete(user)
-    session.commit()
+    await session.delete(user)
+    await session.commit()
     return True
 
 # ====================== Categories Operations 
-def get_category_by_name(session: Session, category_name: str) -> Optional[Category]:
+async def get_category_by_name(session: AsyncSession, category_name: str) -> Optional[Category]:
     statement = select(Category).where(Category.name == category_name)
-    return session.scalars(statement).first() 
+    return (await session.scalars(statement)).first() 
 
-def create_category(session: Session, category: Category) -> Category: 
+async def create_category(session: AsyncSession, category: Category) -> Category: 
     session.add(category)
-    session.commit() 
-    session.refresh(category)
+    await session.commit() 
+    await session.refresh(category)
     return category
 
-def get_all_category(session: Session) -> List[Category]:
-    result = session.scalars(select(Category)).all()
+async def get_all_category(session: AsyncSession) -> List[Category]:
+    result = (await session.scalars(select(Category))).all()
     return result
 
-def get_all_products_by_category(
-    session: Session,
+async def get_all_products_by_category(
+    session: AsyncSession,
     slug: str,
-    skip: int = 0,
+    sort: str = "id",
+    descending: bool = False,
+    cursor: Optional[str] = None,
     limit: int = 10
-) -> List[Product]:
+) -> Tuple[List[ProductResponse], Optional[str]]:
     """
-    Fetch all products belonging to a category identified by slug
+    Fetch one page of the products belonging to a category identified by slug
     """
 
+    # filter on category_id itself so (category_id, <sort keys>) serves the whole query
+    category_id = select(Category.id).where(Category.slug == slug).scalar_subquery()
     statement = (
         select(Product)
-        .join(Category)
-        .where(Category.slug == slug)
-        .offset(skip)
-        .limit(limit)
+        .options(*PRODUCT_RESPONSE_PROFILE)
+        .where(Product.category_id == category_id)
     )
+    products, next_cursor = await paginate_keyset(session, statement, PRODUCT_SORT_KEYS[sort], cursor, limit, descending)
+    return [product_dto(product) for product in products], next_cursor
 
-    products = session.scalars(statement).all()
-    return products
+# ============== Search outbox ===========
+def record_outbox(session: AsyncSession, product_id: int, op: str = "upsert") -> SearchOutbox:
+    """Queue a product for the search index; committed (or rolled back) with the caller's change"""
+    entry = SearchOutbox(product_id=product_id, op=op)
+    session.add(entry)
+    return entry
 
 # ============== Product ===========
-def get_existing_product(session: Session, product_name: str) -> Product: 
+async def get_existing_product(session: AsyncSession, product_name: str) -> Product: 
     statement = select(Product).where(Product.name == product_name)
-    return session.scalars(statement).first()
+    return (await session.scalars(statement)).first()
 
-def create_product(session: Session, product: Product) -> Product: 
+async def create_product(session: AsyncSession, product: Product) -> ProductResponse: 
     session.add(product)
-    session.commit() 
-    session.refresh(product)
-    return product
+    await session.flush()
+    record_outbox(session, product.id)
+    await session.commit() 
+    # ProductResponse includes the category; no lazy loads on an AsyncSession
+    await session.refresh(product, ["category"])
+    return ProductResponse.model_validate(product)  # a new product has no offers yet
 
 # ======== offer =========
-def create_offer(session: Session, offer: Offer) -> Offer: 
+async def create_offer(session: AsyncSession, offer: Offer) -> OfferResponse: 
     session.add(offer)
-    session.commit()
-    session.refresh(offer)
-    return offer 
+    # best price and stock of the product change with its offers
+    record_outbox(session, offer.product_id)
+    await session.commit()
+    await session.refresh(offer, ["merchant"])
+    return OfferResponse.model_validate(offer)
+
+# ======== bulk offer upsert (scrapers) =========
+# INSERT ... ON CONFLICT of the dialects we run on
+OFFER_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+OFFER_UPSERT_COLUMNS = ("affiliate_url", "original_price", "current_price", "discount_percent", "is_in_stock", "last_scraped_at")
+CENT = Decimal("0.01")
+
+def offer_upsert_values(offer: OfferUpsert, scraped_at: datetime) -> dict:
+    # compare prices at the precision they are stored with, or every run looks like a change
+    original_price = offer.original_price.quantize(CENT)
+    current_price = offer.current_price.quantize(CENT)
+    discount_percent = offer.discount_percent
+    if discount_percent is None:
+        discount_percent = float(round((original_price - current_price) / original_price * 100, 2)) if original_price > 0 else 0.0
+    return {
+        "product_id": offer.product_id,
+        "merchant_id": offer.merchant_id,
+        "affiliate_url": offer.affiliate_url,
+        "original_price": original_price,
+        "current_price": current_price,
+        "discount_percent": discount_percent,
+        "is_in_stock": offer.is_in_stock,
+        "last_scraped_at": scraped_at,
+    }
+
+async def upsert_offer_chunk(session: AsyncSession, offers: List[OfferUpsert], result: OfferBulkResult) -> None:
+    """Upsert one chunk in the session's transaction: 4 statements plus one per kind of row appended"""
+    insert = OFFER_UPSERT_INSERTS[session.bind.dialect.name]
+    now = datetime.utcnow()
+
+    known_products = set(await session.scalars(select(Product.id).where(Product.id.in_({o.product_id for o in offers}))))
+    known_merchants = set(await session.scalars(select(Merchant.id).where(Merchant.id.in_({o.merchant_id for o in offers}))))
+    valid = []
+    for offer in offers:
+        if offer.product_id not in known_products or offer.merchant_id not in known_merchants:
+            reason = "unknown product" if offer.product_id not in known_products else "unknown merchant"
+            result.rejected.append(OfferRejected(product_id=offer.product_id, merchant_id=offer.merchant_id, reason=reason))
+        else:
+            valid.append(offer_upsert_values(offer, now))
+    if not valid:
+        return
+
+    # current state of the offers being replaced, locked until the chunk commits
+    existing = {
+        (row.product_id, row.merchant_id): row
+        for row in await session.execute(
+            select(Offer.product_id, Offer.merchant_id, *(getattr(Offer, column) for column in OFFER_UPSERT_COLUMNS[:-1]))
+            .where(tuple_(Offer.product_id, Offer.merchant_id).in_([(v["product_id"], v["merchant_id"]) for v in valid]))
+            .with_for_update()
+        )
+    }
+
+    statement = insert(Offer).values(valid)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Offer.product_id, Offer.merchant_id],
+        set_={column: statement.excluded[column] for column in OFFER_UPSERT_COLUMNS},
+    ).returning(Offer.id, Offer.product_id, Offer.merchant_id)
+    offer_ids = {(row.product_id, row.merchant_id): row.id for row in await session.execute(statement)}
+
+    history, changed_products = [], set()
+    for values in valid:
+        key = (values["product_id"], values["merchant_id"])
+        old = existing.get(key)
+        price_changed = old is None or old.current_price != values["current_price"]
+        if price_changed:
+            history.append({"offer_id": offer_ids[key], "price": values["current_price"], "recorded_at": now})
+        if price_changed or old.is_in_stock != values["is_in_stock"]:
+            changed_products.add(values["product_id"])
+
+        if old is None:
+            result.inserted += 1
+        elif price_changed or any(getattr(old, column) != values[column] for column in OFFER_UPSERT_COLUMNS[:-1]):
+            result.updated += 1
+        else:
+            result.unchanged += 1
+
+    if history:
+        await session.execute(sql_insert(PriceHistory), history)
+        result.price_changes += len(history)
+    if changed_products:
+        # best price or stock may have moved: refresh the search documents (see utilities/outbox.py)
+        await session.execute(sql_insert(SearchOutbox), [{"product_id": product_id, "op": "upsert"} for product_id in changed_products])
+
+async def bulk_upsert_offers(session: AsyncSession, offers: List[OfferUpsert], chunk_size: Optional[int] = None) -> OfferBulkResult:
+    """
+    Insert or update offers keyed on (product_id, merchant_id) with one set-based
+    INSERT ... ON CONFLICT per chunk, each chunk in its own transaction. PriceHistory
+    gets a row for new offers and for offers whose current price changed.
 
-def get_exisiting_offer(session: Session, product_id: int) -> Offer: 
+    A chunk that fails is rolled back on its own: its rows are listed in `rejected`,
+    `failed_chunks` counts it and the remaining chunks still run, so the counts
+    returned are exactly what was committed and the caller can resend the rejected rows.
+    """
+    if session.bind.dialect.name not in OFFER_UPSERT_INSERTS:
+        raise NotImplementedError(f"Bulk offer upsert is not supported on {session.bind.dialect.name}")
+
+    result = OfferBulkResult(received=len(offers))
+    # the last entry wins when a batch repeats a (product, merchant) pair
+    latest = list({(offer.product_id, offer.merchant_id): offer for offer in offers}.values())
+    chunk_size = chunk_size or settings.OFFER_UPSERT_CHUNK_SIZE
+    for start in range(0, len(latest), chunk_size):
+        chunk = latest[start:start + chunk_size]
+        # counted apart and merged once committed: a rolled back chunk adds nothing
+        chunk_result = OfferBulkResult(received=len(chunk))
+        try:
+            await upsert_offer_chunk(session, chunk, chunk_result)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Bulk offer upsert: chunk of {len(chunk)} offers at {start} rolled back: {e}")
+            result.failed_chunks += 1
+            result.rejected.extend(
+                OfferRejected(product_id=offer.product_id, merchant_id=offer.merchant_id, reason=f"chunk failed: {type(e).__name__}")
+                for offer in chunk
+            )
+            continue
+        for field in ("inserted", "updated", "unchanged", "price_changes"):
+            setattr(result, field, getattr(result, field) + getattr(chunk_result, field))
+        result.rejected.extend(chunk_result.rejected)
+        result.chunks += 1
+    return result
+
+async def get_exisiting_offer(session: AsyncSession, product_id: int) -> Offer: 
     statement = select(Offer).where(Offer.product_id == product_id)
-    return session.scalars(statement).first()
+    return (await session.scalars(statement)).first()
 
-def get_existing_referral(session: Session, offer_id: int) -> Referral:
+async def get_existing_referral(session: AsyncSession, offer_id: int) -> Referral:
     statement = select(Referral).where(Referral.offer_id == offer_id)
-    return session.scalars(statement).first()
+    return (await session.scalars(statement)).first()
 
-def create_referral(session: Session, referral: Referral) -> Referral: 
+async def create_referral(session: AsyncSession, referral: Referral) -> Referral: 
     session.add(referral)
-    session.commit()
-    session.refresh(referral)
+    await session.commit()
+    await session.refresh(referral)
     return referral
 
 # ========== create all merchant helper functions ==============
-def get_merchant_by_merchantname(session: Session, merchant_name: str) -> Merchant:
+async def get_merchant_by_merchantname(session: AsyncSession, merchant_name: str) -> Merchant:
     statement = select(Merchant).where(Merchant.name == merchant_name)
-    return session.scalars(statement).first()
+    return (await session.scalars(statement)).first()
 
-def create_merchant(session: Session, merchant: Merchant) -> Merchant: 
+async def create_merchant(session: AsyncSession, merchant: Merchant) -> Merchant: 
     session.add(merchant)
-    session.commit()
-    session.refresh(merchant)
+    await session.commit()
+    await session.refresh(merchant)
     return merchant
 
-def get_all_merchant(session: Session) -> Merchant: 
+async def get_all_merchant(
+    session: AsyncSession, sort: str = "id", descending: bool = False, cursor: Optional[str] = None, limit: int = 20
+) -> Tuple[List[Merchant], Optional[str]]: 
     statement = select(Merchant)
-    return session.scalars(statement).all()
+    return await paginate_keyset(session, statement, MERCHANT_SORT_KEYS[sort], cursor, limit, descending)
 
-def get_merchant_by_id(session: Session, merchant_id: str) -> Merchant: 
+async def get_merchant_by_id(session: AsyncSession, merchant_id: str) -> Merchant: 
     statement = select(Merchant).where(Merchant.id == merchant_id)
-    return session.scalars(statement).first()
+    return (await session.scalars(statement)).first()
 
-def update_merchant(session: Session, merchant_id: str, merchant_data: MerchantCreate) -> MerchantResponse: 
-    merchant = session.get(Merchant, merchant_id)
+async def update_merchant(session: AsyncSession, merchant_id: str, merchant_data: MerchantCreate) -> MerchantResponse: 
+    merchant = await session.get(Merchant, merchant_id)
     if not merchant:
         raise HTTPException(404, "Merchant not found")
 
@@ -145,25 +314,28 @@ def update_merchant(session: Session, merchant_id: str, merchant_data: MerchantC
     merchant.website_url = merchant_data.website_url
 
     session.add(merchant)
-    session.commit()
-    session.refresh(merchant)
+    await session.commit()
+    await session.refresh(merchant)
     return merchant
 
-def delete_merchant_by_id(session: Session, merchant_id: int) : 
+async def delete_merchant_by_id(session: AsyncSession, merchant_id: int) : 
     """Delete Merchant by ID"""
 
-    merchant = session.get(Merchant, merchant_id)
+    merchant = await session.get(Merchant, merchant_id)
     if not merchant: 
         raise HTTPException(404, "Merchant not found")
     
-    session.delete(merchant)
-    session.commit()
+    await session.delete(merchant)
+    await session.commit()
     return {"Message": "Merchant deleted successfully"}
 
-def get_existing_all_product(session: Session) -> Product: 
-    statement = select(Product)
-    return session.scalars(statement).all()
+async def get_existing_all_product(
+    session: AsyncSession, sort: str = "id", descending: bool = False, cursor: Optional[str] = None, limit: int = 20
+) -> Tuple[List[ProductResponse], Optional[str]]: 
+    statement = select(Product).options(*PRODUCT_RESPONSE_PROFILE)
+    products, next_cursor = await paginate_keyset(session, statement, PRODUCT_SORT_KEYS[sort], cursor, limit, descending)
+    return [product_dto(product) for product in products], next_cursor
 
-def get_all_offer_on_product(session: Session, product_id: int) -> Product: 
-    statement = select(Offer).where(Offer.product_id == product_id)
-    return session.scalars(statement).all()
\ No newline at end of file
+async def get_all_offer_on_product(session: AsyncSession, product_id: int) -> List[OfferResponse]: 
+    statement = select(Offer).where(Offer.product_id == product_id).options(*OFFER_RESPONSE_PROFILE)
+    return [OfferResponse.model_validate(offer) for offer in (await session.scalars(statement)).all()]
\ No newline at end of file
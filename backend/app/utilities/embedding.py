@@ -0,0 +1,432 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+from backend.app.utilities.metrics import Counter, Gauge
+
+EMBEDDING_BATCHES = Counter("embedding_batches_total", "Batched encode calls sent to the model")
+EMBEDDING_BATCHED_QUERIES = Counter("embedding_batched_queries_total", "Query texts encoded through the batcher")
+EMBEDDING_BATCH_ERRORS = Counter("embedding_batch_errors_total", "Batched encode calls that raised")
+EMBEDDING_QUEUE_DEPTH = Gauge("embedding_queue_depth", "Query texts waiting for the next batch")
+EMBEDDING_BATCH_MAX_SIZE = Gauge("embedding_batch_max_size", "Configured maximum batch size")
+EMBEDDING_BATCH_WINDOW_MS = Gauge("embedding_batch_window_ms", "Configured batch gathering window in milliseconds")
+
+# ========== embedding backends ==========
+class EmbeddingBackend:
+    """Turns text into embedding vectors. `encode(str)` gives one vector, `encode(list)` a matrix."""
+
+    name = "base"
+
+    def encode(self, texts: str | List[str], batch_size: int = 32) -> np.ndarray:
+        raise NotImplementedError
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    SentenceTransformer on PyTorch (`backend="torch"`) or ONNX Runtime (`backend="onnx"`).
+    For ONNX, `file_name` picks a file of the model repo, e.g. the int8 dynamic-quantized
+    onnx/model_quint8_avx2.onnx shipped with all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, model_name: str, backend: str = "torch", file_name: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = backend if file_name is None else f"{backend}:{file_name}"
+        if backend == "torch":
+            import torch
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = SentenceTransformer(model_name, device=device)
+            return
+
+        model_kwargs = {"file_name": file_name} if file_name else {}
+        try:
+            self.model = SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs, device="cpu")
+        except ImportError as e:
+            raise RuntimeError(
+                f"EMBEDDING_BACKEND '{backend}' needs the optional ONNX dependencies: "
+                "pip install 'sentence-transformers[onnx]'"
+            ) from e
+
+    def encode(self, texts: str | List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Model free stand-in for offline benchmarks and CI: every token is hashed into a
+    fixed random direction and a text is the normalized sum of its tokens. Texts that
+    share words land close together, which is all the kNN code path needs.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dims: int = 384):
+        self.dims = dims
+        self._vectors: dict[str, np.ndarray] = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self._vectors.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dims).astype(np.float32)
+            self._vectors[token] = vector
+        return vector
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in normalize_query(text).split():
+            vector += self._token_vector(token)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts: str | List[str], batch_size: int = 32) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.stack([self._encode_one(text) for text in texts]) if texts else np.zeros((0, self.dims), np.float32)
+
+def load_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """Backend selected by EMBEDDING_BACKEND: torch | onnx | onnx-int8 | hashing"""
+    name = name or settings.EMBEDDING_BACKEND
+    logger.info(f"Loading embedding model {settings.EMBEDDING_MODEL_NAME} with backend '{name}'")
+    if name == "torch":
+        return SentenceTransformerBackend(settings.EMBEDDING_MODEL_NAME)
+    if name == "onnx":
+        return SentenceTransformerBackend(settings.EMBEDDING_MODEL_NAME, "onnx", settings.EMBEDDING_ONNX_FILE)
+    if name == "onnx-int8":
+        return SentenceTransformerBackend(
+            settings.EMBEDDING_MODEL_NAME, "onnx", settings.EMBEDDING_ONNX_FILE or "onnx/model_quint8_avx2.onnx"
+        )
+    if name == "hashing":
+        return HashingEmbeddingBackend()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{name}'")
+
+class LazyEmbeddingModel(EmbeddingBackend):
+    """
+    Defers load_embedding_backend() (and with it the torch / onnxruntime imports) to the
+    first encode, or to warm() when the lifespan preloads it. `status` feeds /health.
+    """
+
+    def __init__(self, name: Optional[str] = None):
+        self.backend_name = name or settings.EMBEDDING_BACKEND
+        self.name = self.backend_name
+        self.status = "not_loaded"
+        self._backend: Optional[EmbeddingBackend] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._backend is not None
+
+    def get(self) -> EmbeddingBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self.status = "loading"
+                    started = time.perf_counter()
+                    try:
+                        backend = load_embedding_backend(self.backend_name)
+                    except Exception:
+                        self.status = "failed"
+                        raise
+                    self._backend = backend
+                    self.name = backend.name
+                    self.status = "ready"
+                    logger.info(f"Embedding model loaded in {time.perf_counter() - started:.1f}s")
+        return self._backend
+
+    async def warm(self) -> None:
+        """Load the model and run one encode in a worker thread, off the event loop"""
+        try:
+            await asyncio.to_thread(lambda: self.get().encode(["warm up"]))
+        except Exception as e:
+            logger.error(f"Embedding model warm up failed: {e}")
+
+    def encode(self, texts: str | List[str], batch_size: int = 32) -> np.ndarray:
+        return self.get().encode(texts, batch_size=batch_size)
+
+def embedding_parity(reference: EmbeddingBackend, candidate: EmbeddingBackend, texts: List[str]) -> dict:
+    """Cosine similarity between two backends' embeddings of the same texts, plus encode latency"""
+    started = time.perf_counter()
+    expected = np.asarray(reference.encode(texts), dtype=np.float32)
+    reference_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = np.asarray(candidate.encode(texts), dtype=np.float32)
+    candidate_seconds = time.perf_counter() - started
+
+    cosine = np.sum(expected * actual, axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1) + 1e-12
+    )
+    return {
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "texts": len(texts),
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        "cosine_p5": float(np.percentile(cosine, 5)),
+        "max_drift": float(1 - cosine.min()),
+        "reference_ms_per_text": 1000 * reference_seconds / len(texts),
+        "candidate_ms_per_text": 1000 * candidate_seconds / len(texts),
+    }
+
+# ========== query embedding cache ==========
+def normalize_query(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a cache entry"""
+    return " ".join(text.lower().split())
+
+class EmbeddingCache:
+    """
+    Bounded LRU + TTL cache of normalized query text -> embedding vector.
+
+    The in-process tier lives in an OrderedDict. When `disk_path` is set, a sqlite
+    file (WAL mode) is used as a second tier so every uvicorn worker on the host
+    can reuse the encodings of the others.
+
+    Async callers use aget() / aset(): only the memory tier runs on the event loop,
+    sqlite reads are awaited on a dedicated thread and write-through is queued there
+    without waiting, so lock waits on the shared file never stall other requests.
+
+    The disk tier is bounded like the memory one: the first write after every
+    `purge_interval` seconds deletes rows older than `ttl` and trims the file to the
+    newest `max_size` rows.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = 86400,
+        disk_path: Optional[str] = None,
+        namespace: str = "",
+        purge_interval: float = 60,
+    ):
+        # keeps vectors of different models / backends apart in the shared disk tier
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk = self._open_disk(disk_path) if disk_path else None
+        self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache") if self._disk else None
+
+        Gauge("embedding_cache_size", "Entries in the in-process query embedding cache").set_function(lambda: len(self._entries))
+        Counter("embedding_cache_hits_total", "Query embedding cache hits (memory)").set_function(lambda: self.hits)
+        Counter("embedding_cache_disk_hits_total", "Query embedding cache hits (disk tier)").set_function(lambda: self.disk_hits)
+        Counter("embedding_cache_misses_total", "Query embedding cache misses").set_function(lambda: self.misses)
+
+    def _open_disk(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=1)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embedding ("
+                "query TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_query_embedding_created_at ON query_embedding (created_at)")
+            return conn
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache disabled, could not open {path}: {e}")
+            return None
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        now = time.time()
+        vector = self._memory_get(key, now)
+        if vector is not None:
+            return vector
+        return self._disk_hit(key, self._disk_get(key, now), now)
+
+    def set(self, text: str, vector: np.ndarray) -> None:
+        key, vector, now = self._memory_set(text, vector)
+        self._disk_set(key, vector, now)
+
+    async def aget(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        now = time.time()
+        vector = self._memory_get(key, now)
+        if vector is not None or self._disk is None:
+            return self._disk_hit(key, None, now) if vector is None else vector
+        disk_vector = await asyncio.get_running_loop().run_in_executor(self._disk_executor, self._disk_get, key, now)
+        return self._disk_hit(key, disk_vector, now)
+
+    async def aset(self, text: str, vector: np.ndarray) -> None:
+        key, vector, now = self._memory_set(text, vector)
+        if self._disk_executor is not None:
+            # write-through in the background: the caller already has its vector
+            self._disk_executor.submit(self._disk_set, key, vector, now)
+
+    def _memory_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, vector = entry
+                if now - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+        return None
+
+    def _memory_set(self, text: str, vector: np.ndarray) -> tuple[str, np.ndarray, float]:
+        key = self._key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._put(key, vector, now)
+        return key, vector, now
+
+    def _disk_hit(self, key: str, vector: Optional[np.ndarray], now: float) -> Optional[np.ndarray]:
+        """Count a lookup that missed memory and promote a disk hit into it"""
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put(key, vector, now)
+        return vector
+
+    def _key(self, text: str) -> str:
+        return f"{self.namespace}|{normalize_query(text)}" if self.namespace else normalize_query(text)
+
+    def _put(self, key: str, vector: np.ndarray, created_at: float) -> None:
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        if self._disk is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT vector, created_at FROM query_embedding WHERE query = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache read failed: {e}")
+            return None
+        if row is None or now - row[1] >= self.ttl:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _disk_set(self, key: str, vector: np.ndarray, now: float) -> None:
+        if self._disk is None:
+            return
+        try:
+            with self._disk_lock:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO query_embedding (query, vector, created_at) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), now),
+                )
+                if now - self._last_purge >= self.purge_interval:
+                    self._last_purge = now
+                    self._purge_disk(now)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def _purge_disk(self, now: float) -> None:
+        """Drop expired rows, then all but the newest max_size (caller holds _disk_lock)"""
+        expired = self._disk.execute("DELETE FROM query_embedding WHERE created_at < ?", (now - self.ttl,)).rowcount
+        trimmed = self._disk.execute(
+            "DELETE FROM query_embedding WHERE query IN ("
+            "SELECT query FROM query_embedding ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        ).rowcount
+        if expired or trimmed:
+            logger.info(f"Embedding disk cache purged {expired} expired and {trimmed} least recent entries")
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+# ========== micro-batching ==========
+class EmbeddingBatcher:
+    """
+    Gathers concurrent query texts for up to `max_wait_ms` (or until `max_batch_size`
+    texts are pending) and encodes them with a single `encode_fn(texts)` call on a
+    worker thread, so the event loop never runs the model itself.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding")
+        self._pending: List[tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        EMBEDDING_BATCH_MAX_SIZE.set(max_batch_size)
+        EMBEDDING_BATCH_WINDOW_MS.set(max_wait_ms)
+        EMBEDDING_QUEUE_DEPTH.set_function(lambda: len(self._pending))
+
+    async def encode(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        texts = [text for text, _ in batch]
+        futures = [future for _, future in batch]
+        EMBEDDING_BATCHES.inc()
+        EMBEDDING_BATCHED_QUERIES.inc(len(texts))
+
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self._executor, self.encode_fn, texts)
+        task.add_done_callback(lambda done: self._resolve(done, futures))
+
+    @staticmethod
+    def _resolve(done: asyncio.Future, futures: List[asyncio.Future]) -> None:
+        error = done.exception()
+        if error is not None:
+            EMBEDDING_BATCH_ERRORS.inc()
+            logger.error(f"Batched embedding of {len(futures)} queries failed: {error}")
+
+        for i, future in enumerate(futures):
+            if future.done():
+                # caller went away (request cancelled) while the batch was running
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
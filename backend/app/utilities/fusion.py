@@ -0,0 +1,52 @@
+from typing import Callable, Dict, List, Sequence
+
+'''
+Result fusion for hybrid search. Both functions take one ranked hit list per leg
+(lexical, semantic, ...) in Elasticsearch hit shape and return a single list
+ordered by the fused `_score`.
+'''
+
+def hit_key(hit: dict):
+    """Identity of a document across indices (the indexes use auto generated _ids)"""
+    source = hit.get("_source", {})
+    return (source.get("date"), source.get("title"))
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[List[dict]],
+    weights: Sequence[float],
+    rank_constant: int = 60,
+    key: Callable[[dict], object] = hit_key,
+) -> List[dict]:
+    """score(d) = sum_i weight_i / (rank_constant + rank_i(d))"""
+    scores: Dict[object, float] = {}
+    docs: Dict[object, dict] = {}
+    for hits, weight in zip(result_lists, weights):
+        for rank, hit in enumerate(hits, start=1):
+            doc_key = key(hit)
+            scores[doc_key] = scores.get(doc_key, 0.0) + weight / (rank_constant + rank)
+            docs.setdefault(doc_key, hit)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [{**docs[doc_key], "_score": score} for doc_key, score in ranked]
+
+def weighted_score_fusion(
+    result_lists: Sequence[List[dict]],
+    weights: Sequence[float],
+    key: Callable[[dict], object] = hit_key,
+) -> List[dict]:
+    """Min-max normalise each leg's _score to [0, 1], then take the weighted sum"""
+    scores: Dict[object, float] = {}
+    docs: Dict[object, dict] = {}
+    for hits, weight in zip(result_lists, weights):
+        if not hits:
+            continue
+        leg_scores = [hit.get("_score") or 0.0 for hit in hits]
+        low, high = min(leg_scores), max(leg_scores)
+        spread = (high - low) or 1.0
+        for hit, score in zip(hits, leg_scores):
+            doc_key = key(hit)
+            scores[doc_key] = scores.get(doc_key, 0.0) + weight * (score - low) / spread
+            docs.setdefault(doc_key, hit)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [{**docs[doc_key], "_score": score} for doc_key, score in ranked]
@@ -0,0 +1,152 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+'''
+Minimal in-process metrics registry rendered in the Prometheus text format on GET /metrics.
+Every metric registers itself by name on creation (a re-declared name replaces the old one),
+so modules just declare them at import time.
+'''
+
+REGISTRY: Dict[str, "Metric"] = {}
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` at scrape time instead of storing it"""
+        self._function = function
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {self._function()}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+# latency buckets in seconds, from sub-millisecond cache hits to slow kNN pages
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per bucket counts + one +Inf slot, sum, count)
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = series
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+
+        lines = []
+        labelnames = self.labelnames + ("le",)
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labelnames, key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class StageTimer:
+    """
+    Per request stage durations. Rendered as a Server-Timing header and fed to histograms.
+
+        timer = StageTimer()
+        with timer.stage("es"):
+            response = await es.search(...)
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def finish(self) -> None:
+        self.stages["total"] = time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items())
+
+    def observe(self, histogram: Histogram, **labels) -> None:
+        for name, seconds in self.stages.items():
+            histogram.observe(seconds, stage=name, **labels)
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY.values()) + "\n"
@@ -0,0 +1,250 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+from fastapi import FastAPI
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session, selectinload
+
+from backend.app.config import settings
+from backend.app.db.database import SessionLocal
+from backend.app.loggers.logger import logger
+from backend.app.models.models import Product, SearchOutbox
+from backend.app.search.bulk_indexer import serialize_action
+from backend.app.utilities.cache import bump_index_generation
+from backend.app.utilities.crud import best_offer
+from backend.app.utilities.metrics import Counter, Gauge, Histogram
+
+'''
+Change capture from SQL into the product search index (transactional outbox).
+
+crud.create_product / create_offer add a search_outbox row in the same transaction as
+the change itself, so a committed change is never missed and a rolled back one is
+never indexed. outbox_worker() drains the table in batches of OUTBOX_BATCH_SIZE:
+rows are collapsed per product, the product is read back with its category and
+offers, and one _bulk request writes the denormalized document
+
+    {name, brand_name, category, category_slug, best_price, in_stock, offer_count, updated_at}
+
+(or deletes it when the product is gone) to INDEX_NAME_PRODUCT.
+
+Writes are idempotent: the document id is the product id and the version is the id
+of the newest outbox row applied, with version_type=external. Replaying a batch or
+two workers racing on the same product can only be rejected (409), never move a
+document back to an older state. Rows are claimed with FOR UPDATE SKIP LOCKED so
+several API workers share the outbox instead of duplicating it.
+
+That makes the ids a version that must never go backwards: the table is
+AUTOINCREMENT on SQLite and the retention purge always keeps the newest row, so even a
+table created before that (plain rowid, max + 1) cannot hand out an id again. 409s are
+counted apart (outbox_events_total{result="superseded"}) and logged, so a version
+regression after e.g. a sequence reset shows up instead of passing as indexed.
+'''
+
+OUTBOX_PENDING = Gauge("outbox_pending", "Outbox rows waiting to be applied to the search index")
+OUTBOX_LAG_SECONDS = Gauge("outbox_lag_seconds", "Age of the oldest pending outbox row")
+OUTBOX_DEAD = Gauge("outbox_dead", "Outbox rows that failed OUTBOX_MAX_ATTEMPTS times")
+OUTBOX_EVENTS = Counter("outbox_events_total", "Outbox rows processed", ("result",))
+OUTBOX_SYNC_SECONDS = Histogram(
+    "outbox_sync_seconds",
+    "Time from a committed change to its search document being written",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+PRODUCT_MAPPINGS = {
+    "properties": {
+        "name": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+        "brand_name": {"type": "keyword"},
+        "category": {"type": "keyword"},
+        "category_slug": {"type": "keyword"},
+        "description": {"type": "text"},
+        "image_url": {"type": "keyword", "index": False},
+        "best_price": {"type": "scaled_float", "scaling_factor": 100},
+        "in_stock": {"type": "boolean"},
+        "offer_count": {"type": "integer"},
+        "updated_at": {"type": "date"},
+    }
+}
+
+# one thread keeps a claimed batch's session (and its row locks) on a single connection
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+
+def product_document(product: Product) -> dict:
+    """The search document of a product, denormalized from its category and offers"""
+    offer = best_offer(product.offers)
+    return {
+        "name": product.name,
+        "brand_name": product.brand_name,
+        "category": product.category.name if product.category else None,
+        "category_slug": product.category.slug if product.category else None,
+        "description": product.description,
+        "image_url": product.image_url,
+        "best_price": float(offer.current_price) if offer is not None else None,
+        "in_stock": offer is not None,
+        "offer_count": len(product.offers),
+        "updated_at": datetime.utcnow().isoformat(),
+    }
+
+def refresh_outbox_gauges(session: Session) -> None:
+    now = datetime.utcnow()
+    pending = select(SearchOutbox).where(
+        SearchOutbox.processed_at.is_(None), SearchOutbox.attempts < settings.OUTBOX_MAX_ATTEMPTS
+    ).subquery()
+    count, oldest = session.execute(select(func.count(), func.min(pending.c.created_at))).one()
+    OUTBOX_PENDING.set(count)
+    OUTBOX_LAG_SECONDS.set((now - oldest).total_seconds() if oldest else 0.0)
+    OUTBOX_DEAD.set(session.scalar(
+        select(func.count()).select_from(SearchOutbox).where(
+            SearchOutbox.processed_at.is_(None), SearchOutbox.attempts >= settings.OUTBOX_MAX_ATTEMPTS
+        )
+    ))
+
+class OutboxBatch:
+    """Rows claimed by one drain, held locked by `session` until finish()"""
+
+    def __init__(self, session: Session, rows: List[SearchOutbox]):
+        self.session = session
+        self.rows = rows
+        # newest row per product: its op wins and its id is the document version
+        self.latest: Dict[int, SearchOutbox] = {}
+        for row in rows:
+            if row.product_id not in self.latest or row.id > self.latest[row.product_id].id:
+                self.latest[row.product_id] = row
+
+    def actions(self) -> bytes:
+        upserts = [product_id for product_id, row in self.latest.items() if row.op != "delete"]
+        products = {
+            product.id: product
+            for product in self.session.scalars(
+                select(Product)
+                .where(Product.id.in_(upserts))
+                .options(selectinload(Product.category), selectinload(Product.offers))
+            )
+        } if upserts else {}
+
+        body = b""
+        for product_id, row in self.latest.items():
+            product = products.get(product_id)
+            document = product_document(product) if product is not None else {"_op_type": "delete"}
+            body += serialize_action(settings.INDEX_NAME_PRODUCT, {
+                **document, "_id": product_id, "_version": row.id,
+            })
+        return body
+
+    def finish(self, failed: Dict[int, str], superseded: Optional[set] = None) -> int:
+        """
+        Mark applied rows processed, count an attempt on the failed products' rows.
+        `superseded` products were rejected with 409: ES already holds a newer version.
+        """
+        superseded = superseded or set()
+        now = datetime.utcnow()
+        failed_rows = 0
+        for row in self.rows:
+            if row.product_id in failed:
+                failed_rows += 1
+                row.attempts += 1
+                row.last_error = failed[row.product_id][:1000]
+            else:
+                row.processed_at = now
+                OUTBOX_SYNC_SECONDS.observe((now - row.created_at).total_seconds())
+        superseded_rows = sum(1 for row in self.rows if row.product_id in superseded and row.product_id not in failed)
+        OUTBOX_EVENTS.inc(len(self.rows) - failed_rows - superseded_rows, result="indexed")
+        OUTBOX_EVENTS.inc(superseded_rows, result="superseded")
+        OUTBOX_EVENTS.inc(failed_rows, result="failed")
+        newest = self.session.scalar(select(func.max(SearchOutbox.id)))
+        self.session.execute(
+            delete(SearchOutbox).where(
+                SearchOutbox.processed_at < now - timedelta(seconds=settings.OUTBOX_RETENTION),
+                SearchOutbox.id < newest,  # keeps ids (versions) from being handed out again
+            )
+        )
+        self.session.commit()
+        refresh_outbox_gauges(self.session)
+        self.session.close()
+        return len(self.rows)
+
+    def abandon(self) -> None:
+        """Release the rows untouched, e.g. when Elasticsearch could not be reached"""
+        self.session.rollback()
+        self.session.close()
+
+def claim_batch(batch_size: int) -> Optional[OutboxBatch]:
+    session = SessionLocal()
+    rows = session.scalars(
+        select(SearchOutbox)
+        .where(SearchOutbox.processed_at.is_(None), SearchOutbox.attempts < settings.OUTBOX_MAX_ATTEMPTS)
+        .order_by(SearchOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        refresh_outbox_gauges(session)
+        session.close()
+        return None
+    return OutboxBatch(session, rows)
+
+async def ensure_product_index(es: AsyncElasticsearch) -> None:
+    if not await es.indices.exists(index=settings.INDEX_NAME_PRODUCT):
+        await es.indices.create(index=settings.INDEX_NAME_PRODUCT, mappings=PRODUCT_MAPPINGS)
+        logger.info(f"Created product index '{settings.INDEX_NAME_PRODUCT}'")
+
+async def drain_outbox(es: AsyncElasticsearch, batch_size: Optional[int] = None) -> int:
+    """Apply one batch of the outbox to the product index; returns the rows processed"""
+    loop = asyncio.get_running_loop()
+    batch = await loop.run_in_executor(_db_executor, claim_batch, batch_size or settings.OUTBOX_BATCH_SIZE)
+    if batch is None:
+        return 0
+
+    try:
+        body = await loop.run_in_executor(_db_executor, batch.actions)
+        response = await es.bulk(operations=body)
+    except BaseException:
+        # nothing was applied: the rows stay pending without spending an attempt
+        await loop.run_in_executor(_db_executor, batch.abandon)
+        raise
+
+    failed: Dict[int, str] = {}
+    superseded = set()
+    for item in response["items"]:
+        op_type, outcome = next(iter(item.items()))
+        status = outcome.get("status", 500)
+        # 404: deleting what is already gone
+        if status < 300 or (op_type == "delete" and status == 404):
+            continue
+        if status == 409:
+            # a newer version is already indexed: expected when workers race, not a success
+            superseded.add(int(outcome["_id"]))
+            continue
+        failed[int(outcome["_id"])] = str(outcome.get("error") or status)
+
+    products = len(batch.latest)
+    processed = await loop.run_in_executor(_db_executor, batch.finish, failed, superseded)
+    if superseded:
+        logger.warning(
+            f"Outbox: {len(superseded)} product(s) rejected as older than the indexed version: {sorted(superseded)[:5]}"
+        )
+    if failed:
+        logger.warning(f"Outbox: {len(failed)} product(s) failed to index: {list(failed.items())[:5]}")
+    if len(failed) < products:
+        bump_index_generation(settings.INDEX_NAME_PRODUCT)
+    return processed
+
+async def outbox_worker(app: FastAPI) -> None:
+    """Keep INDEX_NAME_PRODUCT in sync with SQL: drain the outbox whenever ES is reachable"""
+    index_ready = False
+    while True:
+        processed = 0
+        if app.state.es_healthy:
+            try:
+                if not index_ready:
+                    await ensure_product_index(app.state.es)
+                    index_ready = True
+                processed = await drain_outbox(app.state.es)
+            except Exception as e:
+                logger.warning(f"Outbox drain failed, retrying: {e}")
+
+        # a full batch means there is more waiting: go again straight away
+        if processed < settings.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,100 @@
+import base64
+import hashlib
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+'''
+Opaque cursor tokens. A cursor is url-safe base64 of a small JSON payload; clients
+only ever echo it back, so its content can change without breaking the API.
+
+paginate_keyset() pages SQL listings with them: the cursor holds the sort key values
+of the last row served, and the next page seeks past them with a row comparison,
+
+    WHERE (name, id) > (:last_name, :last_id) ORDER BY name, id LIMIT :limit + 1
+
+which an index on (name, id) answers by reading `limit + 1` entries, however deep the
+page. OFFSET would scan and discard every earlier row instead.
+
+A cursor that only makes sense for one request (a search point-in-time, say) carries
+a `scope` hash of that request; decode_cursor(scope=...) rejects it anywhere else.
+'''
+
+class InvalidCursorError(ValueError):
+    pass
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def cursor_scope(**params) -> str:
+    raw = json.dumps(params, separators=(",", ":"), sort_keys=True, default=str).encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+def decode_cursor(cursor: str, required: tuple = (), scope: Optional[str] = None) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}") from e
+    if not isinstance(payload, dict) or any(key not in payload for key in required):
+        raise InvalidCursorError("Invalid cursor")
+    if scope is not None and payload.get("scope") != scope:
+        raise InvalidCursorError("Cursor was issued for a different search")
+    return payload
+
+# JSON types a cursor may carry for a key column of each Python type; anything else
+# (datetimes, decimals) was written with default=str
+_CURSOR_VALUE_TYPES = {int: (int,), float: (int, float), str: (str,)}
+
+def _cursor_value_types(key) -> tuple:
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        return (str,)
+    return _CURSOR_VALUE_TYPES.get(python_type, (str,))
+
+def decode_keyset_cursor(cursor: str, keys: Sequence, order: str) -> list:
+    """The `after` values of a paginate_keyset() cursor, checked against the sort keys"""
+    state = decode_cursor(cursor, required=("order", "after"))
+    if state["order"] != order:
+        raise InvalidCursorError("Cursor was issued for a different sort order")
+    after = state["after"]
+    if not isinstance(after, list) or len(after) != len(keys):
+        raise InvalidCursorError("Invalid cursor")
+    for key, value in zip(keys, after):
+        # bool is an int to isinstance(), never a valid key value
+        if isinstance(value, bool) or not isinstance(value, _cursor_value_types(key)):
+            raise InvalidCursorError("Invalid cursor")
+    return after
+
+def paginate_keyset_statement(statement: Select, keys: Sequence, after: Optional[Sequence], descending: bool, limit: int) -> Select:
+    if after is not None:
+        bounds = tuple_(*(literal(value, key.type) for key, value in zip(keys, after)))
+        statement = statement.where(tuple_(*keys) < bounds if descending else tuple_(*keys) > bounds)
+    order = [key.desc() if descending else key.asc() for key in keys]
+    return statement.order_by(*order).limit(limit + 1)
+
+async def paginate_keyset(
+    session: AsyncSession,
+    statement: Select,
+    keys: Sequence,
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = False,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of `statement` ordered by `keys` (mapped columns, ending with a unique one
+    such as the primary key) and the cursor of the next page, None on the last one.
+    """
+    order = ",".join(key.key for key in keys) + (":desc" if descending else ":asc")
+    after = decode_keyset_cursor(cursor, keys, order) if cursor else None
+
+    rows = (await session.scalars(paginate_keyset_statement(statement, keys, after, descending, limit))).all()
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = rows[:limit]
+    last = rows[-1]
+    return list(rows), encode_cursor({"order": order, "after": [getattr(last, key.key) for key in keys]})
@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pprint import pprint
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.app.config import settings
+from backend.app.db.database import SessionLocal
+from backend.app.loggers.logger import logger
+from backend.app.models.models import PriceHistory, PriceRollup, RollupState
+from backend.app.models.schemas import PricePoint
+from backend.app.utilities.metrics import Counter
+
+'''
+PriceHistory as a time series.
+
+Raw rows (one per recorded price) are folded into daily and weekly buckets of
+price_rollup (min / max / sum / samples / last per offer) by rollup_price_history().
+The job is incremental: RollupState keeps the id of the last raw row consumed, so each
+run reads only new rows through the primary key, merges them into the buckets they
+touch and moves the watermark in the same transaction. Rows younger than
+PRICE_ROLLUP_SETTLE wait for the next run, so a transaction that commits a lower id
+late is not skipped.
+
+compact_price_history() deletes raw rows older than PRICE_RAW_RETENTION_DAYS (only
+those behind the watermark) and daily buckets older than PRICE_DAILY_RETENTION_DAYS;
+weekly buckets are kept.
+
+price_series() answers charts: ranges up to PRICE_SERIES_RAW_MAX_DAYS read raw rows
+while they fit the point budget, longer or denser ones daily buckets, then weekly
+ones. A year is ~365 daily points instead of every raw row. Raw rows not yet rolled
+up are merged into the rollup series, so charts are current between runs. A series
+that still exceeds max_points (an explicit resolution, or weeks over a very long
+range) keeps its newest points and is flagged `truncated`.
+
+    python -m backend.app.utilities.price_history rollup
+    python -m backend.app.utilities.price_history compact
+'''
+
+ROLLUP_NAME = "price_history"
+RESOLUTIONS = ("day", "week")
+CENT = Decimal("0.01")
+
+PRICE_ROLLUP_ROWS = Counter("price_rollup_rows_total", "Raw price rows folded into the rollups")
+PRICE_COMPACTED_ROWS = Counter("price_history_compacted_rows_total", "Rows deleted by retention", ("table",))
+
+def bucket_start(recorded_at: datetime, resolution: str) -> datetime:
+    day = recorded_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return day
+    if resolution == "week":
+        return day - timedelta(days=day.weekday())  # weeks start on Monday
+    raise ValueError(f"Unknown resolution '{resolution}'")
+
+class Bucket:
+    """Mergeable aggregate of the prices in one bucket"""
+
+    def __init__(self, price: Decimal, recorded_at: datetime):
+        self.min = self.max = self.last = price
+        self.sum = price
+        self.samples = 1
+        self.last_recorded_at = recorded_at
+
+    def add(self, price: Decimal, recorded_at: datetime) -> None:
+        self.min = min(self.min, price)
+        self.max = max(self.max, price)
+        self.sum += price
+        self.samples += 1
+        if recorded_at >= self.last_recorded_at:
+            self.last, self.last_recorded_at = price, recorded_at
+
+    def merge_into(self, rollup: PriceRollup) -> None:
+        rollup.min_price = min(rollup.min_price, self.min)
+        rollup.max_price = max(rollup.max_price, self.max)
+        rollup.price_sum += self.sum
+        rollup.samples += self.samples
+        if self.last_recorded_at >= rollup.last_recorded_at:
+            rollup.last_price, rollup.last_recorded_at = self.last, self.last_recorded_at
+
+    def point(self, t: datetime) -> PricePoint:
+        return PricePoint(
+            t=t, min=self.min, max=self.max, avg=(self.sum / self.samples).quantize(CENT),
+            last=self.last, samples=self.samples,
+        )
+
+def aggregate(rows: Iterable, resolutions: Iterable[str] = RESOLUTIONS) -> Dict[Tuple[int, str, datetime], Bucket]:
+    """Buckets of (offer_id, price, recorded_at) rows, keyed like price_rollup's primary key"""
+    buckets: Dict[Tuple[int, str, datetime], Bucket] = {}
+    for row in rows:
+        for resolution in resolutions:
+            key = (row.offer_id, resolution, bucket_start(row.recorded_at, resolution))
+            if key in buckets:
+                buckets[key].add(row.price, row.recorded_at)
+            else:
+                buckets[key] = Bucket(row.price, row.recorded_at)
+    return buckets
+
+# ========== maintenance (sync engine, run in a thread) ==========
+def _rollup_state(session: Session) -> RollupState:
+    # the row lock serializes API workers running the job at the same time
+    state = session.scalars(
+        select(RollupState).where(RollupState.name == ROLLUP_NAME).with_for_update()
+    ).first()
+    if state is None:
+        state = RollupState(name=ROLLUP_NAME, last_id=0)
+        session.add(state)
+        session.flush()
+    return state
+
+def rollup_price_history(session: Session, batch_size: Optional[int] = None) -> int:
+    """Fold the next batch of raw rows into the rollups; returns the rows consumed"""
+    state = _rollup_state(session)
+    settled = datetime.utcnow() - timedelta(seconds=settings.PRICE_ROLLUP_SETTLE)
+    rows = session.execute(
+        select(PriceHistory.id, PriceHistory.offer_id, PriceHistory.price, PriceHistory.recorded_at)
+        .where(PriceHistory.id > state.last_id, PriceHistory.recorded_at < settled)
+        .order_by(PriceHistory.id)
+        .limit(batch_size or settings.PRICE_ROLLUP_BATCH_SIZE)
+    ).all()
+    if not rows:
+        session.rollback()
+        return 0
+
+    buckets = aggregate(rows)
+    existing = {
+        (rollup.offer_id, rollup.resolution, rollup.bucket_start): rollup
+        for rollup in session.scalars(
+            select(PriceRollup).where(
+                tuple_(PriceRollup.offer_id, PriceRollup.resolution, PriceRollup.bucket_start).in_(list(buckets))
+            )
+        )
+    }
+    for key, bucket in buckets.items():
+        if key in existing:
+            bucket.merge_into(existing[key])
+        else:
+            offer_id, resolution, start = key
+            session.add(PriceRollup(
+                offer_id=offer_id, resolution=resolution, bucket_start=start,
+                min_price=bucket.min, max_price=bucket.max, price_sum=bucket.sum, samples=bucket.samples,
+                last_price=bucket.last, last_recorded_at=bucket.last_recorded_at,
+            ))
+
+    state.last_id = rows[-1].id
+    state.updated_at = datetime.utcnow()
+    session.commit()
+    PRICE_ROLLUP_ROWS.inc(len(rows))
+    return len(rows)
+
+def _delete_in_batches(session: Session, model, *conditions) -> int:
+    """DELETE ... WHERE pk IN (SELECT pk ... LIMIT n) until nothing matches: short transactions"""
+    primary_key = tuple(model.__table__.primary_key.columns)
+    deleted = 0
+    while True:
+        keys = session.execute(
+            select(*primary_key).where(*conditions).limit(settings.PRICE_COMPACT_BATCH_SIZE)
+        ).all()
+        if not keys:
+            return deleted
+        session.execute(delete(model).where(tuple_(*primary_key).in_([tuple(key) for key in keys])))
+        session.commit()
+        deleted += len(keys)
+
+def compact_price_history(session: Session, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.utcnow()
+    state = session.scalars(select(RollupState).where(RollupState.name == ROLLUP_NAME)).first()
+    watermark = state.last_id if state else 0
+    session.rollback()
+
+    raw = _delete_in_batches(
+        session, PriceHistory,
+        PriceHistory.recorded_at < now - timedelta(days=settings.PRICE_RAW_RETENTION_DAYS),
+        PriceHistory.id <= watermark,  # never drop what the rollups have not seen
+    )
+    daily = _delete_in_batches(
+        session, PriceRollup,
+        PriceRollup.resolution == "day",
+        PriceRollup.bucket_start < now - timedelta(days=settings.PRICE_DAILY_RETENTION_DAYS),
+    )
+    PRICE_COMPACTED_ROWS.inc(raw, table="price_history")
+    PRICE_COMPACTED_ROWS.inc(daily, table="price_rollup")
+    if raw or daily:
+        logger.info(f"Price history compaction deleted {raw} raw rows and {daily} daily buckets")
+    return {"raw_rows_deleted": raw, "daily_buckets_deleted": daily}
+
+def run_price_maintenance() -> dict:
+    """Roll up everything settled, then apply retention"""
+    session = SessionLocal()
+    try:
+        rolled_up = 0
+        while (consumed := rollup_price_history(session)):
+            rolled_up += consumed
+        return {"rolled_up": rolled_up, **compact_price_history(session)}
+    finally:
+        session.close()
+
+async def price_rollup_worker() -> None:
+    while True:
+        try:
+            report = await asyncio.to_thread(run_price_maintenance)
+            if report["rolled_up"]:
+                logger.info(f"Price rollups updated from {report['rolled_up']} raw rows")
+        except Exception as e:
+            logger.warning(f"Price history maintenance failed, retrying: {e}")
+        await asyncio.sleep(settings.PRICE_ROLLUP_INTERVAL)
+
+# ========== reads ==========
+def choose_resolution(
+    start: datetime,
+    end: datetime,
+    max_points: int,
+    now: Optional[datetime] = None,
+    raw_rows: Optional[int] = None,
+) -> str:
+    """
+    Finest resolution that has data for the whole range and fits `max_points`.
+    `raw_rows` is the number of raw rows in the range, when it has been counted.
+    """
+    now = now or datetime.utcnow()
+    span = end - start
+    if (
+        span <= timedelta(days=settings.PRICE_SERIES_RAW_MAX_DAYS)
+        and start >= now - timedelta(days=settings.PRICE_RAW_RETENTION_DAYS)
+        and (raw_rows is None or raw_rows <= max_points)
+    ):
+        return "raw"
+    if span.days + 1 <= max_points and start >= now - timedelta(days=settings.PRICE_DAILY_RETENTION_DAYS):
+        return "day"
+    return "week"
+
+async def price_series(
+    session: AsyncSession,
+    offer_id: int,
+    start: datetime,
+    end: datetime,
+    resolution: str = "auto",
+    max_points: Optional[int] = None,
+) -> Tuple[str, List[PricePoint], bool]:
+    """(resolution served, points oldest first, whether older points were cut to fit max_points)"""
+    max_points = max_points or settings.PRICE_SERIES_MAX_POINTS
+    raw_range = (
+        PriceHistory.offer_id == offer_id, PriceHistory.recorded_at >= start, PriceHistory.recorded_at < end
+    )
+    if resolution == "auto":
+        resolution = choose_resolution(start, end, max_points)
+        if resolution == "raw":
+            # a densely scraped offer can exceed the budget even over a short range: step up
+            # to a rollup instead of dropping points (the count stops at max_points + 1)
+            raw_rows = await session.scalar(
+                select(func.count()).select_from(select(PriceHistory.id).where(*raw_range).limit(max_points + 1).subquery())
+            )
+            resolution = choose_resolution(start, end, max_points, raw_rows=raw_rows)
+
+    if resolution == "raw":
+        rows = (await session.execute(
+            select(PriceHistory.price, PriceHistory.recorded_at)
+            .where(*raw_range)
+            .order_by(PriceHistory.recorded_at.desc())
+            .limit(max_points + 1)
+        )).all()
+        points = [
+            PricePoint(t=row.recorded_at, min=row.price, max=row.price, avg=row.price, last=row.price, samples=1)
+            for row in reversed(rows[:max_points])
+        ]
+        return resolution, points, len(rows) > max_points
+
+    buckets: Dict[datetime, Bucket] = {}
+    rollups = await session.scalars(
+        select(PriceRollup)
+        .where(
+            PriceRollup.offer_id == offer_id,
+            PriceRollup.resolution == resolution,
+            PriceRollup.bucket_start >= bucket_start(start, resolution),
+            PriceRollup.bucket_start < end,
+        )
+        .order_by(PriceRollup.bucket_start)
+    )
+    for rollup in rollups:
+        bucket = Bucket(rollup.last_price, rollup.last_recorded_at)
+        bucket.min, bucket.max, bucket.sum, bucket.samples = (
+            rollup.min_price, rollup.max_price, rollup.price_sum, rollup.samples
+        )
+        buckets[rollup.bucket_start] = bucket
+
+    # raw rows the job has not consumed yet, so the newest bucket is not stale
+    watermark = await session.scalar(select(RollupState.last_id).where(RollupState.name == ROLLUP_NAME)) or 0
+    pending = (await session.execute(
+        select(PriceHistory.offer_id, PriceHistory.price, PriceHistory.recorded_at)
+        .where(
+            PriceHistory.offer_id == offer_id,
+            PriceHistory.id > watermark,
+            PriceHistory.recorded_at >= bucket_start(start, resolution),
+            PriceHistory.recorded_at < end,
+        )
+    )).all()
+    for (_, _, t), bucket in aggregate(pending, (resolution,)).items():
+        if t in buckets:
+            existing = buckets[t]
+            existing.min, existing.max = min(existing.min, bucket.min), max(existing.max, bucket.max)
+            existing.sum += bucket.sum
+            existing.samples += bucket.samples
+            if bucket.last_recorded_at >= existing.last_recorded_at:
+                existing.last, existing.last_recorded_at = bucket.last, bucket.last_recorded_at
+        else:
+            buckets[t] = bucket
+
+    points = [buckets[t].point(t) for t in sorted(buckets)]
+    return resolution, points[-max_points:], len(points) > max_points
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the PriceHistory rollups")
+    parser.add_argument("command", choices=("rollup", "compact"))
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    if args.command == "rollup":
+        total = 0
+        while (consumed := rollup_price_history(session)):
+            total += consumed
+        pprint({"rolled_up": total})
+    else:
+        pprint(compact_price_history(session))
+    session.close()
@@ -0,0 +1,77 @@
+import re
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.app.db.database import async_engine, engine
+
+'''
+SQL statement counting for tests and local checks of the loader profiles in crud.py.
+
+    with assert_max_statements(3):
+        client.get("/product/?limit=100")
+
+Counts every statement sent through the sync and the async engine while the block
+runs, so it belongs in tests and scripts, not in a server handling other requests.
+check_statement_budgets() runs the listing endpoints against STATEMENT_BUDGETS.
+'''
+
+# endpoint -> most statements it may issue, whatever the page size
+STATEMENT_BUDGETS: Dict[str, int] = {
+    "/product/?limit=100": 3,
+    "/product/?limit=100&sort=name": 3,
+    "/categories/{slug}/product?limit=100": 3,
+    "/product/offer?product_id={product_id}": 2,
+    "/merchant/?limit=100": 2,
+    "/users/?limit=100": 2,
+}
+
+_SPACE_RE = re.compile(r"\s+")
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(_SPACE_RE.sub(" ", statement).strip())
+
+@contextmanager
+def count_statements(engines: Optional[List[Engine]] = None) -> Iterator[StatementCounter]:
+    counter = StatementCounter()
+    engines = engines or [engine, async_engine.sync_engine]
+    for target in engines:
+        event.listen(target, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", counter)
+
+@contextmanager
+def assert_max_statements(limit: int, label: str = "block", engines: Optional[List[Engine]] = None) -> Iterator[StatementCounter]:
+    with count_statements(engines) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "\n".join(f"  {i + 1}. {statement[:200]}" for i, statement in enumerate(counter.statements))
+        raise AssertionError(f"{label} issued {counter.count} SQL statements, budget is {limit}:\n{listing}")
+
+def check_statement_budgets(client, budgets: Optional[Dict[str, int]] = None, **path_params) -> Dict[str, int]:
+    """
+    GET every endpoint of `budgets` with a TestClient (or httpx client) and assert its
+    statement count. `path_params` fill placeholders such as slug= and product_id=.
+    Returns the counts seen.
+    """
+    seen = {}
+    for path, limit in (budgets or STATEMENT_BUDGETS).items():
+        url = path.format(**path_params)
+        with assert_max_statements(limit, label=f"GET {url}") as counter:
+            response = client.get(url)
+        response.raise_for_status()
+        seen[url] = counter.count
+    return seen
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from backend.app.utilities.metrics import Counter, Gauge
+
+SINGLE_FLIGHT_LEADERS = Counter("single_flight_leaders_total", "Computations actually started", ("group",))
+SINGLE_FLIGHT_COALESCED = Counter("single_flight_coalesced_total", "Requests that waited on an identical in-flight computation", ("group",))
+SINGLE_FLIGHT_INFLIGHT = Gauge("single_flight_inflight", "Distinct computations currently in flight", ("group",))
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts `fn()` as a
+    task, every duplicate that arrives while it runs awaits that same task.
+
+    The task is shielded, so a leader whose request is cancelled does not fail the
+    followers waiting on it.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            SINGLE_FLIGHT_LEADERS.inc(group=self.group)
+        else:
+            SINGLE_FLIGHT_COALESCED.inc(group=self.group)
+        SINGLE_FLIGHT_INFLIGHT.set(len(self._inflight), group=self.group)
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, done: asyncio.Task) -> None:
+        if self._inflight.get(key) is done:
+            del self._inflight[key]
+        SINGLE_FLIGHT_INFLIGHT.set(len(self._inflight), group=self.group)
+        # mark the exception as retrieved even if every waiter was cancelled
+        if not done.cancelled():
+            done.exception()
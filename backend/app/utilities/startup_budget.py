@@ -0,0 +1,51 @@
+import argparse
+import subprocess
+import sys
+
+'''
+Import-time budget for the API process.
+
+Imports backend.app.main in fresh interpreters and fails (exit code 1) when the best
+import time is over budget, or when a heavy ML module is pulled in at import time
+(the embedding model must only load lazily / in the lifespan warm up).
+
+    python -m backend.app.utilities.startup_budget --budget 3.0
+'''
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "onnxruntime")
+
+PROBE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "heavy = ','.join(name for name in {heavy!r} if name in sys.modules)\n"
+    "print(f'{{time.perf_counter() - started}}|{{heavy}}')\n"
+)
+
+def measure_import(module: str = "backend.app.main") -> tuple[float, list[str]]:
+    probe = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    seconds, heavy = result.stdout.strip().splitlines()[-1].split("|")
+    return float(seconds), [name for name in heavy.split(",") if name]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail when importing the API gets slower than the budget")
+    parser.add_argument("--module", default="backend.app.main")
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = [measure_import(args.module) for _ in range(args.runs)]
+    best = min(seconds for seconds, _ in results)
+    heavy = sorted({name for _, loaded in results for name in loaded})
+
+    print(f"import {args.module}: best of {args.runs} = {best:.2f}s (budget {args.budget:.2f}s)")
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        sys.exit(1)
+    if best > args.budget:
+        print("FAIL: import time over budget")
+        sys.exit(1)
+    print("OK")
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Iterable, List
+
+from elasticsearch import AsyncElasticsearch
+from fastapi import FastAPI
+
+from backend.app.config import settings
+from backend.app.loggers.logger import logger
+
+class TitleTrie:
+    """
+    Prefix trie over lowercased titles. Every node stores the best `max_suggestions`
+    titles below it, so a lookup costs O(len(prefix)) no matter how many titles match.
+    Titles must be given best first.
+    """
+
+    def __init__(self, titles: Iterable[str], max_suggestions: int = 10, max_prefix_length: int = 30):
+        self.max_suggestions = max_suggestions
+        self.max_prefix_length = max_prefix_length
+        self.size = 0
+        # node = (children, top titles)
+        self._root: tuple[dict, list] = ({}, [])
+
+        seen = set()
+        for title in titles:
+            key = " ".join(title.lower().split())
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            self._insert(key, title)
+            self.size += 1
+
+    def _insert(self, key: str, title: str) -> None:
+        node = self._root
+        if len(node[1]) < self.max_suggestions:
+            node[1].append(title)
+        for char in key[: self.max_prefix_length]:
+            children = node[0]
+            node = children.get(char)
+            if node is None:
+                node = ({}, [])
+                children[char] = node
+            if len(node[1]) < self.max_suggestions:
+                node[1].append(title)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        key = " ".join(prefix.lower().split())[: self.max_prefix_length]
+        node = self._root
+        for char in key:
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return node[1][:limit]
+
+async def load_hot_titles(es: AsyncElasticsearch, size: int) -> List[str]:
+    """Most recent titles of the n-gram index, newest first"""
+    response = await es.search(
+        index=settings.INDEX_NAME_N_GRAM,
+        size=size,
+        source=["title"],
+        sort=[{"date": {"order": "desc", "unmapped_type": "date"}}],
+        filter_path=["hits.hits._source.title"],
+    )
+    hits = response.body.get("hits", {}).get("hits", [])
+    return [hit["_source"]["title"] for hit in hits if hit.get("_source", {}).get("title")]
+
+async def title_trie_refresher(app: FastAPI) -> None:
+    """Rebuild app.state.title_trie from the index every SUGGEST_REFRESH_INTERVAL seconds"""
+    while True:
+        try:
+            titles = await load_hot_titles(app.state.es, settings.SUGGEST_TRIE_SIZE)
+            # building is pure CPU work, keep it off the event loop
+            app.state.title_trie = await asyncio.to_thread(
+                TitleTrie, titles, settings.SUGGEST_MAX_RESULTS
+            )
+            logger.info(f"Title trie refreshed with {app.state.title_trie.size} titles")
+        except Exception as e:
+            logger.warning(f"Title trie refresh failed, keeping the previous one: {e}")
+
+        # retry quickly while the trie is still empty (e.g. ES was not up at startup)
+        has_titles = app.state.title_trie.size > 0
+        await asyncio.sleep(settings.SUGGEST_REFRESH_INTERVAL if has_titles else settings.ES_HEALTH_INTERVAL)
@@ -3,11 +3,13 @@ from pprint import pprint
 
 from elasticsearch import Elasticsearch
 
+from backend.app.db.elastic import create_sync_es_client
+
 def get_es_client(max_retries: int = 1, sleep_time: int = 5) -> Elasticsearch: 
     i = 0 
     while i < max_retries:
         try: 
-            es = Elasticsearch("https://localhost:9200", basic_auth=("elastic", "6AqhOxi*CPXYvCZl7Iln"), verify_certs=False)
+            es = create_sync_es_client()
             client_info = es.info()
             pprint('Connected to Elasticsearch!')
             return es